@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import MediaBlob
+
+
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'size', 'references', 'created_at']
+    search_fields = ['name']
+    ordering = ['id']
+    readonly_fields = ('name', 'size', 'references', 'created_at')
+
+
+admin.site.register(MediaBlob, MediaBlobAdmin)
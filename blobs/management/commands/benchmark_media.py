@@ -0,0 +1,59 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.views.static import serve
+
+from blobs.views import serve_media
+from utils.storage import blob_storage
+
+
+class Command(BaseCommand):
+    help = 'Compare serving a media file through django.views.static.serve and through serve_media.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Name of a file under MEDIA_ROOT.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+
+    def time_requests(self, view, url, requests, **headers):
+        factory = RequestFactory()
+        transferred = 0
+        status = None
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = view(factory.get(url, **headers))
+            status = response.status_code
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            transferred += len(body)
+            response.close()
+        elapsed = time.perf_counter() - started
+        return status, requests / elapsed, transferred / elapsed
+
+    def handle(self, *args, **options):
+        name = options['name']
+        if not os.path.isfile(os.path.join(settings.MEDIA_ROOT, name)):
+            raise CommandError(f'{name} is not a file under MEDIA_ROOT.')
+
+        def static_view(request):
+            return serve(request, name, document_root=settings.MEDIA_ROOT)
+
+        def media_view(request):
+            return serve_media(request, name)
+
+        # serve_media only answers signed URLs
+        url = blob_storage().url(name)
+        etag = media_view(RequestFactory().get(url))['ETag']
+        scenarios = (
+            ('static.serve, full', static_view, {}),
+            ('serve_media, full', media_view, {}),
+            ('serve_media, If-None-Match', media_view, {'HTTP_IF_NONE_MATCH': etag}),
+            ('serve_media, first 64 KiB', media_view, {'HTTP_RANGE': 'bytes=0-65535'}),
+        )
+
+        for label, view, headers in scenarios:
+            status, rate, throughput = self.time_requests(view, url, options['requests'], **headers)
+            self.stdout.write(
+                f'{label:<28} status={status} {rate:9.1f} req/s {throughput / 1024 / 1024:9.1f} MiB/s'
+            )
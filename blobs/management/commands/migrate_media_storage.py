@@ -0,0 +1,80 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from utils.storage import blob_storage, is_blob_name
+from utils.utils import result_image_name
+
+from .sweep_media import file_fields
+
+
+class Command(BaseCommand):
+    help = 'Move media files stored under their upload names into the content addressed blob storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be migrated.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        storage = blob_storage()
+        # Old name -> new blob name, a file referenced from several rows is stored once
+        migrated = {}
+        references = defaultdict(int)
+        missing = 0
+        rows = 0
+
+        # Every file field, the archive tables included, or their files would be removed under them
+        for model, field in file_fields():
+            queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for pk, name in queryset.values_list('pk', field).iterator(chunk_size=options['batch_size']):
+                if is_blob_name(name):
+                    continue
+
+                path = os.path.join(settings.MEDIA_ROOT, name)
+                if not os.path.exists(path):
+                    missing += 1
+                    self.stderr.write(f'{model.__name__} {pk}: {name} is missing, left as is.')
+                    continue
+
+                rows += 1
+                references[name] += 1
+                if options['dry_run']:
+                    continue
+
+                # Every row gets its own reference on the blob
+                with open(path, 'rb') as file:
+                    new_name = storage.save(name, File(file, name=name))
+                migrated[name] = new_name
+                model.objects.filter(pk=pk).update(**{field: new_name})
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would migrate {rows} references to {len(references)} files, {missing} missing.'
+            ))
+            return
+
+        # Files with identical content collapse into one blob, the rest is space saved
+        duplicates, saved = 0, 0
+        seen = set()
+        for old_name, new_name in migrated.items():
+            path = os.path.join(settings.MEDIA_ROOT, old_name)
+            if new_name in seen:
+                duplicates += 1
+                saved += os.path.getsize(path)
+            seen.add(new_name)
+            os.remove(path)
+
+            # Result images of exams from before overlays were rendered on demand follow their image
+            result_path = os.path.join(settings.MEDIA_ROOT, result_image_name(old_name))
+            if os.path.exists(result_path):
+                new_result_path = os.path.join(settings.MEDIA_ROOT, result_image_name(new_name))
+                os.makedirs(os.path.dirname(new_result_path), exist_ok=True)
+                os.replace(result_path, new_result_path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Migrated {rows} references to {len(seen)} blobs, {missing} missing, '
+            f'{duplicates} duplicate files removed ({saved} bytes).'
+        ))
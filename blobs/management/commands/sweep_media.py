@@ -0,0 +1,178 @@
+import os
+import shutil
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from blobs.models import MediaBlob
+from patient_examine.models import ExamineUpload
+from utils.storage import is_blob_name
+from utils.utils import result_image_name
+
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+def iter_files(root, skip=()):
+    """
+    (name relative to `root`, DirEntry) of every file below `root`, walked with
+    os.scandir one directory at a time so millions of files are never listed at once.
+    """
+    directories = ['']
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(os.path.join(root, directory)) as entries:
+                for entry in entries:
+                    name = f'{directory}/{entry.name}' if directory else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in skip:
+                            directories.append(name)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield name, entry
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    help = 'Delete or quarantine media files that no file field references anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be swept.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Seconds a file has to be untouched for, so saves still in flight are left alone.'
+        )
+        parser.add_argument('--quarantine', help='Move orphans into this directory instead of deleting them.')
+        parser.add_argument(
+            '--stale-uploads', type=int, metavar='HOURS',
+            help='Also remove resumable uploads that received nothing for this many hours.'
+        )
+
+    def referenced_names(self, batch_size):
+        names = set()
+        for model, field in file_fields():
+            queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for name in queryset.values_list(field, flat=True).iterator(chunk_size=batch_size):
+                names.add(name)
+                # Result images of exams that predate rendering overlays on demand
+                names.add(result_image_name(name))
+        return names
+
+    def still_referenced(self, names):
+        referenced = set()
+        for model, field in file_fields():
+            referenced.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+        return referenced
+
+    def sweep(self, batch, cutoff, quarantine):
+        """
+        Remove a batch of orphans, checked again with their blob rows locked so a save
+        that started referencing one of them since the scan keeps it.
+        """
+        swept, size = 0, 0
+        names = [name for name, _ in batch]
+        with transaction.atomic():
+            list(MediaBlob.objects.select_for_update().filter(name__in=names).values_list('pk'))
+            referenced = self.still_referenced(names)
+            removed = []
+            for name, path in batch:
+                try:
+                    stat_result = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name in referenced or stat_result.st_mtime > cutoff:
+                    continue
+
+                if quarantine:
+                    target = os.path.join(quarantine, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+                removed.append(name)
+                swept += 1
+                size += stat_result.st_size
+            MediaBlob.objects.filter(name__in=removed).delete()
+        return swept, size
+
+    def sweep_uploads(self, hours, dry_run):
+        stale = ExamineUpload.objects.filter(updated_at__lt=timezone.now() - timezone.timedelta(hours=hours))
+        count = stale.count()
+        if not dry_run:
+            for upload in stale.iterator():
+                upload.delete()
+        self.stdout.write(f'{"Would remove" if dry_run else "Removed"} {count} stale uploads.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        quarantine = options['quarantine'] and os.path.abspath(options['quarantine'])
+        cutoff = time.time() - options['min_age']
+        root = os.path.abspath(settings.MEDIA_ROOT)
+
+        referenced = self.referenced_names(batch_size)
+        self.stdout.write(
+            f'{len(referenced)} referenced names loaded in {time.perf_counter() - started:.1f}s.'
+        )
+
+        # Caches are evicted on their own, and nothing below the quarantine is swept twice
+        skip = {settings.EXAMINE_OVERLAY_CACHE_DIR, settings.EXAMINE_TILE_CACHE_DIR}
+        for directory in (quarantine, os.path.abspath(settings.EXAMINE_UPLOAD_DIR)):
+            if directory and directory.startswith(root + os.sep):
+                skip.add(os.path.relpath(directory, root).replace(os.sep, '/'))
+
+        scanned, orphans, swept, size = 0, 0, 0, 0
+        batch = []
+        for name, entry in iter_files(root, skip):
+            scanned += 1
+            # Temporary files of saves in progress
+            if name.endswith('.tmp') or name in referenced:
+                continue
+            stat_result = entry.stat(follow_symlinks=False)
+            if stat_result.st_mtime > cutoff:
+                continue
+
+            orphans += 1
+            if dry_run:
+                size += stat_result.st_size
+                continue
+            batch.append((name, entry.path))
+            if len(batch) >= batch_size:
+                batch_swept, batch_bytes = self.sweep(batch, cutoff, quarantine)
+                swept, size = swept + batch_swept, size + batch_bytes
+                batch = []
+        if batch:
+            batch_swept, batch_bytes = self.sweep(batch, cutoff, quarantine)
+            swept, size = swept + batch_swept, size + batch_bytes
+
+        # Blob rows left behind by files that are already gone
+        stale_blobs = []
+        blobs = MediaBlob.objects.filter(created_at__lt=timezone.now() - timezone.timedelta(seconds=options['min_age']))
+        for pk, name in blobs.values_list('pk', 'name').iterator(chunk_size=batch_size):
+            if name not in referenced and is_blob_name(name) and not os.path.exists(os.path.join(root, name)):
+                stale_blobs.append(pk)
+        if not dry_run:
+            for start in range(0, len(stale_blobs), batch_size):
+                MediaBlob.objects.filter(pk__in=stale_blobs[start:start + batch_size]).delete()
+
+        if options['stale_uploads'] is not None:
+            self.sweep_uploads(options['stale_uploads'], dry_run)
+
+        elapsed = time.perf_counter() - started
+        action = 'quarantined' if quarantine else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files in {elapsed:.1f}s ({scanned / elapsed:.0f} files/s), '
+            f'{orphans} orphans, {orphans if dry_run else swept} {"would be " if dry_run else ""}{action} '
+            f'({size / 1024 / 1024:.1f} MiB), {len(stale_blobs)} stale blob rows.'
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='name')),
+                ('size', models.BigIntegerField(verbose_name='size')),
+                ('references', models.IntegerField(default=0, verbose_name='references')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+            ],
+        ),
+    ]
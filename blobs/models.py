@@ -0,0 +1,26 @@
+from django.db import models
+
+
+class MediaBlob(models.Model):
+    id = models.AutoField(
+        'id',
+        primary_key=True
+    )
+    # Storage name of the blob, derived from the sha256 of its content
+    name = models.CharField(
+        'name',
+        max_length=100,
+        unique=True
+    )
+    size = models.BigIntegerField(
+        'size'
+    )
+    # Number of file fields pointing at the blob, it is removed from disk when this drops to zero
+    references = models.IntegerField(
+        'references',
+        default=0
+    )
+    created_at = models.DateTimeField(
+        'created_at',
+        auto_now_add=True
+    )
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+from utils.storage import blob_storage, sign_media_name
+
+from .views import parse_range, serve_media
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Tests run without DEBUG, when fetus_backend.urls leaves media to the proxy
+urlpatterns = [path('media/<path:path>', serve_media)]
+
+
+class ParseRangeTestCase(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-200', 100), (0, 99))
+
+    def test_ignored_ranges(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('bytes=9-3', 100))
+        self.assertIsNone(parse_range('bytes=-5', 0))
+        self.assertIsNone(parse_range('bytes=0-', 0))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ROOT_URLCONF='blobs.tests')
+class ServeMediaTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.name = blob_storage().save('scan.jpg', ContentFile(b'0123456789'))
+
+    def get(self, query=None, **headers):
+        return self.client.get(f'/media/{self.name}', query, **headers)
+
+    def test_signed_url(self):
+        response = self.client.get(blob_storage().url(self.name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertTrue(response['Cache-Control'].startswith('private,'))
+
+    def test_unsigned_request(self):
+        self.assertEqual(self.get().status_code, 403)
+        signed = sign_media_name(self.name)
+        self.assertEqual(self.get({**signed, 'signature': signed['signature'][:-1]}).status_code, 403)
+        self.assertEqual(self.get({**signed, 'expires': signed['expires'] + 1}).status_code, 403)
+
+    def test_expired_url(self):
+        signed = sign_media_name(self.name)
+        with mock.patch('utils.storage.time.time', return_value=signed['expires'] + 1):
+            self.assertEqual(self.get(signed).status_code, 403)
+
+    def test_token(self):
+        user = User.objects.create(email='doctor@example.com', username='doctor', phone_number='1', is_logged_in=True)
+        token = Token.objects.create(user=user).key
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Token ' + token).status_code, 200)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Token nope').status_code, 403)
+
+    def test_invalid_range(self):
+        response = self.get(sign_media_name(self.name), HTTP_RANGE='bytes=9-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_accel_redirect_quoted(self):
+        name = 'overlays/scan 1.png'
+        os.makedirs(os.path.join(MEDIA_ROOT, 'overlays'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, name), 'wb') as file:
+            file.write(b'png')
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(f'/media/{name}', sign_media_name(name))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/overlays/scan%201.png')
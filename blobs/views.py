@@ -0,0 +1,155 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+from rest_framework.authentication import get_authorization_header
+
+from users.auth import TokenException, UserTokenAuthentication
+from utils.storage import check_media_signature, is_blob_name
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def get_etag(name, stat_result):
+    # Blob names are the sha256 of their content, other files change with their size or modification time
+    if is_blob_name(name):
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return '"%x-%x-%x"' % (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive of a single byte range, None to send the whole file,
+    or False when the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        # Multiple or malformed ranges, the whole file is a valid answer to either
+        return None
+
+    start, end = match.groups()
+    # An empty file has no bytes to select, it is sent whole instead
+    if not start and not end or size == 0:
+        return None
+    if not start:
+        # Suffix range, the last `end` bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        # Syntactically invalid, the header is ignored
+        return None
+    if start >= size:
+        return False
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def is_authorized(request, path):
+    """
+    Whether the request carries a valid signature for `path` or a user token.
+    """
+    if 'signature' in request.GET:
+        return check_media_signature(path, request.GET.get('expires'), request.GET['signature'])
+    if not get_authorization_header(request):
+        return False
+    try:
+        UserTokenAuthentication().authenticate(request)
+    except TokenException:
+        return False
+    return True
+
+
+def iter_file(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with validators for conditional requests and
+    single byte ranges, optionally leaving the body to the front proxy. Only
+    signed URLs and token holders are answered.
+    """
+    if not is_authorized(request, path):
+        return HttpResponseForbidden()
+
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404()
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404()
+
+    size = stat_result.st_size
+    etag = get_etag(path, stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    headers = HttpResponse(content_type=content_type or 'application/octet-stream')
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    headers['Accept-Ranges'] = 'bytes'
+    # Blobs never change under their name, everything else has to be revalidated, and patient
+    # images are never kept by shared caches
+    headers['Cache-Control'] = (
+        f'private, max-age={settings.MEDIA_MAX_AGE}, immutable' if is_blob_name(path) else 'private, no-cache'
+    )
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=headers)
+    if conditional is not headers:
+        return conditional
+
+    # The proxy reads the file and answers ranges itself
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        headers['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + path)
+        return headers
+    if settings.MEDIA_SENDFILE == 'x-sendfile':
+        headers['X-Sendfile'] = full_path
+        return headers
+
+    byte_range = None
+    # A range of a file that changed since the client got the rest of it would mix two versions
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or etag in parse_etags(if_range):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        # Whole files go through the server's wsgi.file_wrapper, which can use sendfile itself
+        response = FileResponse(open(full_path, 'rb'))
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file(full_path, start, end - start + 1), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Length'] = str(end - start + 1 if byte_range else size)
+    return response
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'patients',
     'patient_examine',
     'doctors',
+    'blobs',
     'corsheaders',
     'django_filters',
 ]
@@ -128,6 +129,13 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# Media is served by blobs.views.serve_media with DEBUG, without it only when the body is left
+# to the front proxy with 'x-sendfile' or 'x-accel-redirect' (files under MEDIA_ACCEL_REDIRECT_PREFIX)
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+# Signed media URLs stay valid this long, unsigned requests need a token
+MEDIA_URL_MAX_AGE = 24 * 60 * 60
 
 
 # Default primary key field type
@@ -155,4 +163,82 @@ CORS_ALLOW_CREDENTIALS = False
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:49302',
     'http://localhost:8000',
-]
\ No newline at end of file
+]
+
+# Examine pipeline Config
+EXAMINE_INFERENCE_SIZE = 640
+EXAMINE_IMAGE_MIN_SIZE = 64
+EXAMINE_IMAGE_MAX_SIZE = 12000
+EXAMINE_IMAGE_MAX_PIXELS = 50_000_000
+EXAMINE_CROP_SECTOR = True
+EXAMINE_INFERENCE_SIZES = [640, 480, 320]
+EXAMINE_LATENCY_HIGH = 2.0
+EXAMINE_LATENCY_LOW = 1.0
+EXAMINE_QUEUE_HIGH = 4
+EXAMINE_QUEUE_LOW = 1
+EXAMINE_ADMISSION = {
+    'default': {
+        'max_concurrency': 2,
+        'max_queue': {'interactive': 8, 'batch': 64, 'background': 64},
+        'queue_timeout': 30,
+    },
+    'femur': {
+        'max_concurrency': 2,
+        'max_queue': {'interactive': 8, 'batch': 64, 'background': 64},
+        'queue_timeout': 30,
+    },
+    'head': {
+        'max_concurrency': 2,
+        'max_queue': {'interactive': 8, 'batch': 64, 'background': 64},
+        'queue_timeout': 30,
+    },
+}
+EXAMINE_PRIORITY_WEIGHTS = {'interactive': 8, 'batch': 2, 'background': 1}
+EXAMINE_PRIORITY_AGING = 10.0
+EXAMINE_RETRY_AFTER = 5
+EXAMINE_RETRY_AFTER_MAX = 120
+EXAMINE_TIMEOUT = 60
+EXAMINE_TIMEOUT_MAX = 300
+# Inference runs in a pool of spawned processes sized from the physical cores, None derives it.
+# Every serving process starts its own pool on its share of the cores, set the number of serving
+# processes here when WEB_CONCURRENCY does not already tell it
+EXAMINE_WORKER_POOL = True
+EXAMINE_SERVING_PROCESSES = int(os.environ.get('WEB_CONCURRENCY', 1))
+EXAMINE_WORKERS = None
+EXAMINE_WORKER_THREADS = None
+EXAMINE_WORKER_AFFINITY = False
+# Images and results travel between the serving process and the workers through shared memory slots
+EXAMINE_SHM_TRANSPORT = True
+EXAMINE_SHM_SLOTS = None
+EXAMINE_SHM_SLOT_SIZE = 3 * 2048 * 2048
+# Cine loops are sampled at this rate, at most this many frames, and run through the model in batches
+EXAMINE_VIDEO_EXTENSIONS = ['mp4', 'avi', 'mov', 'mkv', 'webm', 'gif', 'tif', 'tiff']
+EXAMINE_VIDEO_SAMPLE_FPS = 5
+EXAMINE_VIDEO_MAX_FRAMES = 60
+EXAMINE_VIDEO_BATCH_SIZE = 8
+# Annotated overlays are rendered on first view under MEDIA_ROOT and evicted least recently used first
+EXAMINE_OVERLAY_CACHE_DIR = 'overlays'
+EXAMINE_OVERLAY_CACHE_SIZE = 512 * 1024 * 1024
+# Deep zoom tiles of exam images, rendered on first request and cached like the overlays
+EXAMINE_TILE_SIZE = 256
+EXAMINE_TILE_QUALITY = 90
+EXAMINE_TILE_CACHE_DIR = 'tiles'
+EXAMINE_TILE_CACHE_SIZE = 1024 * 1024 * 1024
+EXAMINE_TILE_MAX_AGE = 365 * 24 * 60 * 60
+# Resumable exam uploads are assembled here, outside MEDIA_ROOT, one PUT carries at most a chunk
+EXAMINE_UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
+EXAMINE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+EXAMINE_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+# Exam images whose scan sector is within this many of 256 bits of the perceptual hash of one of
+# the patient's earlier examinations are duplicates, at most 31, and when reusing, a copy of the same
+# framing (aspect ratio within the tolerance) is measured from the earlier outlines without the model
+EXAMINE_DUPLICATE_DISTANCE = 24
+EXAMINE_DUPLICATE_REUSE = False
+EXAMINE_DUPLICATE_ASPECT_TOLERANCE = 0.01
+# Similar exams are searched exactly by default, with IVF lists set only the rows of the
+# closest partitions are scored
+EXAMINE_SIMILAR_MAX = 50
+EXAMINE_EMBEDDING_IVF_LISTS = 0
+EXAMINE_EMBEDDING_IVF_PROBES = 8
+# Patients whose examine date is this far in the past are moved to the archive, inactive ones always are
+PATIENT_ARCHIVE_AFTER_DAYS = 2 * 365
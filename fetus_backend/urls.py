@@ -17,7 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from blobs.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,4 +26,8 @@ urlpatterns = [
     path('api/', include('patients.urls')),
     path('api/', include('patient_examine.urls')),
     path('api/', include('doctors.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+# Like static(), outside development the proxy serves media unless it asks Django first
+if settings.DEBUG or settings.MEDIA_SENDFILE:
+    urlpatterns.append(path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media, name='media'))
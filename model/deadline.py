@@ -0,0 +1,49 @@
+import math
+import time
+
+from django.conf import settings
+
+from model import stats
+from utils.exceptions import DeadlineExceededException
+
+
+class Deadline(object):
+    """
+    Point in time after which nobody is waiting for the result of an examination
+    any more, checked between the stages of the pipeline to stop early.
+    """
+
+    def __init__(self, timeout):
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_request(cls, request):
+        # Either a relative timeout in seconds or an absolute unix timestamp set by the client or proxy
+        timeout = settings.EXAMINE_TIMEOUT
+        try:
+            if 'X-Request-Timeout' in request.headers:
+                timeout = float(request.headers['X-Request-Timeout'])
+            elif 'X-Request-Deadline' in request.headers:
+                timeout = float(request.headers['X-Request-Deadline']) - time.time()
+        except ValueError:
+            pass
+        # nan compares false against the cap and would never expire
+        if not math.isfinite(timeout):
+            timeout = settings.EXAMINE_TIMEOUT
+        return cls(min(timeout, settings.EXAMINE_TIMEOUT_MAX))
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage):
+        if self.expired():
+            stats.increment('deadline', f'{stage}_expired')
+            raise DeadlineExceededException()
+
+
+def check_deadline(deadline, stage):
+    if deadline is not None:
+        deadline.check(stage)
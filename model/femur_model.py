@@ -1,55 +1,88 @@
 from pathlib import Path
-from ultralytics import YOLO
 import cv2
 import numpy as np
 
-from utils.utils import predict_and_save
+from utils.utils import (
+    load_model,
+    predict_masks,
+    take_embedding,
+    rank_instances,
+    mask_polygons,
+    scale_segmentation,
+    blend_overlay
+)
+from model.deadline import check_deadline
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-MEDIA_DIR = BASE_DIR / 'media'
 
 
-def save_examine_image(image_path, result, x, y, w, h):
+def draw_examine_image(result, x, y, w, h):
     cv2.rectangle(result, (x, y), (x + w, y + h), (0, 255, 0), 2)  # Green rectangle with thickness 2
     cv2.line(result, (x, y), (x + w, y + h), (0, 255, 0), 2)  # White diagonal line with thickness 2
-    cv2.imwrite(image_path, result)
+    return result
 
 
-def predict_femur_length_and_age(filename, pixel_depth):
-    image_path = f'{MEDIA_DIR}/{filename}'
-    model = YOLO(f'{BASE_DIR}/static/femur_model.pt')
+def femur_length_and_age(boxes, pixel_depth, scale=(1.0, 1.0)):
+    """
+    Femur lengths in mm and ages in weeks for an (instances, 4) array of (x, y, w, h) boxes.
+    """
+    w, h = boxes[:, 2], boxes[:, 3]
 
-    image_path = predict_and_save(model, image_path)
+    # Diagonal length of the rectangle, in pixels of the original image
+    scale_x, scale_y = scale
+    diagonal_length = np.sqrt((w * scale_x) ** 2 + (h * scale_y) ** 2)
 
-    if image_path is None:
-        return None, None
+    # Actual length in mm
+    femur_length = diagonal_length * pixel_depth
 
-    image = cv2.imread(image_path)
+    age_1 = (0.004 * np.power(femur_length, 2)) + (0.057 * femur_length) + 12.053
+    cm = femur_length / 10
+    age_2 = (0.262 * np.power(cm, 2)) + (2 * cm) + 11.5
+    femur_age = (age_1 + age_2) / 2
 
-    # Convert the image to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return femur_length, femur_age
 
-    # Threshold the image to separate background from the white circle
-    ret, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
 
-    # Find contours and hierarchy
-    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def predict_femur_length_and_age(image, pixel_depth, scale=(1.0, 1.0), sector=None, imgsz=None, deadline=None):
+    """
+    [(femur length, femur age, confidence)] for every femur found in `image`, most
+    confident first, their outlines and the embedding of the image.
+    """
+    model = load_model(f'{BASE_DIR}/static/femur_model.pt')
 
-    # Get the bounding rectangle of the contour (assuming only one contour)
-    x, y, w, h = cv2.boundingRect(contours[0])
+    check_deadline(deadline, 'inference')
+    masks, confidences, offset = predict_masks(model, image, sector, imgsz)
+    embedding = take_embedding(model)
 
-    # Draw the bounding rectangle and center ellipse on a copy of the original image
-    save_examine_image(image_path, image, x, y, w, h)
+    if masks is None:
+        return [], None, None
 
-    # Diagonal length of the rectangle
-    diagonal_length = np.sqrt(w ** 2 + h ** 2)
+    check_deadline(deadline, 'postprocess')
 
-    # Actual length in mm
-    femur_length = diagonal_length * pixel_depth
+    # Bounding rectangle of every thresholded femur mask
+    masks, confidences, boxes = rank_instances(masks, confidences)
 
-    age_1 = (0.004 * pow(femur_length, 2)) + (0.057 * femur_length) + 12.053
-    cm = femur_length / 10
-    age_2 = (0.262 * pow(cm, 2)) + (2 * cm) + 11.5
-    femur_age = (age_1 + age_2) / 2
+    if not len(boxes):
+        return [], None, None
 
-    return femur_length, femur_age
+    femur_lengths, femur_ages = femur_length_and_age(boxes, pixel_depth, scale)
+
+    # Outlines are kept so the exam can be re-measured and drawn later without running the model again
+    segmentation = {
+        'scale': list(scale),
+        'instances': mask_polygons(masks, offset)
+    }
+
+    return list(zip(femur_lengths.tolist(), femur_ages.tolist(), confidences.tolist())), segmentation, embedding
+
+
+def render_femur_overlay(image, segmentation):
+    """
+    `image` with the outline, bounding rectangle and diagonal of every stored femur drawn over it.
+    """
+    overlay = image.copy()
+    contours, boxes = scale_segmentation(segmentation)
+    for instance, (x, y, w, h) in zip(contours, boxes):
+        cv2.fillPoly(overlay, instance, (255, 255, 255))
+        overlay = draw_examine_image(overlay, x, y, w, h)
+    return blend_overlay(image, overlay)
@@ -1,62 +1,88 @@
 from pathlib import Path
-from ultralytics import YOLO
 import cv2
 import numpy as np
 
-from utils.utils import predict_and_save
+from utils.utils import (
+    load_model,
+    predict_masks,
+    take_embedding,
+    rank_instances,
+    mask_polygons,
+    scale_segmentation,
+    blend_overlay
+)
+from model.deadline import check_deadline
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-MEDIA_DIR = BASE_DIR / 'media'
 
 
-def save_examine_image(image_path, result, x, y, w, h, center, radius_x, radius_y):
+def draw_examine_image(result, x, y, w, h, center, radius_x, radius_y):
     cv2.rectangle(result, (x, y), (x + w, y + h), (0, 255, 0), 2)  # Green rectangle with thickness 2
     cv2.ellipse(result, center, (radius_x, radius_y), 0, 0, 360, (255, 255, 255), -1)  # Red ellipse for center
-    cv2.imwrite(image_path, result)
+    return result
 
 
-def predict_head_circumference_and_age(filename, pixel_depth):
-    image_path = f'{MEDIA_DIR}/{filename}'
-    model = YOLO(f'{BASE_DIR}/static/head_model.pt')
+def head_circumference_and_age(boxes, pixel_depth, scale=(1.0, 1.0)):
+    """
+    Head circumferences in mm and gestational ages in weeks for an (instances, 4)
+    array of (x, y, w, h) boxes.
+    """
+    w, h = boxes[:, 2], boxes[:, 3]
 
-    image_path = predict_and_save(model, image_path)
+    # Compute the circumference of the ellipse, in pixels of the original image
+    scale_x, scale_y = scale
+    original_radius_x = w * scale_x // 2
+    original_radius_y = h * scale_y // 2
+    circumference = np.pi * np.sqrt(2 * (original_radius_x ** 2 + original_radius_y ** 2))
 
-    if image_path is None:
-        return None, None
+    # Compute the head circumference
+    head_circumference = circumference * pixel_depth
 
-    image = cv2.imread(image_path)
+    # Compute the gestational age
+    gestational_age = 0.0001797*head_circumference*head_circumference + 0.02631*head_circumference + 9.667
 
-    # Convert the image to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return head_circumference, gestational_age
 
-    # Threshold the image to separate background from the white circle
-    ret, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
 
-    # Find contours, hierarchy
-    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def predict_head_circumference_and_age(image, pixel_depth, scale=(1.0, 1.0), sector=None, imgsz=None, deadline=None):
+    """
+    [(head circumference, gestational age, confidence)] for every head found in
+    `image`, most confident first, their outlines and the embedding of the image.
+    """
+    model = load_model(f'{BASE_DIR}/static/head_model.pt')
 
-    # Get the bounding rectangle of the contour (assuming only one contour)
-    x, y, w, h = cv2.boundingRect(contours[0])
+    check_deadline(deadline, 'inference')
+    masks, confidences, offset = predict_masks(model, image, sector, imgsz)
+    embedding = take_embedding(model)
 
-    # Calculate the center point of the bounding rectangle
-    center = (x + w // 2, y + h // 2)
+    if masks is None:
+        return [], None, None
 
-    # Calculate the radii of the ellipse to fit within the rectangle
-    radius_x = w // 2
-    radius_y = h // 2
+    check_deadline(deadline, 'postprocess')
 
-    # Draw the bounding rectangle and center ellipse on a copy of the original image
-    result = np.zeros_like(image)
+    # Bounding rectangle of every thresholded head mask
+    masks, confidences, boxes = rank_instances(masks, confidences)
 
-    save_examine_image(image_path, result, x, y, w, h, center, radius_x, radius_y)
+    if not len(boxes):
+        return [], None, None
 
-    # Compute the circumference of the ellipse
-    circumference = np.pi * np.sqrt(2 * (radius_x ** 2 + radius_y ** 2))
+    head_circumferences, gestational_ages = head_circumference_and_age(boxes, pixel_depth, scale)
 
-    # Compute the head circumference
-    head_circumference = circumference * pixel_depth
+    # Outlines are kept so the exam can be re-measured and drawn later without running the model again
+    segmentation = {
+        'scale': list(scale),
+        'instances': mask_polygons(masks, offset)
+    }
 
-    # Compute the gestational age
-    gestational_age = 0.0001797*head_circumference*head_circumference + 0.02631*head_circumference + 9.667
+    return list(zip(head_circumferences.tolist(), gestational_ages.tolist(), confidences.tolist())), segmentation, embedding
 
-    return head_circumference, gestational_age
+
+def render_head_overlay(image, segmentation):
+    """
+    `image` with the bounding rectangle and fitted ellipse of every stored head drawn over it.
+    """
+    overlay = image.copy()
+    _, boxes = scale_segmentation(segmentation)
+    for x, y, w, h in boxes:
+        overlay = draw_examine_image(overlay, x, y, w, h, (x + w // 2, y + h // 2), w // 2, h // 2)
+    return blend_overlay(image, overlay)
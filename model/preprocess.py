@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+THUMBNAIL_SIZE = 256
+# Grey level above which a thumbnail pixel is considered part of the scan rather than the black border
+SECTOR_THRESHOLD = 12
+# Blobs smaller than this fraction of the thumbnail are UI remnants, not scan
+SECTOR_MIN_BLOB = 0.01
+# Padding kept around the detected sector, as a fraction of the image size
+SECTOR_MARGIN = 0.03
+# Crops that keep more than this fraction of the image are not worth it
+SECTOR_MAX_COVERAGE = 0.9
+
+# Quality gate thresholds, measured on the thumbnail
+MIN_SECTOR_COVERAGE = 0.05
+MIN_CONTRAST = 8.0
+MAX_SATURATED = 0.5
+MAX_COLORFULNESS = 30.0
+MIN_SHARPNESS = 40.0
+
+QUALITY_REJECTIONS = {
+    'blank': _('Image is blank.'),
+    'no_sector': _('No ultrasound scan found in the image.'),
+    'not_ultrasound': _('Image does not look like an ultrasound scan.'),
+    'overexposed': _('Image is overexposed.'),
+    'blurry': _('Image is too blurry to examine.'),
+}
+
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    H, W = image.shape[:2]
+    factor = min(1.0, size / max(H, W))
+    if factor < 1.0:
+        image = cv2.resize(
+            image, (max(1, round(W * factor)), max(1, round(H * factor))), interpolation=cv2.INTER_AREA
+        )
+    return image, factor
+
+
+def check_image_quality(thumbnail):
+    """
+    Reason from QUALITY_REJECTIONS for which the thumbnail is not worth running
+    the model on, or None when it looks like a usable ultrasound scan.
+    """
+    # Ultrasound is rendered in grey, photos and other screenshots are not
+    blue, green, red = np.moveaxis(thumbnail.astype(np.int16), -1, 0)
+    colorfulness = np.abs(red - green).mean() + np.abs(green - blue).mean()
+    if colorfulness > MAX_COLORFULNESS:
+        return 'not_ultrasound'
+
+    gray = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+    histogram = np.bincount(gray.ravel(), minlength=256)
+
+    foreground_pixels = histogram[SECTOR_THRESHOLD + 1:].sum()
+    if foreground_pixels == 0 or gray.std() < MIN_CONTRAST:
+        return 'blank'
+    if foreground_pixels < MIN_SECTOR_COVERAGE * gray.size:
+        return 'no_sector'
+    if histogram[250:].sum() > MAX_SATURATED * foreground_pixels:
+        return 'overexposed'
+
+    # Variance of the Laplacian inside the scan, away from the sharp sector edge
+    foreground = (gray > SECTOR_THRESHOLD).astype(np.uint8)
+    foreground = cv2.erode(foreground, np.ones((5, 5), np.uint8))
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+    if not foreground.any() or laplacian[foreground > 0].var() < MIN_SHARPNESS:
+        return 'blurry'
+
+    return None
+
+
+def inspect_image(image):
+    """
+    Quality rejection reason and scan sector of `image`, both computed from one thumbnail.
+    """
+    thumbnail, factor = make_thumbnail(image)
+
+    reason = check_image_quality(thumbnail)
+    if reason is not None:
+        return reason, None
+
+    if not settings.EXAMINE_CROP_SECTOR:
+        return None, None
+
+    return None, find_scan_sector(image, cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY), factor)
+
+
+def find_scan_sector(image, thumbnail=None, factor=None):
+    """
+    Bounding box (x0, y0, x1, y1) of the ultrasound sector in `image`, or None when
+    the sector cannot be told apart from the rest of the screenshot.
+    """
+    if thumbnail is None:
+        thumbnail, factor = make_thumbnail(image)
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+    foreground = (thumbnail > SECTOR_THRESHOLD).astype(np.uint8)
+
+    # Opening removes thin overlay text, calipers and rulers but keeps the speckled sector
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+    foreground = cv2.morphologyEx(foreground, cv2.MORPH_OPEN, kernel)
+
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(foreground, connectivity=8)
+
+    # Fluid inside the sector is as dark as the border, so keep every sizeable blob, not only the largest
+    blobs = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= SECTOR_MIN_BLOB * foreground.size]
+    if len(blobs) == 0:
+        return None
+
+    x0 = blobs[:, cv2.CC_STAT_LEFT].min()
+    y0 = blobs[:, cv2.CC_STAT_TOP].min()
+    x1 = (blobs[:, cv2.CC_STAT_LEFT] + blobs[:, cv2.CC_STAT_WIDTH]).max()
+    y1 = (blobs[:, cv2.CC_STAT_TOP] + blobs[:, cv2.CC_STAT_HEIGHT]).max()
+
+    # Back to full resolution coordinates, with some margin around the sector
+    H, W = image.shape[:2]
+    margin_x, margin_y = SECTOR_MARGIN * W, SECTOR_MARGIN * H
+    x0 = max(0, int(np.floor(x0 / factor - margin_x)))
+    y0 = max(0, int(np.floor(y0 / factor - margin_y)))
+    x1 = min(W, int(np.ceil(x1 / factor + margin_x)))
+    y1 = min(H, int(np.ceil(y1 / factor + margin_y)))
+
+    if (x1 - x0) * (y1 - y0) > SECTOR_MAX_COVERAGE * W * H:
+        return None
+
+    return x0, y0, x1, y1
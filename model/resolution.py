@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from model import stats
+
+
+class ResolutionController(object):
+    """
+    Picks the inference size of a model from recent latency and the number of
+    inferences in flight or queued, stepping down through `sizes` under load and
+    back up once the projected latency at the next larger size is comfortable again.
+    """
+
+    def __init__(self, name, sizes, latency_high, latency_low, queue_high, queue_low, cooldown=5.0, alpha=0.2):
+        self.name = name
+        self.sizes = sorted(sizes, reverse=True)
+        self.latency_high = latency_high
+        self.latency_low = latency_low
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.cooldown = cooldown
+        self.alpha = alpha
+
+        self.level = 0
+        # Moving average of the latency, normalised to the largest size
+        self.latency = None
+        self.in_flight = 0
+        self.queued = 0
+        self.changed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.sizes[self.level]
+
+    def expected_latency(self, level):
+        # Inference cost grows with the number of input pixels
+        return (self.latency or 0.0) * (self.sizes[level] / self.sizes[0]) ** 2
+
+    def _adjust(self, now):
+        if now - self.changed_at < self.cooldown:
+            return
+
+        depth = self.in_flight + self.queued
+        overloaded = depth > self.queue_high or self.expected_latency(self.level) > self.latency_high
+        if overloaded and self.level < len(self.sizes) - 1:
+            self.level += 1
+            self.changed_at = now
+            stats.increment('resolution', f'{self.name}_step_down')
+            return
+
+        if overloaded or self.level == 0 or depth > self.queue_low:
+            return
+
+        if self.expected_latency(self.level - 1) < self.latency_low:
+            self.level -= 1
+            self.changed_at = now
+            stats.increment('resolution', f'{self.name}_step_up')
+
+    @contextmanager
+    def track(self, queued=0):
+        with self._lock:
+            self.in_flight += 1
+            self.queued = queued
+            self._adjust(time.monotonic())
+            size = self.size
+
+        started = time.monotonic()
+        try:
+            yield size
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self.in_flight -= 1
+                latency = (finished - started) * (self.sizes[0] / size) ** 2
+                self.latency = latency if self.latency is None else (
+                    self.alpha * latency + (1 - self.alpha) * self.latency
+                )
+                self._adjust(finished)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_resolution_controller(name):
+    with _controllers_lock:
+        if name not in _controllers:
+            _controllers[name] = ResolutionController(
+                name,
+                settings.EXAMINE_INFERENCE_SIZES,
+                settings.EXAMINE_LATENCY_HIGH,
+                settings.EXAMINE_LATENCY_LOW,
+                settings.EXAMINE_QUEUE_HIGH,
+                settings.EXAMINE_QUEUE_LOW,
+            )
+        return _controllers[name]
@@ -0,0 +1,214 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from model import stats
+from utils.exceptions import ServiceBusyException, DeadlineExceededException
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+PRIORITY_CLASSES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# Use the scheduler's configured queue timeout, None waits for as long as it takes
+DEFAULT_TIMEOUT = object()
+
+
+class _Waiter(object):
+    __slots__ = ('priority', 'enqueued', 'deadline', 'event', 'granted')
+
+    def __init__(self, priority, enqueued, deadline):
+        self.priority = priority
+        self.enqueued = enqueued
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.granted = False
+
+
+class InferenceScheduler(object):
+    """
+    Hands out a bounded number of inference slots for one endpoint.
+
+    Waiting requests are queued per priority class and slots are shared between
+    classes by weight (stride scheduling), with waiting time lowering a class'
+    pass so that background work is never starved. Requests that find their
+    class queue full are rejected straight away with a Retry-After estimated
+    from the drain rate, queued requests whose deadline passed are skipped.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue, queue_timeout, weights, aging, window=20, alpha=0.2):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.aging = aging
+        self.alpha = alpha
+
+        self.strides = {priority: 1.0 / weight for priority, weight in weights.items()}
+        self.passes = {priority: 0.0 for priority in weights}
+        self.queues = {priority: deque() for priority in weights}
+        # Moving average of the time spent queued, per class
+        self.wait_times = {priority: None for priority in weights}
+        self.virtual_time = 0.0
+
+        self.running = 0
+        # Completion times of the last few inferences, to estimate how fast the queue drains
+        self.completions = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def drain_rate(self):
+        if len(self.completions) < 2:
+            return None
+        elapsed = self.completions[-1] - self.completions[0]
+        if elapsed <= 0:
+            return None
+        return (len(self.completions) - 1) / elapsed
+
+    def retry_after(self, priority):
+        rate = self.drain_rate()
+        if rate is None:
+            return settings.EXAMINE_RETRY_AFTER
+        # Time until everyone already waiting in this class, and this request, would have been served
+        return min(max(1, math.ceil((len(self.queues[priority]) + 1) / rate)), settings.EXAMINE_RETRY_AFTER_MAX)
+
+    def reject(self, priority, reason):
+        stats.increment('admission', f'{self.name}_{priority}_{reason}')
+        raise ServiceBusyException(self.retry_after(priority))
+
+    def _charge(self, priority):
+        self.virtual_time = self.passes[priority]
+        self.passes[priority] += self.strides[priority]
+        self.running += 1
+
+    def _pick(self, now):
+        # Lowest pass wins, every `aging` seconds the head of a queue has waited is worth the largest stride
+        largest_stride = max(self.strides.values())
+        best, best_pass = None, None
+        for priority, queue in self.queues.items():
+            if not queue:
+                continue
+            effective_pass = self.passes[priority] - (now - queue[0].enqueued) / self.aging * largest_stride
+            if best is None or effective_pass < best_pass:
+                best, best_pass = priority, effective_pass
+        return best
+
+    def _dispatch(self, now):
+        while self.running < self.max_concurrency:
+            priority = self._pick(now)
+            if priority is None:
+                return
+            waiter = self.queues[priority].popleft()
+            if waiter.deadline is not None and waiter.deadline.expired():
+                # Nobody is waiting for this result any more, wake it up to give up without a slot
+                waiter.event.set()
+                continue
+            self._charge(priority)
+            waiter.granted = True
+            waiter.event.set()
+
+    def _acquire(self, priority, timeout, deadline):
+        with self._lock:
+            now = time.monotonic()
+            if self.running < self.max_concurrency and not self.waiting:
+                self._charge(priority)
+                return
+
+            queue = self.queues[priority]
+            if len(queue) >= self.max_queue[priority]:
+                self.reject(priority, 'rejected')
+
+            # A class coming back from idle gets no credit for the time it had nothing queued
+            if not queue:
+                self.passes[priority] = max(self.passes[priority], self.virtual_time)
+            waiter = _Waiter(priority, now, deadline)
+            queue.append(waiter)
+            self._dispatch(now)
+
+        if deadline is not None:
+            timeout = deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+        waiter.event.wait(max(timeout, 0) if timeout is not None else None)
+
+        with self._lock:
+            waited = time.monotonic() - waiter.enqueued
+            if not waiter.granted:
+                if waiter in self.queues[priority]:
+                    self.queues[priority].remove(waiter)
+                if deadline is not None and deadline.expired():
+                    stats.increment('admission', f'{self.name}_{priority}_expired')
+                    raise DeadlineExceededException()
+                self.reject(priority, 'timed_out')
+
+            average = self.wait_times[priority]
+            self.wait_times[priority] = waited if average is None else (
+                self.alpha * waited + (1 - self.alpha) * average
+            )
+
+    def _release(self):
+        with self._lock:
+            now = time.monotonic()
+            self.running -= 1
+            self.completions.append(now)
+            self._dispatch(now)
+
+    @contextmanager
+    def admit(self, priority=INTERACTIVE, timeout=DEFAULT_TIMEOUT, deadline=None):
+        if priority not in self.queues:
+            priority = INTERACTIVE
+        self._acquire(priority, self.queue_timeout if timeout is DEFAULT_TIMEOUT else timeout, deadline)
+        stats.increment('admission', f'{self.name}_{priority}_admitted')
+
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def state(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'running': self.running,
+                'waiting': self.waiting,
+                'max_concurrency': self.max_concurrency,
+                'drain_rate': self.drain_rate(),
+                'classes': {
+                    priority: {
+                        'waiting': len(queue),
+                        'max_queue': self.max_queue[priority],
+                        'average_wait': self.wait_times[priority],
+                        'oldest_wait': now - queue[0].enqueued if queue else None,
+                    }
+                    for priority, queue in self.queues.items()
+                }
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_inference_scheduler(name):
+    with _schedulers_lock:
+        if name not in _schedulers:
+            config = settings.EXAMINE_ADMISSION.get(name, settings.EXAMINE_ADMISSION['default'])
+            _schedulers[name] = InferenceScheduler(
+                name,
+                config['max_concurrency'],
+                config['max_queue'],
+                config['queue_timeout'],
+                settings.EXAMINE_PRIORITY_WEIGHTS,
+                settings.EXAMINE_PRIORITY_AGING,
+            )
+        return _schedulers[name]
+
+
+def get_inference_schedulers():
+    with _schedulers_lock:
+        return dict(_schedulers)
@@ -0,0 +1,16 @@
+import threading
+from collections import Counter
+
+# Per process counters of the examine pipeline, grouped by pipeline stage
+_lock = threading.Lock()
+_counters = {}
+
+
+def increment(group, key, amount=1):
+    with _lock:
+        _counters.setdefault(group, Counter())[key] += amount
+
+
+def snapshot():
+    with _lock:
+        return {group: dict(counter) for group, counter in _counters.items()}
@@ -0,0 +1,136 @@
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Reference counts sit in front of the slots, padded to keep the slots cache line aligned
+HEADER_ALIGNMENT = 64
+
+
+def header_size(slots):
+    return -(-slots * 4 // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+
+
+class SharedRing(object):
+    """
+    Fixed-size slots in one shared memory block, used to hand images to and back
+    from inference processes without pickling them.
+
+    Every slot has a reference count in the block header, guarded by a lock shared
+    between the processes. A slot is reused once its count drops back to zero.
+    A closed ring keeps its mapping until the views handed out of it are gone.
+    """
+
+    def __init__(self, shm, slots, slot_size, lock):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.lock = lock
+        self.refcounts = np.ndarray((slots,), dtype=np.int32, buffer=shm.buf)
+        self.data_offset = header_size(slots)
+        self.cursor = 0
+        # Copies and views of this process still using the mapping
+        self.users = 0
+        self.closed = False
+
+    @classmethod
+    def create(cls, slots, slot_size, lock):
+        shm = shared_memory.SharedMemory(create=True, size=header_size(slots) + slots * slot_size)
+        ring = cls(shm, slots, slot_size, lock)
+        ring.refcounts[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, slots, slot_size, lock):
+        # Spawned workers share the creator's resource tracker, the block is unlinked by the creator only
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, slots, slot_size, lock)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _use(self):
+        with self.lock:
+            if self.closed:
+                return False
+            self.users += 1
+            return True
+
+    def _done(self):
+        with self.lock:
+            self.users -= 1
+            unmap = self.closed and self.users == 0
+        if unmap:
+            self.shm.close()
+
+    def _acquire(self):
+        with self.lock:
+            if self.closed:
+                return None
+            for step in range(self.slots):
+                index = (self.cursor + step) % self.slots
+                if self.refcounts[index] == 0:
+                    self.refcounts[index] = 1
+                    self.cursor = (index + 1) % self.slots
+                    return index
+        return None
+
+    def release(self, index):
+        with self.lock:
+            # Views of a closed ring may still be released by their finalizers
+            if not self.closed and self.refcounts[index] > 0:
+                self.refcounts[index] -= 1
+
+    def _view(self, index, shape, dtype):
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=self.data_offset + index * self.slot_size)
+
+    def put(self, array):
+        """
+        Copy `array` into a free slot and return its handle, or None when it does
+        not fit or every slot is in use so the caller can fall back to pickling.
+        """
+        if array.nbytes > self.slot_size or not self._use():
+            return None
+        try:
+            index = self._acquire()
+            if index is None:
+                return None
+            self._view(index, array.shape, array.dtype)[...] = array
+            return index, array.shape, array.dtype.str
+        finally:
+            self._done()
+
+    def get(self, handle):
+        index, shape, dtype = handle
+        return self._view(index, shape, np.dtype(dtype))
+
+    def take(self, handle):
+        """
+        View of the slot that releases it once the view and everything derived from it are
+        gone, or None when the ring was closed in the meantime.
+        """
+        if not self._use():
+            return None
+        view = self.get(handle)
+        weakref.finalize(view, self._untake, handle[0])
+        return view
+
+    def _untake(self, index):
+        self.release(index)
+        self._done()
+
+    def close(self, unlink=False):
+        with self.lock:
+            self.closed = True
+            self.refcounts = None
+            unmap = self.users == 0
+        if unlink:
+            self.shm.unlink()
+        # numpy views do not hold the mapping open, unmapping under them would crash the process
+        if unmap:
+            self.shm.close()
+
+
+def is_handle(value):
+    return isinstance(value, tuple) and len(value) == 3
@@ -0,0 +1,140 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from utils.utils import load_model, mask_polygons, rank_instances, result_masks, take_embedding
+from model.deadline import check_deadline
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MULTI_PAGE_EXTENSIONS = ('.tif', '.tiff')
+# Femur masks this many times longer than wide get the full shape score
+FEMUR_ELONGATION = 5.0
+
+
+def iter_video_frames(path, sample_fps, max_frames):
+    """
+    Yields (frame index, frame) for frames sampled at about `sample_fps`. Skipped
+    frames are only grabbed, not decoded, and only one frame is held at a time.
+    """
+    if path.lower().endswith(MULTI_PAGE_EXTENSIONS):
+        yield from iter_page_frames(path, max_frames)
+        return
+
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or sample_fps
+        step = max(1, round(fps / sample_fps))
+        index, sampled = 0, 0
+        while sampled < max_frames and capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, frame
+                    sampled += 1
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_page_frames(path, max_frames):
+    # Multi-page TIFF exports, every page is a frame but pages are still read one at a time
+    pages = cv2.imcount(path)
+    step = max(1, -(-pages // max_frames))
+    for index in range(0, pages, step):
+        ok, frames = cv2.imreadmulti(path, index, 1, flags=cv2.IMREAD_COLOR)
+        if ok and frames:
+            yield index, frames[0]
+
+
+def batched(frames, size):
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def shape_score(kind, mask):
+    """
+    How much a binary mask looks like the structure being measured, from 0 to 1.
+    """
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return 0.0
+    contour = max(contours, key=cv2.contourArea)
+
+    if kind == 'femur':
+        # A femur is a long thin bone
+        (_, _), (w, h), _ = cv2.minAreaRect(contour)
+        if min(w, h) == 0:
+            return 0.0
+        return min(max(w, h) / min(w, h) / FEMUR_ELONGATION, 1.0)
+
+    # A head is an ellipse, a mask that fills its fitted ellipse is a clean cut
+    if len(contour) < 5:
+        return 0.0
+    (_, _), (a, b), _ = cv2.fitEllipse(contour)
+    ellipse_area = np.pi * a * b / 4
+    if ellipse_area == 0:
+        return 0.0
+    return max(0.0, 1.0 - abs(1.0 - cv2.contourArea(contour) / ellipse_area))
+
+
+def frame_score(kind, result):
+    # Best instance in the frame, by detection confidence weighted by mask shape
+    if result.masks is None:
+        return 0.0
+    masks = (result.masks.data.cpu().numpy() > 0.5).astype(np.uint8)
+    confidences = result.boxes.conf.cpu().numpy()
+    return max(
+        (float(confidence) * shape_score(kind, mask) for confidence, mask in zip(confidences, masks)),
+        default=0.0
+    )
+
+
+def select_best_frame(kind, path, imgsz=None, deadline=None):
+    """
+    (frame index, prediction, frame) of the sampled frame of the clip at `path` with the
+    best scoring mask, or (None, None, None) when no frame had one. The prediction is what
+    the model found on that frame while scoring it, the outlines of every measurable
+    instance, most confident first, their confidences and the frame's embedding, so the
+    frame is measured without running the model on it again.
+    """
+    model = load_model(f'{BASE_DIR}/static/{kind}_model.pt')
+    frames = iter_video_frames(path, settings.EXAMINE_VIDEO_SAMPLE_FPS, settings.EXAMINE_VIDEO_MAX_FRAMES)
+
+    best_score, best_index, best_frame, best_result, best_embedding = 0.0, None, None, None, None
+    for batch in batched(frames, settings.EXAMINE_VIDEO_BATCH_SIZE):
+        check_deadline(deadline, 'inference')
+        results = model([frame for _, frame in batch], imgsz=imgsz or settings.EXAMINE_INFERENCE_SIZE)
+        best_position = None
+        for position, ((index, frame), result) in enumerate(zip(batch, results)):
+            score = frame_score(kind, result)
+            if score > best_score:
+                best_score, best_index, best_frame, best_result = score, index, frame, result
+                best_position = position
+        # The embeddings of the batch are only kept for its best frame
+        embedding = take_embedding(model, best_position or 0)
+        if best_position is not None:
+            best_embedding = embedding
+
+    if best_frame is None:
+        return None, None, None
+
+    check_deadline(deadline, 'postprocess')
+    masks, confidences = result_masks(best_result, best_frame.shape[:2])
+    masks, confidences, _ = rank_instances(masks, confidences)
+    prediction = (mask_polygons(masks), confidences.tolist(), best_embedding)
+    return best_index, prediction, best_frame
+
+
+def frame_image_name(name, frame_index):
+    stem, _ = os.path.splitext(os.path.basename(name))
+    return f'{stem}_frame{frame_index}.png'
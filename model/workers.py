@@ -0,0 +1,286 @@
+import atexit
+import functools
+import glob
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import psutil
+from django.conf import settings
+
+from model.transport import SharedRing, is_handle
+from utils.exceptions import DeadlineExceededException
+
+_pool = None
+_pool_lock = threading.Lock()
+_local_threads = None
+
+# Shared memory rings for images going to the workers and results coming back, in both the
+# serving process and the workers
+_input_ring = None
+_output_ring = None
+# Process that created the rings, the only one to unlink them
+_rings_pid = None
+
+
+def physical_core_cpus():
+    """
+    One logical CPU per physical core, so that pinned workers never share a core
+    through hyper-threading siblings.
+    """
+    cores = {}
+    for path in sorted(glob.glob('/sys/devices/system/cpu/cpu[0-9]*/topology/core_id')):
+        cpu = int(path.split('/')[-3][3:])
+        topology = os.path.dirname(path)
+        try:
+            with open(path) as core_id, open(os.path.join(topology, 'physical_package_id')) as package_id:
+                cores.setdefault((int(package_id.read()), int(core_id.read())), cpu)
+        except OSError:
+            continue
+
+    available = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else set(range(os.cpu_count() or 1))
+    cpus = sorted(cpu for cpu in cores.values() if cpu in available)
+    return cpus or sorted(available)
+
+
+def get_core_share():
+    # Physical cores left to each serving process, which all run their own inference
+    physical = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    return max(1, physical // max(1, settings.EXAMINE_SERVING_PROCESSES))
+
+
+def get_pool_config(workers=None, threads=None):
+    """
+    (workers, intra-op threads per worker) so that workers * threads covers this
+    serving process' share of the physical cores without oversubscribing them.
+    """
+    cores = get_core_share()
+
+    workers = workers or settings.EXAMINE_WORKERS
+    threads = threads or settings.EXAMINE_WORKER_THREADS
+    if workers is None:
+        workers = max(1, cores // (threads or 2))
+    if threads is None:
+        threads = max(1, cores // workers)
+
+    return workers, threads
+
+
+def set_torch_threads(threads):
+    import torch
+
+    # Intra-op threads are the share of the cores, inter-op parallelism only adds contention
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only possible before the first parallel work of the process
+        pass
+
+
+def set_local_threads():
+    """
+    Limit inference run in the serving process itself to its share of the cores, once.
+    """
+    global _local_threads
+
+    with _pool_lock:
+        if _local_threads is None:
+            _local_threads = settings.EXAMINE_WORKER_THREADS or get_core_share()
+            set_torch_threads(_local_threads)
+
+
+def init_worker(counter, threads, affinity, transport=None):
+    import django
+
+    global _input_ring, _output_ring
+
+    django.setup()
+
+    if transport is not None:
+        input_name, output_name, slots, slot_size, lock = transport
+        _input_ring = SharedRing.attach(input_name, slots, slot_size, lock)
+        _output_ring = SharedRing.attach(output_name, slots, slot_size, lock)
+
+    set_torch_threads(threads)
+
+    if affinity and hasattr(os, 'sched_setaffinity'):
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        cpus = physical_core_cpus()
+        start = (index * threads) % len(cpus)
+        os.sched_setaffinity(0, [cpus[(start + i) % len(cpus)] for i in range(threads)])
+
+
+def run_examine(kind, *args):
+    from model.femur_model import predict_femur_length_and_age
+    from model.head_model import predict_head_circumference_and_age
+
+    predict = predict_femur_length_and_age if kind == 'femur' else predict_head_circumference_and_age
+    return predict(*args)
+
+
+def run_examine_shared(kind, handle, *args):
+    # The image is read in place from the input ring
+    image = _input_ring.get(handle)
+    try:
+        return run_examine(kind, image, *args)
+    finally:
+        del image
+        _input_ring.release(handle[0])
+
+
+def create_rings(workers):
+    global _input_ring, _output_ring, _rings_pid
+
+    context = multiprocessing.get_context('spawn')
+    lock = context.Lock()
+    slots = settings.EXAMINE_SHM_SLOTS or 2 * workers
+    _input_ring = SharedRing.create(slots, settings.EXAMINE_SHM_SLOT_SIZE, lock)
+    _output_ring = SharedRing.create(slots, settings.EXAMINE_SHM_SLOT_SIZE, lock)
+    _rings_pid = os.getpid()
+    return _input_ring.name, _output_ring.name, slots, settings.EXAMINE_SHM_SLOT_SIZE, lock
+
+
+@atexit.register
+def close_rings():
+    """
+    Close and unlink the rings of the current pool, in the process that created them.
+    """
+    global _input_ring, _output_ring
+
+    rings, _input_ring, _output_ring = (_input_ring, _output_ring), None, None
+    for ring in rings:
+        if ring is not None:
+            ring.close(unlink=_rings_pid == os.getpid())
+
+
+def create_pool(workers, threads, affinity=False, transport=None):
+    # torch does not survive being forked once initialised, workers are spawned
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(context.Value('i', 0), threads, affinity, transport),
+    )
+
+
+def get_inference_pool():
+    global _pool
+
+    if not settings.EXAMINE_WORKER_POOL:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            workers, threads = get_pool_config()
+            transport = create_rings(workers) if settings.EXAMINE_SHM_TRANSPORT else None
+            # Pools of other serving processes would be pinned to the same cores
+            affinity = settings.EXAMINE_WORKER_AFFINITY and settings.EXAMINE_SERVING_PROCESSES <= 1
+            _pool = create_pool(workers, threads, affinity, transport)
+        return _pool
+
+
+def reset_inference_pool(pool):
+    global _pool
+
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            # The next pool gets rings of its own, these would only be left behind in /dev/shm
+            close_rings()
+    pool.shutdown(wait=False)
+
+
+def run_select_frame(kind, path, *args):
+    from model.video import select_best_frame
+
+    frame_index, prediction, frame = select_best_frame(kind, path, *args)
+    if frame is not None and _output_ring is not None:
+        frame = _output_ring.put(frame) or frame
+    return frame_index, prediction, frame
+
+
+def discard_pool(pool, rings, handle=None):
+    # A worker died, possibly holding the slot, start over with a fresh pool on the next request
+    if handle is not None:
+        rings[0].release(handle[0])
+    reset_inference_pool(pool)
+
+
+def submit(pool, rings, handle, *args):
+    try:
+        return pool.submit(*args)
+    except BrokenProcessPool:
+        # The pool broke since the last request and nobody noticed yet
+        discard_pool(pool, rings, handle)
+        raise
+
+
+def wait_for_result(pool, future, deadline, rings, handle=None):
+    # The rings the request started with, a reset by another request replaces the global ones
+    input_ring, output_ring = rings
+    try:
+        result = future.result(timeout=None if deadline is None else max(deadline.remaining(), 0))
+    except TimeoutError:
+        if future.cancel() and handle is not None:
+            input_ring.release(handle[0])
+        # A result that still arrives has nobody to read it, give its slot back
+        future.add_done_callback(functools.partial(release_abandoned_result, output_ring))
+        raise DeadlineExceededException()
+    except BrokenProcessPool:
+        discard_pool(pool, rings, handle)
+        raise
+
+    # An image handed back through the output ring is always the last item of what the worker returns
+    *result, array = result
+    if is_handle(array):
+        array = output_ring.take(array)
+    return (*result, array)
+
+
+def dispatch_examine(kind, *args, deadline=None):
+    """
+    Run the examination in the inference pool, or in this process when the pool is disabled.
+    """
+    pool = get_inference_pool()
+    if pool is None:
+        set_local_threads()
+        return run_examine(kind, *args, deadline)
+
+    rings = (_input_ring, _output_ring)
+    image, args = args[0], args[1:]
+    handle = rings[0].put(image) if rings[0] is not None else None
+    if handle is None:
+        future = submit(pool, rings, handle, run_examine, kind, image, *args, deadline)
+    else:
+        future = submit(pool, rings, handle, run_examine_shared, kind, handle, *args, deadline)
+
+    return wait_for_result(pool, future, deadline, rings, handle)
+
+
+def dispatch_select_frame(kind, path, imgsz=None, deadline=None):
+    """
+    Pick the best frame of the clip at `path` in the inference pool, the workers read
+    the clip from the same path.
+    """
+    pool = get_inference_pool()
+    if pool is None:
+        set_local_threads()
+        return run_select_frame(kind, path, imgsz, deadline)
+
+    rings = (_input_ring, _output_ring)
+    future = submit(pool, rings, None, run_select_frame, kind, path, imgsz, deadline)
+    return wait_for_result(pool, future, deadline, rings)
+
+
+def release_abandoned_result(output_ring, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()[-1]
+    if is_handle(result):
+        output_ring.release(result[0])
@@ -1,19 +1,50 @@
 from django.contrib import admin
 
-from .models import PatientFemurExamine, PatientHeadExamine
+from .models import (
+    PatientFemurExamine,
+    PatientHeadExamine,
+    PatientFemurMeasurement,
+    PatientHeadMeasurement,
+    PatientExamineHistory
+)
+
+
+class PatientFemurMeasurementInline(admin.TabularInline):
+    model = PatientFemurMeasurement
+    extra = 0
+    readonly_fields = ('index', 'femur_length', 'femur_age', 'confidence')
+
+
+class PatientHeadMeasurementInline(admin.TabularInline):
+    model = PatientHeadMeasurement
+    extra = 0
+    readonly_fields = ('index', 'head_circumference', 'gestational_age', 'confidence')
 
 
 class PatientFemurExamineAdmin(admin.ModelAdmin):
     list_display = ('id', 'femur_length', 'femur_age')
     ordering = ['id']
-    readonly_fields = ('femur_length', 'femur_age')
+    readonly_fields = ('femur_length', 'femur_age', 'inference_size', 'frame_index')
+    inlines = [PatientFemurMeasurementInline]
 
 
 class PatientHeadExamineAdmin(admin.ModelAdmin):
     list_display = ('id', 'head_circumference', 'gestational_age')
     ordering = ['id']
-    readonly_fields = ('head_circumference', 'gestational_age')
+    readonly_fields = ('head_circumference', 'gestational_age', 'inference_size', 'frame_index')
+    inlines = [PatientHeadMeasurementInline]
+
+
+class PatientExamineHistoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient_id', 'kind', 'examined_at', 'measurement', 'age', 'velocity')
+    list_filter = ('kind',)
+    ordering = ['-examined_at']
+    readonly_fields = (
+        'patient', 'kind', 'examine_id', 'examined_at', 'pixel_depth', 'measurement', 'age', 'velocity'
+    )
+    exclude = ('prediction',)
 
 
 admin.site.register(PatientFemurExamine, PatientFemurExamineAdmin)
 admin.site.register(PatientHeadExamine, PatientHeadExamineAdmin)
+admin.site.register(PatientExamineHistory, PatientExamineHistoryAdmin)
@@ -0,0 +1,81 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import psutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from model.workers import create_pool, run_examine
+
+
+class Command(BaseCommand):
+    help = 'Sweep inference pool sizes and torch thread counts and report the throughput/latency frontier.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('image', help='Path of an ultrasound image to examine.')
+        parser.add_argument('--kind', choices=['femur', 'head'], default='femur')
+        parser.add_argument('--pixel-depth', type=float, default=0.1)
+        parser.add_argument('--requests', type=int, default=32, help='Examinations per configuration.')
+        parser.add_argument('--affinity', action='store_true', help='Pin workers to physical cores.')
+
+    def configurations(self):
+        physical = psutil.cpu_count(logical=False) or 1
+        logical = psutil.cpu_count() or physical
+        sizes = sorted({1, 2, 4, 8, 16, physical} & set(range(1, logical + 1)))
+        return [(workers, threads) for workers, threads in itertools.product(sizes, sizes) if workers * threads <= logical]
+
+    def run(self, pool, workers, image, kind, pixel_depth, requests):
+        args = (kind, image, pixel_depth, (1.0, 1.0), None, settings.EXAMINE_INFERENCE_SIZE, None)
+
+        # Warm up every worker so model loading is not measured
+        for future in [pool.submit(run_examine, *args) for _ in range(workers)]:
+            future.result()
+
+        def timed(_):
+            started = time.perf_counter()
+            pool.submit(run_examine, *args).result()
+            return time.perf_counter() - started
+
+        # Closed loop with as many clients as workers
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as clients:
+            latencies = list(clients.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        return requests / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+    def handle(self, *args, **options):
+        image = cv2.imread(options['image'])
+        if image is None:
+            raise CommandError(f'Unable to read image {options["image"]}.')
+
+        results = []
+        for workers, threads in self.configurations():
+            pool = create_pool(workers, threads, options['affinity'])
+            try:
+                throughput, p50, p95 = self.run(
+                    pool, workers, image, options['kind'], options['pixel_depth'], options['requests']
+                )
+            finally:
+                pool.shutdown()
+            results.append((workers, threads, throughput, p50, p95))
+            self.stdout.write(
+                f'workers={workers:<3} threads={threads:<3} '
+                f'throughput={throughput:7.2f}/s p50={p50 * 1000:8.1f}ms p95={p95 * 1000:8.1f}ms'
+            )
+
+        # A configuration is on the frontier when no other one has both more throughput and lower p95
+        self.stdout.write(self.style.SUCCESS('Frontier:'))
+        for workers, threads, throughput, p50, p95 in sorted(results, key=lambda result: -result[2]):
+            dominated = any(
+                other[2] >= throughput and other[4] <= p95 and (other[2], other[4]) != (throughput, p95)
+                for other in results
+            )
+            if not dominated:
+                self.stdout.write(
+                    f'workers={workers:<3} threads={threads:<3} '
+                    f'throughput={throughput:7.2f}/s p95={p95 * 1000:8.1f}ms'
+                )
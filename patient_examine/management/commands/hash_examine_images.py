@@ -0,0 +1,82 @@
+import cv2
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from model.preprocess import find_scan_sector
+from patient_examine.models import (
+    PatientFemurExamine,
+    PatientHeadExamine,
+    PatientExamineHistory,
+    PatientExamineHashBand
+)
+from utils.phash import band_keys, phash
+from utils.tiles import get_image_dimensions
+
+EXAMINE_IMAGE_FIELDS = (
+    (PatientFemurExamine, 'femur_image', 'femur'),
+    (PatientHeadExamine, 'head_image', 'head'),
+)
+HISTORY_FIELDS = ['image_hash', 'prediction', 'embedding']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the perceptual hash of the scan sector of every current exam image into its latest '
+        'history row, for examinations recorded before duplicates were looked for. Images of earlier '
+        'examinations were replaced and cannot be hashed any more.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def save(self, batch):
+        PatientExamineHistory.objects.bulk_update(batch, HISTORY_FIELDS)
+        PatientExamineHashBand.objects.bulk_create([
+            PatientExamineHashBand(history=history, patient_id=history.patient_id, kind=history.kind, key=key)
+            for history in batch for key in band_keys(history.image_hash)
+        ])
+        return len(batch)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, field, kind in EXAMINE_IMAGE_FIELDS:
+            hashed, missing = 0, 0
+            batch = []
+            latest = PatientExamineHistory.objects.filter(
+                kind=kind, examine_id=OuterRef('pk')
+            ).order_by('-examined_at')
+            examines = model.objects.exclude(**{field: ''}).annotate(
+                history_id=Subquery(latest.values('pk')[:1]),
+                history_patient_id=Subquery(latest.values('patient_id')[:1])
+            ).filter(
+                history_id__in=PatientExamineHistory.objects.filter(kind=kind, image_hash__isnull=True).values('pk')
+            ).prefetch_related('instances')
+            for examine in examines.iterator(chunk_size=batch_size):
+                path = getattr(examine, field).path
+                # The hash is taken on a small thumbnail, a reduced decode is plenty
+                image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_4)
+                if image is None:
+                    missing += 1
+                    continue
+
+                history = PatientExamineHistory(pk=examine.history_id, patient_id=examine.history_patient_id, kind=kind)
+                history.image_hash = phash(image, find_scan_sector(image))
+                history.prediction = {
+                    'size': list(get_image_dimensions(path)),
+                    'segmentation': examine.segmentation,
+                    'confidences': [instance.confidence for instance in sorted(
+                        examine.instances.all(), key=lambda instance: instance.index
+                    )],
+                    'inference_size': examine.inference_size
+                }
+                history.embedding = examine.embedding
+                batch.append(history)
+                if len(batch) >= batch_size:
+                    hashed += self.save(batch)
+                    batch = []
+            if batch:
+                hashed += self.save(batch)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: hashed {hashed} exams, {missing} images unreadable.'
+            ))
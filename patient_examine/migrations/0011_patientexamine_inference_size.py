@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0010_rename_circumference_patientheadexamine_head_circumference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='inference_size',
+            field=models.IntegerField(blank=True, null=True, verbose_name='inference_size'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='inference_size',
+            field=models.IntegerField(blank=True, null=True, verbose_name='inference_size'),
+        ),
+    ]
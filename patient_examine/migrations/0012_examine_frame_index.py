@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0011_patientexamine_inference_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='frame_index',
+            field=models.IntegerField(blank=True, null=True, verbose_name='frame_index'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='frame_index',
+            field=models.IntegerField(blank=True, null=True, verbose_name='frame_index'),
+        ),
+    ]
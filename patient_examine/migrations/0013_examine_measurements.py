@@ -0,0 +1,42 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0012_examine_frame_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientHeadMeasurement',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('index', models.IntegerField(verbose_name='index')),
+                ('head_circumference', models.FloatField(verbose_name='head_circumference')),
+                ('gestational_age', models.FloatField(verbose_name='gestational_age')),
+                ('confidence', models.FloatField(verbose_name='confidence')),
+                ('examine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instances', to='patient_examine.patientheadexamine')),
+            ],
+            options={
+                'ordering': ['examine', 'index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PatientFemurMeasurement',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('index', models.IntegerField(verbose_name='index')),
+                ('femur_length', models.FloatField(verbose_name='femur_length')),
+                ('femur_age', models.FloatField(verbose_name='femur_age')),
+                ('confidence', models.FloatField(verbose_name='confidence')),
+                ('examine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instances', to='patient_examine.patientfemurexamine')),
+            ],
+            options={
+                'ordering': ['examine', 'index'],
+            },
+        ),
+    ]
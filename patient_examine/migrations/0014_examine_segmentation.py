@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0013_examine_measurements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='segmentation',
+            field=models.JSONField(blank=True, null=True, verbose_name='segmentation'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='segmentation',
+            field=models.JSONField(blank=True, null=True, verbose_name='segmentation'),
+        ),
+    ]
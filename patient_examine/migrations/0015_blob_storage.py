@@ -0,0 +1,24 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:49
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0014_examine_segmentation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patientfemurexamine',
+            name='femur_image',
+            field=models.ImageField(storage=utils.storage.blob_storage, upload_to='', verbose_name='femur_image'),
+        ),
+        migrations.AlterField(
+            model_name='patientheadexamine',
+            name='head_image',
+            field=models.ImageField(storage=utils.storage.blob_storage, upload_to='', verbose_name='head_image'),
+        ),
+    ]
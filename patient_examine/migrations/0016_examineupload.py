@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_blob_storage'),
+        ('patient_examine', '0015_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamineUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='id')),
+                ('kind', models.CharField(choices=[('femur', 'Femur'), ('head', 'Head')], max_length=5, verbose_name='kind')),
+                ('filename', models.CharField(max_length=255, verbose_name='filename')),
+                ('size', models.BigIntegerField(verbose_name='size')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='offset')),
+                ('checksum', models.CharField(max_length=64, verbose_name='checksum')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated_at')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='patients.patient')),
+            ],
+        ),
+    ]
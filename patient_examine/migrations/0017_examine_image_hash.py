@@ -0,0 +1,63 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0016_examineupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='image_hash'),
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash_0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_0'),
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash_1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_1'),
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash_2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_2'),
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash_3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_3'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='image_hash'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash_0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_0'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash_1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_1'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash_2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_2'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash_3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='image_hash_3'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0017_examine_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='embedded_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='embedded_at'),
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True, verbose_name='embedding'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='embedded_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='embedded_at'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True, verbose_name='embedding'),
+        ),
+    ]
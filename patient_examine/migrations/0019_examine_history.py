@@ -0,0 +1,53 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_blob_storage'),
+        ('patient_examine', '0018_examine_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientExamineHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('kind', models.CharField(choices=[('femur', 'Femur'), ('head', 'Head')], max_length=5, verbose_name='kind')),
+                ('examine_id', models.IntegerField(verbose_name='examine_id')),
+                ('examined_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='examined_at')),
+                ('pixel_depth', models.FloatField(verbose_name='pixel_depth')),
+                ('measurement', models.FloatField(verbose_name='measurement')),
+                ('age', models.FloatField(verbose_name='age')),
+                ('velocity', models.FloatField(blank=True, null=True, verbose_name='velocity')),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='examine_history', to='patients.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'examined_at'], name='patient_exa_patient_0caa4c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PatientExamineGrowth',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('kind', models.CharField(choices=[('femur', 'Femur'), ('head', 'Head')], max_length=5, verbose_name='kind')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('first_examined_at', models.DateTimeField(verbose_name='first_examined_at')),
+                ('last_examined_at', models.DateTimeField(verbose_name='last_examined_at')),
+                ('last_measurement', models.FloatField(verbose_name='last_measurement')),
+                ('last_velocity', models.FloatField(blank=True, null=True, verbose_name='last_velocity')),
+                ('sum_t', models.FloatField(default=0.0, verbose_name='sum_t')),
+                ('sum_tt', models.FloatField(default=0.0, verbose_name='sum_tt')),
+                ('sum_m', models.FloatField(default=0.0, verbose_name='sum_m')),
+                ('sum_tm', models.FloatField(default=0.0, verbose_name='sum_tm')),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='examine_growth', to='patients.patient')),
+            ],
+            options={
+                'unique_together': {('patient', 'kind')},
+            },
+        ),
+    ]
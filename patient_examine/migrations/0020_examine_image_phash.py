@@ -0,0 +1,65 @@
+# Generated by Django 4.2.9 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_examine', '0019_examine_history'),
+    ]
+
+    # The 64 bit hashes of whole frames are not comparable to the new ones, they are
+    # dropped and recomputed by hash_examine_images
+    operations = [
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash',
+        ),
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash_0',
+        ),
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash_1',
+        ),
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash_2',
+        ),
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash_3',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash_0',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash_1',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash_2',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash_3',
+        ),
+        migrations.AddField(
+            model_name='patientfemurexamine',
+            name='image_hash',
+            field=models.BinaryField(blank=True, null=True, verbose_name='image_hash'),
+        ),
+        migrations.AddField(
+            model_name='patientheadexamine',
+            name='image_hash',
+            field=models.BinaryField(blank=True, null=True, verbose_name='image_hash'),
+        ),
+    ]
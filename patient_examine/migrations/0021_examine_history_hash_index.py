@@ -0,0 +1,51 @@
+# Generated by Django 4.2.9 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0012_dashboard_counter'),
+        ('patient_examine', '0020_examine_image_phash'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='patientfemurexamine',
+            name='image_hash',
+        ),
+        migrations.RemoveField(
+            model_name='patientheadexamine',
+            name='image_hash',
+        ),
+        migrations.AddField(
+            model_name='patientexaminehistory',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True, verbose_name='embedding'),
+        ),
+        migrations.AddField(
+            model_name='patientexaminehistory',
+            name='image_hash',
+            field=models.BinaryField(blank=True, null=True, verbose_name='image_hash'),
+        ),
+        migrations.AddField(
+            model_name='patientexaminehistory',
+            name='prediction',
+            field=models.JSONField(blank=True, null=True, verbose_name='prediction'),
+        ),
+        migrations.CreateModel(
+            name='PatientExamineHashBand',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('kind', models.CharField(choices=[('femur', 'Femur'), ('head', 'Head')], max_length=5, verbose_name='kind')),
+                ('key', models.IntegerField(verbose_name='key')),
+                ('history', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hash_bands', to='patient_examine.patientexaminehistory')),
+                ('patient', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='patients.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'kind', 'key', 'history'], name='patient_exa_patient_f8baab_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,20 @@
 import os
+import uuid
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from utils.phash import band_keys
+from utils.storage import blob_storage
+
+
+WEEK = 7 * 24 * 60 * 60
+
+
+class ExamineKind(models.TextChoices):
+    FEMUR = 'femur', 'Femur'
+    HEAD = 'head', 'Head'
 
 
 class PatientFemurExamine(models.Model):
@@ -9,7 +23,8 @@ class PatientFemurExamine(models.Model):
         primary_key=True
     )
     femur_image = models.ImageField(
-        'femur_image'
+        'femur_image',
+        storage=blob_storage
     )
     pixel_depth = models.FloatField(
         'pixel_depth',
@@ -24,9 +39,41 @@ class PatientFemurExamine(models.Model):
         null=True,
         blank=True
     )
+    inference_size = models.IntegerField(
+        'inference_size',
+        null=True,
+        blank=True
+    )
+    frame_index = models.IntegerField(
+        'frame_index',
+        null=True,
+        blank=True
+    )
+    # Outlines of the measured instances, {"scale": [x, y], "instances": [[[x0, y0, x1, y1, ...], ...], ...]}
+    segmentation = models.JSONField(
+        'segmentation',
+        null=True,
+        blank=True
+    )
+
+
+    # Unit length float16 embedding of the examined image from the model backbone, for
+    # finding similar exams, and when it was stored
+    embedding = models.BinaryField(
+        'embedding',
+        null=True,
+        blank=True
+    )
+    embedded_at = models.DateTimeField(
+        'embedded_at',
+        null=True,
+        blank=True,
+        db_index=True
+    )
 
     def delete(self, using=None, keep_parents=False):
-        os.remove(os.path.join(settings.MEDIA_ROOT, self.femur_image.name))
+        # Drops this exam's reference, the file goes with the last one
+        self.femur_image.delete(save=False)
         super().delete(using, keep_parents)
 
 
@@ -36,7 +83,8 @@ class PatientHeadExamine(models.Model):
         primary_key=True
     )
     head_image = models.ImageField(
-        'head_image'
+        'head_image',
+        storage=blob_storage
     )
     pixel_depth = models.FloatField(
         'pixel_depth',
@@ -51,7 +99,379 @@ class PatientHeadExamine(models.Model):
         null=True,
         blank=True
     )
+    inference_size = models.IntegerField(
+        'inference_size',
+        null=True,
+        blank=True
+    )
+    frame_index = models.IntegerField(
+        'frame_index',
+        null=True,
+        blank=True
+    )
+    # Outlines of the measured instances, {"scale": [x, y], "instances": [[[x0, y0, x1, y1, ...], ...], ...]}
+    segmentation = models.JSONField(
+        'segmentation',
+        null=True,
+        blank=True
+    )
+
+
+    # Unit length float16 embedding of the examined image from the model backbone, for
+    # finding similar exams, and when it was stored
+    embedding = models.BinaryField(
+        'embedding',
+        null=True,
+        blank=True
+    )
+    embedded_at = models.DateTimeField(
+        'embedded_at',
+        null=True,
+        blank=True,
+        db_index=True
+    )
 
     def delete(self, using=None, keep_parents=False):
-        os.remove(os.path.join(settings.MEDIA_ROOT, self.head_image.name))
+        # Drops this exam's reference, the file goes with the last one
+        self.head_image.delete(save=False)
         super().delete(using, keep_parents)
+
+
+class PatientFemurMeasurement(models.Model):
+    id = models.AutoField(
+        'id',
+        primary_key=True
+    )
+    examine = models.ForeignKey(
+        PatientFemurExamine,
+        related_name='instances',
+        on_delete=models.CASCADE
+    )
+    index = models.IntegerField(
+        'index'
+    )
+    femur_length = models.FloatField(
+        'femur_length'
+    )
+    femur_age = models.FloatField(
+        'femur_age'
+    )
+    confidence = models.FloatField(
+        'confidence'
+    )
+
+    class Meta:
+        ordering = ['examine', 'index']
+
+
+class PatientHeadMeasurement(models.Model):
+    id = models.AutoField(
+        'id',
+        primary_key=True
+    )
+    examine = models.ForeignKey(
+        PatientHeadExamine,
+        related_name='instances',
+        on_delete=models.CASCADE
+    )
+    index = models.IntegerField(
+        'index'
+    )
+    head_circumference = models.FloatField(
+        'head_circumference'
+    )
+    gestational_age = models.FloatField(
+        'gestational_age'
+    )
+    confidence = models.FloatField(
+        'confidence'
+    )
+
+    class Meta:
+        ordering = ['examine', 'index']
+
+
+class ExamineUpload(models.Model):
+    """
+    An exam image or cine loop being uploaded in chunks, assembled in place under EXAMINE_UPLOAD_DIR.
+    """
+
+    id = models.UUIDField(
+        'id',
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE
+    )
+    kind = models.CharField(
+        'kind',
+        max_length=5,
+        choices=ExamineKind.choices
+    )
+    filename = models.CharField(
+        'filename',
+        max_length=255
+    )
+    size = models.BigIntegerField(
+        'size'
+    )
+    # Bytes received so far, the next chunk has to start here
+    offset = models.BigIntegerField(
+        'offset',
+        default=0
+    )
+    # Hex sha256 of the whole file, checked once every byte is in
+    checksum = models.CharField(
+        'checksum',
+        max_length=64
+    )
+    created_at = models.DateTimeField(
+        'created_at',
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        'updated_at',
+        auto_now=True
+    )
+
+    @property
+    def path(self):
+        return os.path.join(settings.EXAMINE_UPLOAD_DIR, f'{self.id}.part')
+
+    def delete(self, using=None, keep_parents=False):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        super().delete(using, keep_parents)
+
+
+class PatientExamineGrowth(models.Model):
+    """
+    Running least squares sums of a patient's measurements of one kind over time, kept
+    up to date on every examination so the growth rate never needs the full history.
+    Times are in weeks since the patient's first examination of the kind.
+    """
+    id = models.AutoField(
+        'id',
+        primary_key=True
+    )
+    # Kept when the patient is archived, history is never deleted with it
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='examine_growth'
+    )
+    kind = models.CharField(
+        'kind',
+        max_length=5,
+        choices=ExamineKind.choices
+    )
+    count = models.IntegerField(
+        'count',
+        default=0
+    )
+    first_examined_at = models.DateTimeField(
+        'first_examined_at'
+    )
+    last_examined_at = models.DateTimeField(
+        'last_examined_at'
+    )
+    last_measurement = models.FloatField(
+        'last_measurement'
+    )
+    # Growth between the last two examinations, per week
+    last_velocity = models.FloatField(
+        'last_velocity',
+        null=True,
+        blank=True
+    )
+    sum_t = models.FloatField(
+        'sum_t',
+        default=0.0
+    )
+    sum_tt = models.FloatField(
+        'sum_tt',
+        default=0.0
+    )
+    sum_m = models.FloatField(
+        'sum_m',
+        default=0.0
+    )
+    sum_tm = models.FloatField(
+        'sum_tm',
+        default=0.0
+    )
+
+    class Meta:
+        unique_together = ('patient', 'kind')
+
+    @property
+    def growth_rate(self):
+        # Slope of the least squares line through every measurement, per week
+        denominator = self.count * self.sum_tt - self.sum_t ** 2
+        if self.count < 2 or denominator <= 0:
+            return None
+        return (self.count * self.sum_tm - self.sum_t * self.sum_m) / denominator
+
+
+class PatientExamineHistory(models.Model):
+    """
+    Every examination ever made, appended to and never updated, while the exams on the
+    patient are replaced by each new one.
+    """
+    id = models.BigAutoField(
+        'id',
+        primary_key=True
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='examine_history'
+    )
+    kind = models.CharField(
+        'kind',
+        max_length=5,
+        choices=ExamineKind.choices
+    )
+    # The exam row at the time, it is overwritten by later examinations of the patient
+    examine_id = models.IntegerField(
+        'examine_id'
+    )
+    examined_at = models.DateTimeField(
+        'examined_at',
+        default=timezone.now
+    )
+    pixel_depth = models.FloatField(
+        'pixel_depth'
+    )
+    measurement = models.FloatField(
+        'measurement'
+    )
+    age = models.FloatField(
+        'age'
+    )
+    # Growth since the previous examination of the kind, per week
+    velocity = models.FloatField(
+        'velocity',
+        null=True,
+        blank=True
+    )
+    # Perceptual hash of the scan sector of the examined image, its bands are indexed in
+    # PatientExamineHashBand for finding near duplicates, see utils.phash
+    image_hash = models.BinaryField(
+        'image_hash',
+        null=True,
+        blank=True
+    )
+    # What the model found, so a near duplicate is measured again without it,
+    # {"size": [w, h], "segmentation": {...}, "confidences": [...], "inference_size": imgsz}
+    prediction = models.JSONField(
+        'prediction',
+        null=True,
+        blank=True
+    )
+    embedding = models.BinaryField(
+        'embedding',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'examined_at'])
+        ]
+
+    @classmethod
+    def record(cls, patient, kind, examine, measurement, age, image_hash=None, prediction=None, embedding=None):
+        """
+        Append an examination and fold it into the patient's growth, in constant time.
+        """
+        examined_at = timezone.now()
+        # Part of the examination's own transaction when there is one, without a savepoint
+        with transaction.atomic(savepoint=False):
+            growth = PatientExamineGrowth.objects.select_for_update().filter(patient=patient, kind=kind).first()
+            if growth is None:
+                growth = PatientExamineGrowth(
+                    patient=patient, kind=kind, first_examined_at=examined_at,
+                    last_examined_at=examined_at, last_measurement=measurement
+                )
+
+            velocity = None
+            weeks = (examined_at - growth.last_examined_at).total_seconds() / WEEK
+            if growth.count and weeks > 0:
+                velocity = (measurement - growth.last_measurement) / weeks
+
+            t = (examined_at - growth.first_examined_at).total_seconds() / WEEK
+            growth.count += 1
+            growth.sum_t += t
+            growth.sum_tt += t * t
+            growth.sum_m += measurement
+            growth.sum_tm += t * measurement
+            growth.last_examined_at = examined_at
+            growth.last_measurement = measurement
+            if velocity is not None:
+                growth.last_velocity = velocity
+            if growth.pk is None:
+                growth.save()
+            else:
+                growth.save(update_fields=[
+                    'count', 'sum_t', 'sum_tt', 'sum_m', 'sum_tm', 'last_examined_at', 'last_measurement', 'last_velocity'
+                ])
+
+            history = cls.objects.create(
+                patient=patient, kind=kind, examine_id=examine.id, examined_at=examined_at,
+                pixel_depth=examine.pixel_depth, measurement=measurement, age=age, velocity=velocity,
+                image_hash=image_hash, prediction=prediction, embedding=embedding
+            )
+            if image_hash is not None:
+                history.index_hash()
+            return history
+
+    def index_hash(self):
+        PatientExamineHashBand.objects.bulk_create([
+            PatientExamineHashBand(history=self, patient_id=self.patient_id, kind=self.kind, key=key)
+            for key in band_keys(bytes(self.image_hash))
+        ])
+
+
+class PatientExamineHashBand(models.Model):
+    """
+    One band of an examination's image hash, with its position in the hash, see utils.phash.
+    The patient and kind are repeated from the examination, so a lookup is only index seeks
+    among that patient's bands, which a single byte band is plenty to tell apart.
+    """
+    id = models.BigAutoField(
+        'id',
+        primary_key=True
+    )
+    history = models.ForeignKey(
+        PatientExamineHistory,
+        on_delete=models.CASCADE,
+        related_name='hash_bands'
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        # The band index starts with the patient
+        db_index=False,
+        related_name='+'
+    )
+    kind = models.CharField(
+        'kind',
+        max_length=5,
+        choices=ExamineKind.choices
+    )
+    key = models.IntegerField(
+        'key'
+    )
+
+    class Meta:
+        # Covers the lookup, the examinations of a band are read from the index alone
+        indexes = [
+            models.Index(fields=['patient', 'kind', 'key', 'history'])
+        ]
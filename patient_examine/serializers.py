@@ -1,15 +1,143 @@
+import math
+import os
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from django.core.validators import FileExtensionValidator
 from rest_framework import serializers
 
-from .models import PatientFemurExamine, PatientHeadExamine
+from utils.utils import get_image_size
+
+from .models import (
+    PatientFemurExamine,
+    PatientHeadExamine,
+    ExamineUpload,
+    ExamineKind,
+    PatientExamineHistory,
+    PatientExamineGrowth
+)
+
+EXAMINE_IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp', 'webp')
+# Stored outlines for re-measuring and embeddings for finding similar exams, only used server side
+EXAMINE_SERVER_FIELDS = ('segmentation', 'embedding', 'embedded_at')
+
+
+def validate_examine_image(image):
+    # Only the header is parsed here, the pixels are decoded later at a reduced resolution if possible
+    width, height = get_image_size(image)
+
+    if min(width, height) < settings.EXAMINE_IMAGE_MIN_SIZE:
+        raise serializers.ValidationError(_('Image is too small to examine.'))
+
+    if max(width, height) > settings.EXAMINE_IMAGE_MAX_SIZE or width * height > settings.EXAMINE_IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(_('Image is too large to examine.'))
+
+    return image
+
+
+def validate_pixel_depth(value):
+    # Millimetres per pixel, a depth of zero would measure every exam as nothing
+    if value is not None and not (math.isfinite(value) and value > 0):
+        raise serializers.ValidationError(_('Pixel depth must be greater than zero.'))
+    return value
+
+
+def validate_examine_source(attrs, image_field, video_field):
+    # Either a still image or a cine loop to pick the best frame from, not both
+    if (attrs.get(image_field) is None) == (attrs.get(video_field) is None):
+        raise serializers.ValidationError({
+            image_field: _('Provide either an image or a video to examine.')
+        })
+    return attrs
+
+
+def examine_video_field():
+    return serializers.FileField(
+        write_only=True,
+        required=False,
+        validators=[FileExtensionValidator(settings.EXAMINE_VIDEO_EXTENSIONS)]
+    )
 
 
 class PatientFemurExamineSerializer(serializers.ModelSerializer):
+    femur_video = examine_video_field()
+
     class Meta:
         model = PatientFemurExamine
-        fields = serializers.ALL_FIELDS
+        exclude = EXAMINE_SERVER_FIELDS
+        extra_kwargs = {'femur_image': {'required': False}}
+
+    def validate_femur_image(self, value):
+        return validate_examine_image(value)
+
+    def validate_pixel_depth(self, value):
+        return validate_pixel_depth(value)
+
+    def validate(self, attrs):
+        return validate_examine_source(attrs, 'femur_image', 'femur_video')
 
 
 class PatientHeadExamineSerializer(serializers.ModelSerializer):
+    head_video = examine_video_field()
+
     class Meta:
         model = PatientHeadExamine
-        fields = serializers.ALL_FIELDS
+        exclude = EXAMINE_SERVER_FIELDS
+        extra_kwargs = {'head_image': {'required': False}}
+
+    def validate_head_image(self, value):
+        return validate_examine_image(value)
+
+    def validate_pixel_depth(self, value):
+        return validate_pixel_depth(value)
+
+    def validate(self, attrs):
+        return validate_examine_source(attrs, 'head_image', 'head_video')
+
+
+class PatientExamineRemeasureSerializer(serializers.Serializer):
+    pixel_depth = serializers.FloatField(validators=[validate_pixel_depth])
+
+
+class ExamineUploadSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1, max_value=settings.EXAMINE_UPLOAD_MAX_SIZE)
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+    class Meta:
+        model = ExamineUpload
+        fields = ('id', 'filename', 'size', 'offset', 'checksum')
+        read_only_fields = ('id', 'offset')
+
+    def validate_filename(self, value):
+        # The assembled file is examined as a still image or a cine loop depending on its extension
+        extension = os.path.splitext(value)[1][1:].lower()
+        if extension not in EXAMINE_IMAGE_EXTENSIONS and extension not in settings.EXAMINE_VIDEO_EXTENSIONS:
+            raise serializers.ValidationError(_('File type is not supported for examination.'))
+        return os.path.basename(value)
+
+    def validate_checksum(self, value):
+        return value.lower()
+
+
+class PatientExamineSimilarSerializer(serializers.Serializer):
+    k = serializers.IntegerField(min_value=1, max_value=settings.EXAMINE_SIMILAR_MAX, default=10)
+
+
+class PatientExamineHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PatientExamineHistory
+        fields = ('id', 'kind', 'examine_id', 'examined_at', 'pixel_depth', 'measurement', 'age', 'velocity')
+
+
+class PatientExamineGrowthSerializer(serializers.ModelSerializer):
+    growth_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = PatientExamineGrowth
+        fields = (
+            'kind', 'count', 'first_examined_at', 'last_examined_at', 'last_measurement', 'last_velocity', 'growth_rate'
+        )
+
+
+class PatientExamineHistoryFilterSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=ExamineKind.choices, required=False)
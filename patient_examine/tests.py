@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from blobs.models import MediaBlob
+from model.deadline import Deadline
+from model.resolution import ResolutionController
+from model.video import select_best_frame
+from model.femur_model import femur_length_and_age
+from model.preprocess import (
+    QUALITY_REJECTIONS,
+    SECTOR_MARGIN,
+    check_image_quality,
+    find_scan_sector,
+    inspect_image,
+    make_thumbnail
+)
+from model import workers
+from model.workers import get_pool_config, set_local_threads
+from model.scheduler import InferenceScheduler, _Waiter, get_inference_scheduler, INTERACTIVE, BATCH, BACKGROUND
+from patients.models import Patient, DashboardCounter
+from users.models import User
+from utils.embeddings import EmbeddingIndex
+from utils.exceptions import DeadlineExceededException, handle_exceptions
+from utils.phash import BAND_BITS, BANDS, HASH_BYTES, MAX_DISTANCE, find_similar, hash_distance, phash
+from utils.tiles import get_level_size, get_max_level, get_tile_grid, render_tile
+from utils.utils import (
+    attach_embedding_hook,
+    decode_examine_image,
+    decode_examine_sector,
+    mask_boxes,
+    mask_polygons,
+    polygon_boxes,
+    rank_instances,
+    scale_segmentation,
+    take_embedding
+)
+
+from .models import (
+    ExamineUpload,
+    PatientExamineGrowth,
+    PatientExamineHashBand,
+    PatientExamineHistory,
+    PatientFemurExamine
+)
+from .serializers import PatientExamineRemeasureSerializer
+from .views import PatientFemurExamineAPIView
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def examine_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (90, 90, 90)).save(buffer, format='PNG')
+    return SimpleUploadedFile('scan.png', buffer.getvalue(), content_type='image/png')
+
+
+def scan_image(seed):
+    # A speckled sector with an outline, framed by the machine's text overlay
+    rng = np.random.default_rng(seed)
+    speckle = cv2.GaussianBlur(rng.random((400, 500)).astype(np.float32), (0, 0), 6)
+    sector = cv2.normalize(speckle, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    center = (int(rng.integers(150, 350)), int(rng.integers(100, 300)))
+    cv2.ellipse(sector, center, (80, 30), int(rng.integers(0, 180)), 0, 360, 255, 6)
+    image = np.zeros((480, 640), np.uint8)
+    image[40:440, 70:570] = sector
+    cv2.putText(image, 'GE 12cm', (5, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 255, 1)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def fan_image(width=1920, height=1080):
+    # A convex probe's fan of speckle from its apex at the top, on the machine's black screen
+    rng = np.random.default_rng(0)
+    speckle = cv2.GaussianBlur(rng.random((height, width)).astype(np.float32), (0, 0), 3)
+    speckle = cv2.normalize(speckle, None, 60, 200, cv2.NORM_MINMAX).astype(np.uint8)
+    fan = np.zeros((height, width), np.uint8)
+    radius = height * 2 // 3
+    cv2.ellipse(fan, (width // 2, height // 7), (radius, radius), 0, 45, 135, 255, -1)
+    image = np.where(fan > 0, speckle, 0).astype(np.uint8)
+    cv2.putText(image, 'GE 12cm', (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, 255, 2)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def reencode(image, width, quality=60):
+    # As a messaging app forwards a scan, resized and compressed again
+    height = image.shape[0] * width // image.shape[1]
+    resized = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.imdecode(cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+
+def predict(self, image, pixel_depth, scale, sector, imgsz, deadline):
+    segmentation = {'scale': list(scale), 'instances': [[[10, 10, 40, 10, 40, 30, 10, 30]]]}
+    return [(42.0, 23.0, 0.9), (30.0, 19.0, 0.5)], segmentation, None
+
+
+class PatientExamineTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        user = User.objects.create(email='doctor@example.com', username='doctor', phone_number='1', is_logged_in=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        self.patient = Patient.objects.create(
+            first_name='first', last_name='last', date_of_birth=datetime.date(1995, 1, 1),
+            examine_date=datetime.date.today(), trimester='2', blood_group='O+', age=29, phone_number='1'
+        )
+        # Counters every examination updates, as they are once the first exams were made
+        DashboardCounter.objects.bulk_create([
+            DashboardCounter(key='femur_examined'), DashboardCounter(key='examinations:femur')
+        ])
+
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, EXAMINE_WORKER_POOL=False)
+@mock.patch.object(PatientFemurExamineAPIView, 'predict', predict)
+@mock.patch('patient_examine.views.inspect_image', mock.Mock(return_value=(None, None)))
+class PatientFemurExamineWriteTestCase(PatientExamineTestCase):
+    def examine(self):
+        return self.client.post(
+            f'/api/patient/{self.patient.id}/femur-examine/',
+            {'femur_image': examine_image(), 'pixel_depth': 0.1},
+            format='multipart'
+        )
+
+    def test_examine_queries(self):
+        # Token, patient, duplicate lookup, image blob (4 with its savepoints), then in one
+        # transaction: patient lock, exam, patient FK, dashboard, instances, growth lookup and insert,
+        # history, its hash bands, dashboard
+        with self.assertNumQueries(22):
+            response = self.examine()
+
+        self.assertEqual(response.data['response_code'], 201)
+        self.patient.refresh_from_db()
+        examine = self.patient.femur_examine
+        self.assertEqual(examine.femur_length, 42)
+        self.assertEqual(examine.instances.count(), 2)
+        self.assertEqual(PatientExamineHistory.objects.filter(patient=self.patient, kind='femur').count(), 1)
+        self.assertEqual(DashboardCounter.objects.get(key='femur_examined').count, 1)
+        self.assertEqual(DashboardCounter.objects.get(key='examinations:femur').count, 1)
+
+    def test_reexamine_queries(self):
+        self.examine()
+        # The exam is updated in place, its instances replaced, the growth row updated and the
+        # previous image released after the commit
+        with self.assertNumQueries(22):
+            response = self.examine()
+
+        self.assertEqual(response.data['response_code'], 201)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.femur_examine.instances.count(), 2)
+        self.assertEqual(PatientExamineHistory.objects.filter(patient=self.patient, kind='femur').count(), 2)
+
+    def test_examine_rejects_blank_image(self):
+        with mock.patch('patient_examine.views.inspect_image', inspect_image):
+            response = self.examine()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['response_message'], QUALITY_REJECTIONS['blank'])
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.femur_examine)
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_examine_rejects_zero_pixel_depth(self):
+        response = self.client.post(
+            f'/api/patient/{self.patient.id}/femur-examine/',
+            {'femur_image': examine_image(), 'pixel_depth': 0},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        for pixel_depth, valid in ((0.1, True), (0, False), (-0.1, False), ('nan', False)):
+            serializer = PatientExamineRemeasureSerializer(data={'pixel_depth': pixel_depth})
+            self.assertEqual(serializer.is_valid(), valid, pixel_depth)
+
+    @override_settings(EXAMINE_ADMISSION={'default': {
+        'max_concurrency': 1, 'max_queue': {INTERACTIVE: 0, BATCH: 0, BACKGROUND: 0}, 'queue_timeout': 0
+    }})
+    @mock.patch.dict('model.scheduler._schedulers', clear=True)
+    def test_examine_busy(self):
+        with get_inference_scheduler('femur').admit():
+            response = self.examine()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.EXAMINE_RETRY_AFTER))
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.femur_examine)
+        self.assertEqual(self.examine().data['response_code'], 201)
+
+    @mock.patch.dict('model.scheduler._schedulers', clear=True)
+    def test_slot_held_for_inference_only(self):
+        scheduler = get_inference_scheduler('femur')
+        running = {}
+        record = PatientExamineHistory.record
+
+        def counting_predict(*args):
+            running['predict'] = scheduler.running
+            return predict(*args)
+
+        def counting_record(*args, **kwargs):
+            running['write'] = scheduler.running
+            return record(*args, **kwargs)
+
+        with mock.patch.object(PatientFemurExamineAPIView, 'predict', autospec=True, side_effect=counting_predict), \
+                mock.patch.object(PatientExamineHistory, 'record', side_effect=counting_record):
+            self.assertEqual(self.examine().data['response_code'], 201)
+        self.assertEqual(running, {'predict': 1, 'write': 0})
+        self.assertEqual(scheduler.running, 0)
+
+    def test_examine_video(self):
+        # The best frame comes with the outlines the model traced on it while scoring the clip
+        frame_prediction = ([[[10, 10, 40, 10, 40, 30, 10, 30]]], [0.8], None)
+        with mock.patch.object(
+            PatientFemurExamineAPIView, 'select_frame', return_value=(3, frame_prediction, scan_image(1))
+        ), mock.patch.object(PatientFemurExamineAPIView, 'predict', side_effect=AssertionError):
+            response = self.client.post(
+                f'/api/patient/{self.patient.id}/femur-examine/',
+                {'femur_video': SimpleUploadedFile('clip.mp4', b'clip'), 'pixel_depth': 0.1},
+                format='multipart'
+            )
+
+        self.assertEqual(response.data['response_code'], 201)
+        data = response.data['data']
+        self.assertEqual(data['frame_index'], 3)
+        self.assertEqual(data['inference_size'], settings.EXAMINE_INFERENCE_SIZES[0])
+        self.assertAlmostEqual(data['femur_length'], np.hypot(31, 21) * 0.1)
+        self.assertEqual([instance['confidence'] for instance in data['instances']], [0.8])
+
+    def test_examine_failure_releases_image(self):
+        with mock.patch.object(PatientExamineHistory, 'record', side_effect=RuntimeError('history unavailable')):
+            response = self.examine()
+
+        self.assertNotEqual(response.status_code, 200)
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.femur_examine)
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, EXAMINE_WORKER_POOL=False, EXAMINE_UPLOAD_DIR=os.path.join(MEDIA_ROOT, 'uploads'),
+    EXAMINE_UPLOAD_CHUNK_SIZE=1024
+)
+@mock.patch.object(PatientFemurExamineAPIView, 'predict', predict)
+@mock.patch('patient_examine.views.inspect_image', mock.Mock(return_value=(None, None)))
+class ExamineUploadTestCase(PatientExamineTestCase):
+    def setUp(self):
+        super().setUp()
+        buffer = io.BytesIO()
+        noise = np.random.default_rng(0).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+        Image.fromarray(noise).save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+        self.uploads_url = f'/api/patient/{self.patient.id}/femur-examine/uploads/'
+
+    def start(self, checksum=None):
+        response = self.client.post(self.uploads_url, {
+            'filename': 'scan.png',
+            'size': len(self.content),
+            'checksum': checksum or hashlib.sha256(self.content).hexdigest()
+        })
+        self.assertEqual(response.status_code, 201)
+        return f'{self.uploads_url}{response.data["data"]["id"]}/'
+
+    def send(self, url, start, end):
+        return self.client.put(
+            url, self.content[start:end], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(start)
+        )
+
+    def finalize(self, url):
+        return self.client.post(f'{url}finalize/', {'pixel_depth': 0.1})
+
+    def test_resume(self):
+        url = self.start()
+        self.assertEqual(self.send(url, 0, 100).status_code, 200)
+
+        # A client that lost track of the upload asks where to resume from
+        response = self.client.get(url)
+        self.assertEqual(response['Upload-Offset'], '100')
+        self.assertEqual(self.finalize(url).status_code, 400)
+
+        for start in range(100, len(self.content), 1000):
+            response = self.send(url, start, start + 1000)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['offset'], len(self.content))
+
+        response = self.finalize(url)
+        self.assertEqual(response.data['response_code'], 201)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.femur_examine.femur_length, 42)
+        self.assertFalse(ExamineUpload.objects.exists())
+
+    def test_offset_mismatch(self):
+        url = self.start()
+        self.send(url, 0, 100)
+
+        for offset in (0, 50, 200):
+            response = self.send(url, offset, offset + 100)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response['Upload-Offset'], '100')
+        self.assertEqual(ExamineUpload.objects.get().offset, 100)
+
+    def test_overrun(self):
+        url = self.start()
+        response = self.client.put(
+            url, self.content + b'trailing', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # Within the chunk size but past the end of the file
+        for start in range(0, len(self.content) - 10, 1000):
+            self.send(url, start, min(start + 1000, len(self.content) - 10))
+        response = self.client.put(
+            url, self.content[-10:] + b'x' * 10, content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(len(self.content) - 10)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ExamineUpload.objects.get().offset, len(self.content) - 10)
+
+    def test_checksum_mismatch(self):
+        url = self.start(checksum='0' * 64)
+        for start in range(0, len(self.content), 1000):
+            self.send(url, start, start + 1000)
+
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 400)
+        # The upload starts over, nothing was examined
+        upload = ExamineUpload.objects.get()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(os.path.getsize(upload.path), 0)
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.femur_examine)
+
+
+class FakeSegmentationModel(object):
+    # Results for frames whose first pixel is their index, of the instances given per index
+    def __init__(self, instances):
+        self.instances = instances
+        self.embeddings = None
+
+    def __call__(self, frames, imgsz):
+        results = []
+        for frame in frames:
+            instances = self.instances.get(int(frame[0, 0, 0]), [])
+            results.append(mock.Mock(
+                masks=None if not instances else mock.Mock(
+                    data=torch.tensor(np.stack([mask for _, mask in instances]), dtype=torch.float32)
+                ),
+                boxes=mock.Mock(conf=torch.tensor([confidence for confidence, _ in instances]))
+            ))
+        self.embeddings = np.eye(8)[[int(frame[0, 0, 0]) for frame in frames]]
+        return results
+
+
+def instance_mask(x, y, w, h):
+    mask = np.zeros((60, 80), np.float32)
+    mask[y:y + h, x:x + w] = 1
+    return mask
+
+
+@override_settings(EXAMINE_VIDEO_BATCH_SIZE=2)
+class SelectBestFrameTestCase(SimpleTestCase):
+    def select(self, instances):
+        frames = [(index, np.full((60, 80, 3), index, np.uint8)) for index in range(5)]
+        with mock.patch('model.video.load_model', return_value=FakeSegmentationModel(instances)), \
+                mock.patch('model.video.iter_video_frames', return_value=iter(frames)):
+            return select_best_frame('femur', 'clip.mp4')
+
+    def test_best_frame(self):
+        index, (polygons, confidences, embedding), frame = self.select({
+            # Confident, but a blob is no femur
+            0: [(0.9, instance_mask(10, 10, 20, 20))],
+            2: [(0.5, instance_mask(10, 10, 50, 5))],
+            # Less confident than the blobs, but long and thin, in the second batch
+            3: [(0.3, instance_mask(5, 40, 60, 6)), (0.7, instance_mask(10, 10, 50, 5))],
+            4: [(0.95, instance_mask(30, 30, 10, 10))],
+        })
+
+        self.assertEqual(index, 3)
+        self.assertTrue((frame == 3).all())
+        # Both instances, most confident first, as predict would give them
+        self.assertEqual(polygon_boxes(polygons).tolist(), [[10, 10, 50, 5], [5, 40, 60, 6]])
+        np.testing.assert_allclose(confidences, [0.7, 0.3], rtol=1e-6)
+        # The embedding of that frame, not of the first of its batch
+        self.assertEqual(int(np.argmax(embedding)), 3)
+
+    def test_no_frame(self):
+        self.assertEqual(self.select({1: [(0.9, np.zeros((60, 80), np.float32))]}), (None, None, None))
+
+
+class RankInstancesTestCase(SimpleTestCase):
+    def setUp(self):
+        self.masks = np.zeros((3, 60, 80), np.uint8)
+        self.masks[0, 10:20, 5:45] = 255
+        # Faint everywhere but below the threshold, nothing to measure
+        self.masks[1] = 200
+        self.masks[2, 30:55, 50:60] = 255
+        self.masks[2, 40, 70] = 255
+
+    def test_mask_boxes(self):
+        boxes, found = mask_boxes(self.masks)
+        self.assertEqual(found.tolist(), [True, False, True])
+        self.assertEqual(boxes[0].tolist(), [5, 10, 40, 10])
+        # The stray pixel widens the box, the box spans every pixel of the mask
+        self.assertEqual(boxes[2].tolist(), [50, 30, 21, 25])
+        # Stored outlines measure like the masks they were traced from
+        self.assertEqual(polygon_boxes(mask_polygons(self.masks[found])).tolist(), boxes[found].tolist())
+
+    def test_rank_instances(self):
+        masks, confidences, boxes = rank_instances(self.masks, np.array([0.4, 0.9, 0.7]))
+        # The most confident instance has no mask and is dropped, the others come most confident first
+        self.assertEqual(confidences.tolist(), [0.7, 0.4])
+        self.assertTrue((masks == self.masks[[2, 0]]).all())
+        self.assertEqual(boxes.tolist(), [[50, 30, 21, 25], [5, 10, 40, 10]])
+
+
+class ImageQualityTestCase(SimpleTestCase):
+    def check(self, image):
+        return check_image_quality(make_thumbnail(image)[0])
+
+    def test_blank(self):
+        self.assertEqual(self.check(np.zeros((480, 640, 3), np.uint8)), 'blank')
+        # An even grey screen has pixels above the border, but nothing on them
+        self.assertEqual(self.check(np.full((480, 640, 3), 90, np.uint8)), 'blank')
+
+    def test_blurry(self):
+        # The sector stays in place, its speckle is gone
+        self.assertEqual(self.check(cv2.GaussianBlur(scan_image(1), (0, 0), 6)), 'blurry')
+        self.assertEqual(self.check(cv2.GaussianBlur(fan_image(), (0, 0), 12)), 'blurry')
+
+    def test_acceptable(self):
+        self.assertIsNone(self.check(scan_image(1)))
+        self.assertIsNone(self.check(fan_image()))
+        # The reduced decode of a large photo of the screen is judged the same
+        self.assertIsNone(self.check(cv2.resize(fan_image(), (480, 270), interpolation=cv2.INTER_AREA)))
+
+
+class ReducedDecodeTestCase(SimpleTestCase):
+    def test_reduced_measurements(self):
+        # A phone photo of the screen, not a multiple of the reduction
+        image = np.zeros((3010, 4030, 3), np.uint8)
+        cv2.line(image, (1200, 900), (2900, 2100), (255, 255, 255), 40)
+        upload = SimpleUploadedFile('scan.jpg', cv2.imencode('.jpg', image)[1].tobytes(), content_type='image/jpeg')
+
+        reduced, scale = decode_examine_image(upload)
+        # A quarter still leaves the long side above the 640 input size, an eighth would not
+        self.assertEqual(reduced.shape[:2], (753, 1008))
+        self.assertEqual(scale, (4030 / 1008, 3010 / 753))
+
+        full = cv2.imdecode(np.frombuffer(upload.read(), np.uint8), cv2.IMREAD_COLOR)
+        (length,), (age,) = femur_length_and_age(mask_boxes(reduced[np.newaxis, ..., 0])[0], 0.025, scale)
+        (full_length,), (full_age,) = femur_length_and_age(mask_boxes(full[np.newaxis, ..., 0])[0], 0.025)
+        # Within a reduced pixel at each end of the femur
+        self.assertAlmostEqual(length, full_length, delta=2 * 0.025 * max(scale) * np.sqrt(2))
+        # Within a day of gestational age
+        self.assertAlmostEqual(age, full_age, delta=1 / 7)
+
+
+class ScanSectorTestCase(SimpleTestCase):
+    def fan_box(self, width, height):
+        # Bounds of the fan: its apex at the top, its arc at the bottom, its edges at 45 degrees
+        radius, apex_y = height * 2 // 3, height // 7
+        spread = radius * np.cos(np.pi / 4)
+        return width // 2 - spread, apex_y, width // 2 + spread, apex_y + radius
+
+    def test_sector_box(self):
+        x0, y0, x1, y1 = self.fan_box(1920, 1080)
+        margin_x, margin_y = SECTOR_MARGIN * 1920, SECTOR_MARGIN * 1080
+        sector = find_scan_sector(fan_image())
+        # Found on a 256 wide thumbnail, within a thumbnail pixel of the fan and its margin
+        for found, expected in zip(sector, (x0 - margin_x, y0 - margin_y, x1 + margin_x, y1 + margin_y)):
+            self.assertAlmostEqual(found, expected, delta=1920 / 256 + 1)
+
+    def test_no_sector(self):
+        # A scan filling the frame leaves nothing worth cropping
+        self.assertIsNone(find_scan_sector(cv2.resize(scan_image(1)[40:440, 70:570], (640, 480))))
+        self.assertIsNone(find_scan_sector(np.zeros((480, 640, 3), np.uint8)))
+
+    def test_decode_sector(self):
+        image = fan_image(3840, 2160)
+        # A measured structure inside the fan, in original pixels
+        image[1000:1100, 1700:1900] = 255
+        upload = SimpleUploadedFile('scan.png', cv2.imencode('.png', image)[1].tobytes(), content_type='image/png')
+
+        reduced, scale = decode_examine_image(upload)
+        self.assertEqual(scale, (4.0, 4.0))
+        sector = find_scan_sector(reduced)
+        # The fan alone is about 2200 pixels wide, a quarter of it would be cropped below 640
+        cropped, scale, sector = decode_examine_sector(upload, reduced, scale, sector)
+        self.assertEqual(cropped.shape[:2], (1080, 1920))
+        self.assertEqual(scale, (2.0, 2.0))
+
+        x0, y0, x1, y1 = sector
+        # As the model would segment the structure in the crop, the overlay text is left outside
+        masks = (cropped[y0:y1, x0:x1, 0] > 240)[np.newaxis].astype(np.uint8) * 255
+        contours, boxes = scale_segmentation({
+            'scale': list(scale), 'instances': mask_polygons(masks, offset=(x0, y0))
+        })
+        self.assertEqual(len(boxes), 1)
+        for found, expected in zip(boxes[0], (1700, 1000, 200, 100)):
+            self.assertAlmostEqual(found, expected, delta=2)
+
+
+class PerceptualHashTestCase(SimpleTestCase):
+    sector = (70, 40, 570, 440)
+
+    def test_near_duplicates_match(self):
+        image = scan_image(1)
+        value = phash(image, self.sector)
+        # The same scan at 70% of its size, so is its sector
+        copy = phash(reencode(image, 448), (49, 28, 399, 308))
+        self.assertLessEqual(hash_distance(value, copy), settings.EXAMINE_DUPLICATE_DISTANCE)
+        self.assertLessEqual(
+            hash_distance(value, phash(image, (72, 43, 568, 437))), settings.EXAMINE_DUPLICATE_DISTANCE
+        )
+
+    def test_distinct_scans_differ(self):
+        # Scans of one machine share everything around the sector
+        value = phash(scan_image(1), self.sector)
+        for seed in range(2, 6):
+            self.assertGreater(
+                hash_distance(value, phash(scan_image(seed), self.sector)), 3 * settings.EXAMINE_DUPLICATE_DISTANCE
+            )
+
+    def test_overlay_outside_sector_ignored(self):
+        image = scan_image(1)
+        annotated = image.copy()
+        cv2.putText(annotated, 'FL 5.2cm 28w1d', (400, 470), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        self.assertEqual(phash(image, self.sector), phash(annotated, self.sector))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, EXAMINE_WORKER_POOL=False)
+@mock.patch('patient_examine.views.inspect_image', mock.Mock(return_value=(None, None)))
+class DuplicateExamineTestCase(PatientExamineTestCase):
+    def examine(self, image, patient=None, extension='.png', pixel_depth=0.1):
+        content = cv2.imencode(extension, image)[1].tobytes()
+        with mock.patch.object(PatientFemurExamineAPIView, 'predict', autospec=True, side_effect=predict) as model:
+            response = self.client.post(
+                f'/api/patient/{(patient or self.patient).id}/femur-examine/',
+                {'femur_image': SimpleUploadedFile(f'scan{extension}', content), 'pixel_depth': pixel_depth},
+                format='multipart'
+            )
+        self.assertEqual(response.data['response_code'], 201)
+        return response.data['data'], model.called
+
+    def test_near_duplicate_reused(self):
+        image = scan_image(1)
+        first, _ = self.examine(image)
+        with self.settings(EXAMINE_DUPLICATE_REUSE=True):
+            # Re-encoded at 70% of the size, the pixel depth grows with it
+            data, predicted = self.examine(reencode(image, 448), extension='.jpg', pixel_depth=0.1 * 640 / 448)
+
+        history = PatientExamineHistory.objects.earliest('examined_at')
+        self.assertEqual(data['duplicate']['id'], history.id)
+        self.assertGreater(data['duplicate']['distance'], 0)
+        self.assertTrue(data['duplicate']['reused'])
+        self.assertFalse(predicted)
+        # The earlier outlines measure the same length on the smaller copy
+        segmentation = history.prediction['segmentation']
+        length, _age = PatientFemurExamineAPIView().measure(
+            polygon_boxes(segmentation['instances']), 0.1, segmentation['scale']
+        )
+        self.assertAlmostEqual(data['femur_length'], float(length[0]), places=4)
+
+    def test_reframed_duplicate_not_reused(self):
+        image = scan_image(1)
+        with mock.patch('patient_examine.views.inspect_image', return_value=(None, (70, 40, 570, 440))):
+            self.examine(image)
+        with self.settings(EXAMINE_DUPLICATE_REUSE=True), mock.patch(
+            'patient_examine.views.inspect_image', return_value=(None, (30, 20, 530, 420))
+        ):
+            # The same sector with the overlay border cropped away, the outlines would not line up
+            data, predicted = self.examine(image[20:460, 40:600], extension='.png')
+        self.assertIsNotNone(data['duplicate'])
+        self.assertFalse(data['duplicate']['reused'])
+        self.assertTrue(predicted)
+
+    def test_earlier_examination_found(self):
+        image = scan_image(1)
+        self.examine(image)
+        self.examine(scan_image(2))
+        # The patient's exam now holds the second scan, the first one is still in the history
+        data, _ = self.examine(reencode(image, 448), extension='.jpg')
+        self.assertEqual(data['duplicate']['id'], PatientExamineHistory.objects.earliest('examined_at').id)
+
+    def test_distinct_scan_not_flagged(self):
+        self.examine(scan_image(1))
+        data, _ = self.examine(scan_image(2))
+        self.assertIsNone(data['duplicate'])
+
+    def test_other_patient_not_flagged(self):
+        self.examine(scan_image(1))
+        other = Patient.objects.create(
+            first_name='other', last_name='last', date_of_birth=datetime.date(1995, 1, 1),
+            examine_date=datetime.date.today(), trimester='2', blood_group='O+', age=29, phone_number='2'
+        )
+        data, _ = self.examine(scan_image(1), patient=other)
+        self.assertIsNone(data['duplicate'])
+
+
+class HashBandIndexTestCase(PatientExamineTestCase):
+    def record(self, value):
+        examine = PatientFemurExamine.objects.create(femur_image='scan.png', pixel_depth=0.1)
+        return PatientExamineHistory.record(self.patient, 'femur', examine, 42.0, 23.0, image_hash=value)
+
+    def flipped(self, value, bits):
+        flipped = np.unpackbits(np.frombuffer(value, dtype=np.uint8))
+        flipped[bits] ^= 1
+        return np.packbits(flipped).tobytes()
+
+    def test_lookup_within_radius(self):
+        value = np.random.default_rng(0).integers(0, 256, HASH_BYTES, dtype=np.uint8).tobytes()
+        # A bit in every band but the last, the furthest the bands still find
+        far = self.record(self.flipped(value, [band * BAND_BITS for band in range(BANDS - 1)]))
+        # A bit in every band, no band is left in common
+        unreachable = self.record(self.flipped(value, [band * BAND_BITS for band in range(BANDS)]))
+        near = self.record(self.flipped(value, [3, 40, 77]))
+
+        bands = PatientExamineHashBand.objects.filter(patient=self.patient, kind='femur')
+        self.assertEqual(find_similar(bands, value, MAX_DISTANCE), (near, 3))
+        near.delete()
+        self.assertEqual(find_similar(bands, value, MAX_DISTANCE), (far, MAX_DISTANCE))
+        self.assertEqual(find_similar(bands, value, 24), (None, None))
+        self.assertEqual(hash_distance(bytes(unreachable.image_hash), value), MAX_DISTANCE + 1)
+        self.assertEqual(find_similar(bands.filter(kind='head'), value, MAX_DISTANCE), (None, None))
+        far.delete()
+        self.assertEqual(find_similar(bands, value, MAX_DISTANCE), (None, None))
+
+    def test_lookup_queries(self):
+        value = bytes(HASH_BYTES)
+        self.record(value)
+        with self.assertNumQueries(1):
+            find_similar(PatientExamineHashBand.objects.filter(patient=self.patient, kind='femur'), value, 24)
+        with self.assertRaises(ValueError):
+            find_similar(PatientExamineHashBand.objects.all(), value, MAX_DISTANCE + 1)
+
+
+def clustered_embeddings(clusters=4, size=64, dimensions=16):
+    # Unit length float16 rows around `clusters` well separated centers
+    rng = np.random.default_rng(0)
+    centers = np.repeat(np.eye(clusters, dimensions) * 4, size, axis=0)
+    vectors = centers + rng.normal(size=(clusters * size, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float16)
+
+
+class EmbeddingIndexTestCase(TestCase):
+    def setUp(self):
+        self.vectors = clustered_embeddings()
+        self.examines = PatientFemurExamine.objects.bulk_create([
+            PatientFemurExamine(femur_image='scan.png', pixel_depth=0.1, embedding=vector.tobytes(),
+                                embedded_at=timezone.now())
+            for vector in self.vectors
+        ])
+        self.queries = self.vectors[[0, 70, 140, 210]]
+
+    def search(self, **kwargs):
+        self.index = EmbeddingIndex(PatientFemurExamine.objects.all())
+        return self.index.search(self.queries, 10, **kwargs)
+
+    def test_ivf_agrees_with_exact_search(self):
+        exact = self.search()
+        with self.settings(EXAMINE_EMBEDDING_IVF_LISTS=4, EXAMINE_EMBEDDING_IVF_PROBES=2):
+            partitioned = self.search()
+        # Only the rows of half the partitions were scored
+        self.assertEqual(len(self.index.centroids), 4)
+
+        for exact_matches, partitioned_matches in zip(exact, partitioned):
+            self.assertEqual([pk for pk, _ in exact_matches], [pk for pk, _ in partitioned_matches])
+            np.testing.assert_allclose(
+                [similarity for _, similarity in exact_matches], [similarity for _, similarity in partitioned_matches]
+            )
+
+    def test_exact_search(self):
+        vectors = self.vectors.astype(np.float32)
+        for query, matches in zip(self.queries, self.search()):
+            scores = vectors @ query.astype(np.float32)
+            expected = np.argsort(-scores, kind='stable')[:10]
+            self.assertEqual([pk for pk, _ in matches], [self.examines[index].pk for index in expected])
+            np.testing.assert_allclose([similarity for _, similarity in matches], scores[expected], rtol=1e-5)
+
+    def test_exclude(self):
+        query = self.examines[0].pk
+        matches = self.search(exclude=[query])[0]
+        self.assertEqual(len(matches), 10)
+        self.assertNotIn(query, [pk for pk, _ in matches])
+        self.assertEqual(self.search()[0][0][0], query)
+
+
+class EmbeddingHookTestCase(SimpleTestCase):
+    def test_unit_length_float16(self):
+        torch.manual_seed(0)
+        layers = torch.nn.ModuleList([
+            torch.nn.Conv2d(3, 8, 3), torch.nn.Conv2d(8, 32, 1), torch.nn.Upsample(scale_factor=2)
+        ])
+        model = mock.Mock(spec=['model'], model=mock.Mock(model=layers))
+        attach_embedding_hook(model)
+
+        features = torch.rand(1, 3, 16, 16)
+        with torch.no_grad():
+            for layer in layers:
+                features = layer(features)
+
+        embedding = take_embedding(model)
+        self.assertEqual(embedding.dtype, np.float16)
+        self.assertEqual(embedding.shape, (32,))
+        self.assertAlmostEqual(float(np.linalg.norm(embedding.astype(np.float32))), 1.0, places=3)
+        # Stored as bytes and read back as the similar view does
+        np.testing.assert_array_equal(np.frombuffer(embedding.tobytes(), dtype=np.float16), embedding)
+        # One embedding per forward pass
+        self.assertIsNone(take_embedding(model))
+
+
+@mock.patch.dict('utils.embeddings._indexes', clear=True)
+class SimilarExamineTestCase(PatientExamineTestCase):
+    def examine(self, patient, vector):
+        patient.femur_examine = PatientFemurExamine.objects.create(
+            femur_image='scan.png', pixel_depth=0.1, femur_length=42.0, femur_age=23.0,
+            embedding=vector.tobytes(), embedded_at=timezone.now()
+        )
+        patient.save(update_fields=['femur_examine'])
+        return patient.femur_examine
+
+    def test_similar(self):
+        vectors = clustered_embeddings(size=2)
+        examine = self.examine(self.patient, vectors[0])
+        others = []
+        for index, vector in enumerate(vectors[1:]):
+            patient = Patient.objects.create(
+                first_name='other', last_name=str(index), date_of_birth=datetime.date(1995, 1, 1),
+                examine_date=datetime.date.today(), trimester='2', blood_group='O+', age=29, phone_number='2'
+            )
+            others.append((patient, self.examine(patient, vector)))
+
+        response = self.client.get(f'/api/patient/{self.patient.id}/femur-examine/similar/', {'k': 3})
+        self.assertEqual(response.data['response_code'], 200)
+        data = response.data['data']
+        self.assertEqual(len(data), 3)
+        self.assertNotIn(examine.pk, [match['id'] for match in data])
+        # The other exam of the same cluster first, with the patient it belongs to
+        patient, nearest = others[0]
+        self.assertEqual((data[0]['id'], data[0]['patient']), (nearest.pk, patient.pk))
+        self.assertEqual(data[0]['femur_length'], 42.0)
+        self.assertEqual([match['similarity'] for match in data], sorted(
+            [match['similarity'] for match in data], reverse=True
+        ))
+
+    def test_no_embedding(self):
+        response = self.client.get(f'/api/patient/{self.patient.id}/femur-examine/similar/')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExamineGrowthTestCase(PatientExamineTestCase):
+    def record(self, examined_at, measurement):
+        examine = PatientFemurExamine.objects.create(femur_image='scan.png', pixel_depth=0.1)
+        with mock.patch('patient_examine.models.timezone.now', return_value=examined_at):
+            return PatientExamineHistory.record(self.patient, 'femur', examine, measurement, 20.0)
+
+    def test_growth_matches_least_squares(self):
+        first = timezone.now()
+        weeks = np.array([0.0, 1.5, 3.0, 7.25, 12.0, 12.5])
+        measurements = np.array([31.0, 33.2, 36.1, 41.9, 50.3, 50.8])
+        history = [
+            self.record(first + datetime.timedelta(weeks=float(week)), float(measurement))
+            for week, measurement in zip(weeks, measurements)
+        ]
+
+        growth = PatientExamineGrowth.objects.get(patient=self.patient, kind='femur')
+        self.assertEqual(growth.count, len(weeks))
+        self.assertAlmostEqual(growth.growth_rate, np.polyfit(weeks, measurements, 1)[0])
+
+        velocities = np.diff(measurements) / np.diff(weeks)
+        self.assertIsNone(history[0].velocity)
+        np.testing.assert_allclose([row.velocity for row in history[1:]], velocities)
+        self.assertAlmostEqual(growth.last_velocity, velocities[-1])
+
+    def test_growth_needs_two_times(self):
+        examined_at = timezone.now()
+        self.record(examined_at, 31.0)
+        self.assertIsNone(PatientExamineGrowth.objects.get().growth_rate)
+
+        # Examined twice at once, there is no slope or velocity to tell
+        second = self.record(examined_at, 32.0)
+        self.assertIsNone(second.velocity)
+        self.assertIsNone(PatientExamineGrowth.objects.get().growth_rate)
+
+
+class TilePyramidTestCase(SimpleTestCase):
+    # Neither side a multiple of the tile size
+    width, height, tile_size = 1000, 700, 256
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'scan.png')
+        cls.image = np.random.default_rng(0).integers(0, 256, (cls.height, cls.width, 3), dtype=np.uint8)
+        cv2.imwrite(cls.path, cls.image)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def tile(self, level, column, row):
+        return render_tile(self.path, self.width, self.height, level, column, row, self.tile_size)
+
+    def stitch(self, level):
+        columns, rows = get_tile_grid(self.width, self.height, level, self.tile_size)
+        return np.vstack([
+            np.hstack([self.tile(level, column, row) for column in range(columns)]) for row in range(rows)
+        ])
+
+    def test_levels(self):
+        # From a single pixel up to 1000 pixels wide, 2 ** 10 = 1024
+        self.assertEqual(get_max_level(self.width, self.height), 10)
+        self.assertEqual(get_level_size(self.width, self.height, 10), (1000, 700))
+        self.assertEqual(get_level_size(self.width, self.height, 9), (500, 350))
+        self.assertEqual(get_level_size(self.width, self.height, 3), (8, 6))
+        self.assertEqual(get_level_size(self.width, self.height, 0), (1, 1))
+        self.assertEqual(get_tile_grid(self.width, self.height, 10, self.tile_size), (4, 3))
+        self.assertEqual(get_tile_grid(self.width, self.height, 9, self.tile_size), (2, 2))
+        self.assertEqual(get_tile_grid(self.width, self.height, 8, self.tile_size), (1, 1))
+
+    def test_edge_tiles(self):
+        self.assertEqual(self.tile(10, 0, 0).shape[:2], (256, 256))
+        # The last column and row only hold what is left of the image
+        self.assertEqual(self.tile(10, 3, 0).shape[:2], (256, 1000 - 3 * 256))
+        self.assertEqual(self.tile(10, 0, 2).shape[:2], (700 - 2 * 256, 256))
+        self.assertEqual(self.tile(10, 3, 2).shape[:2], (700 - 2 * 256, 1000 - 3 * 256))
+        self.assertEqual(self.tile(9, 1, 1).shape[:2], (350 - 256, 500 - 256))
+        self.assertEqual(self.tile(0, 0, 0).shape[:2], (1, 1))
+        for level, column, row in ((10, 4, 0), (10, 0, 3), (9, 2, 0), (11, 0, 0), (-1, 0, 0)):
+            self.assertIsNone(self.tile(level, column, row), (level, column, row))
+
+    def test_no_overlap(self):
+        # The full resolution tiles put side by side are the image itself, not a pixel shared or lost
+        self.assertTrue((self.stitch(10) == self.image).all())
+        # Reduced levels are decoded at a reduced size, their tiles still add up to the level size
+        self.assertEqual(self.stitch(9).shape[:2], (350, 500))
+        self.assertEqual(self.stitch(7).shape[:2], (88, 125))
+
+
+class InferenceSchedulerTestCase(SimpleTestCase):
+    def scheduler(self, aging=1000.0, max_concurrency=1):
+        return InferenceScheduler(
+            'test', max_concurrency, {INTERACTIVE: 64, BATCH: 64, BACKGROUND: 64}, 30,
+            {INTERACTIVE: 8, BATCH: 2, BACKGROUND: 1}, aging
+        )
+
+    def enqueue(self, scheduler, priority, enqueued=0.0, deadline=None):
+        waiter = _Waiter(priority, enqueued, deadline)
+        scheduler.queues[priority].append(waiter)
+        return waiter
+
+    def grants(self, scheduler, count, now=0.0):
+        # Every slot is freed as soon as it is handed out, in the order the scheduler picks
+        order = []
+        for _ in range(count):
+            priority = scheduler._pick(now)
+            waiter = scheduler.queues[priority][0]
+            scheduler.running = 0
+            scheduler._dispatch(now)
+            self.assertTrue(waiter.granted)
+            order.append(priority)
+        return order
+
+    def test_slots_shared_by_weight(self):
+        scheduler = self.scheduler()
+        for priority in (BACKGROUND, BATCH, INTERACTIVE):
+            for _ in range(20):
+                self.enqueue(scheduler, priority)
+
+        order = self.grants(scheduler, 22)
+        self.assertEqual(order.count(INTERACTIVE), 16)
+        self.assertEqual(order.count(BATCH), 4)
+        self.assertEqual(order.count(BACKGROUND), 2)
+
+    def test_aging_prevents_starvation(self):
+        scheduler = self.scheduler(aging=1000.0)
+        background = self.enqueue(scheduler, BACKGROUND, enqueued=0.0)
+        for _ in range(20):
+            self.enqueue(scheduler, INTERACTIVE, enqueued=10.0)
+        # Background used its share, interactive requests arriving later would win every slot
+        scheduler.passes[BACKGROUND] = 5.0
+        self.assertEqual(scheduler._pick(10.0), INTERACTIVE)
+
+        # Having waited 10 seconds is worth ten background strides once aging is 1 second
+        scheduler.aging = 1.0
+        self.assertEqual(self.grants(scheduler, 1, now=10.0), [BACKGROUND])
+        self.assertTrue(background.granted)
+
+    def test_expired_waiter_skipped(self):
+        scheduler = self.scheduler()
+        scheduler.running = 1
+        expired = self.enqueue(scheduler, INTERACTIVE, deadline=Deadline(-1))
+        waiting = self.enqueue(scheduler, INTERACTIVE, deadline=Deadline(60))
+
+        scheduler._release()
+        self.assertFalse(expired.granted)
+        self.assertTrue(expired.event.is_set())
+        self.assertTrue(waiting.granted)
+        self.assertEqual(scheduler.running, 1)
+
+    def test_deadline_expires_in_queue(self):
+        scheduler = self.scheduler()
+        with scheduler.admit():
+            with self.assertRaises(DeadlineExceededException) as raised:
+                with scheduler.admit(deadline=Deadline(0.05)):
+                    pass
+
+        self.assertEqual(handle_exceptions(raised.exception, '').status_code, 504)
+        self.assertEqual(scheduler.waiting, 0)
+        self.assertEqual(scheduler.running, 0)
+
+    def test_slot_released_on_exception(self):
+        scheduler = self.scheduler()
+        waiter = threading.Event()
+        admitted = []
+
+        def wait_for_slot():
+            waiter.set()
+            with scheduler.admit(BATCH, timeout=5):
+                admitted.append(scheduler.running)
+
+        with self.assertRaises(RuntimeError):
+            with scheduler.admit():
+                thread = threading.Thread(target=wait_for_slot)
+                thread.start()
+                waiter.wait()
+                while not scheduler.waiting:
+                    time.sleep(0.001)
+                raise RuntimeError('inference failed')
+
+        thread.join(5)
+        self.assertEqual(admitted, [1])
+        self.assertEqual(scheduler.running, 0)
+
+
+class ResolutionControllerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('model.resolution.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Without smoothing, the latency is the last inference's, normalised to 640
+        self.controller = ResolutionController(
+            'femur', [320, 640, 480], latency_high=2.0, latency_low=1.0, queue_high=4, queue_low=1,
+            cooldown=5.0, alpha=1.0
+        )
+
+    def infer(self, latency, queued=0):
+        # An inference taking `latency` seconds at 640, less at smaller sizes
+        with self.controller.track(queued) as size:
+            self.now += latency * (size / 640) ** 2
+        return size
+
+    def wait(self):
+        self.now += self.controller.cooldown
+
+    def test_latency_steps(self):
+        self.assertEqual(self.infer(3.0), 640)
+        # Stepped down once the slow inference finished, and no further within the cooldown
+        self.assertEqual(self.infer(3.0), 480)
+        self.assertEqual(self.infer(3.0), 480)
+        self.wait()
+        # 3 seconds at 640 is still 1.7 at 480, within bounds
+        self.assertEqual(self.infer(3.0), 480)
+        self.wait()
+        self.assertEqual(self.infer(5.0), 480)
+        self.assertEqual(self.infer(5.0), 320)
+
+    def test_hysteresis(self):
+        self.infer(3.0)
+        self.wait()
+        # 1.5 seconds at 640 is below the high mark, but not below the low one: neither
+        # 640 steps down nor 480 back up, however long it lasts
+        for _ in range(3):
+            self.assertEqual(self.infer(1.5), 480)
+            self.wait()
+        self.assertEqual(self.infer(0.8), 480)
+        self.assertEqual(self.infer(0.8), 640)
+        for _ in range(3):
+            self.wait()
+            self.assertEqual(self.infer(1.5), 640)
+
+    def test_queue_steps(self):
+        # Fast inferences, but a queue beyond the high mark
+        self.assertEqual(self.infer(0.1, queued=5), 480)
+        self.wait()
+        self.assertEqual(self.infer(0.1, queued=5), 320)
+        self.wait()
+        # Already at the smallest size
+        self.assertEqual(self.infer(0.1, queued=5), 320)
+        self.wait()
+        # Back up only once the queue drained below the low mark, one size per cooldown
+        self.assertEqual(self.infer(0.1, queued=2), 320)
+        self.wait()
+        self.assertEqual(self.infer(0.1), 480)
+        self.assertEqual(self.infer(0.1), 480)
+        self.wait()
+        self.assertEqual(self.infer(0.1), 640)
+
+
+class DeadlineTestCase(SimpleTestCase):
+    @override_settings(EXAMINE_TIMEOUT=30, EXAMINE_TIMEOUT_MAX=120)
+    def test_from_request(self):
+        factory = RequestFactory()
+        for headers, timeout in (
+            ({}, 30),
+            ({'HTTP_X_REQUEST_TIMEOUT': '10'}, 10),
+            ({'HTTP_X_REQUEST_TIMEOUT': '1e9'}, 120),
+            ({'HTTP_X_REQUEST_TIMEOUT': 'soon'}, 30),
+            ({'HTTP_X_REQUEST_TIMEOUT': 'nan'}, 30),
+            ({'HTTP_X_REQUEST_TIMEOUT': 'inf'}, 30),
+            ({'HTTP_X_REQUEST_DEADLINE': 'nan'}, 30),
+            ({'HTTP_X_REQUEST_DEADLINE': str(time.time() + 10)}, 10),
+        ):
+            deadline = Deadline.from_request(factory.post('/', **headers))
+            self.assertAlmostEqual(deadline.remaining(), timeout, delta=1, msg=headers)
+
+
+class InferencePoolConfigTestCase(SimpleTestCase):
+    @override_settings(EXAMINE_WORKERS=None, EXAMINE_WORKER_THREADS=None)
+    def test_pool_sized_per_serving_process(self):
+        with mock.patch('psutil.cpu_count', return_value=16):
+            for serving, config in ((1, (8, 2)), (4, (2, 2)), (16, (1, 1)), (32, (1, 1))):
+                with self.settings(EXAMINE_SERVING_PROCESSES=serving):
+                    self.assertEqual(get_pool_config(), config)
+
+    @override_settings(EXAMINE_SERVING_PROCESSES=4, EXAMINE_WORKER_THREADS=None)
+    def test_local_threads(self):
+        with mock.patch('psutil.cpu_count', return_value=16), \
+                mock.patch('model.workers._local_threads', None), \
+                mock.patch('torch.set_num_threads') as set_num_threads:
+            set_local_threads()
+            set_local_threads()
+        set_num_threads.assert_called_once_with(4)
+
+
+@override_settings(EXAMINE_WORKER_POOL=True, EXAMINE_SHM_TRANSPORT=True, EXAMINE_SHM_SLOTS=2, EXAMINE_SHM_SLOT_SIZE=4096)
+@mock.patch('model.workers._pool', None)
+@mock.patch('model.workers.create_pool', lambda *args: mock.Mock())
+class InferencePoolResetTestCase(SimpleTestCase):
+    def tearDown(self):
+        workers.close_rings()
+
+    def test_broken_pool_releases_rings(self):
+        pool = workers.get_inference_pool()
+        rings = (workers._input_ring, workers._output_ring)
+        names = [ring.name for ring in rings]
+        handle = rings[0].put(np.ones((8, 8), dtype=np.uint8))
+        # A result taken from the output ring before the crash stays readable
+        result = rings[1].take(rings[1].put(np.full((8, 8), 7, dtype=np.uint8)))
+
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        with self.assertRaises(BrokenProcessPool):
+            workers.wait_for_result(pool, future, None, rings, handle)
+
+        pool.shutdown.assert_called_once_with(wait=False)
+        for name in names:
+            self.assertFalse(os.path.exists(f'/dev/shm/{name}'))
+        self.assertEqual(result.sum(), 7 * 64)
+
+        # The next request gets a new pool with rings of its own
+        new_pool = workers.get_inference_pool()
+        self.assertIsNot(new_pool, pool)
+        for ring in (workers._input_ring, workers._output_ring):
+            self.assertNotIn(ring.name, names)
+            self.assertTrue(os.path.exists(f'/dev/shm/{ring.name}'))
@@ -3,5 +3,91 @@ from .views import *
 
 urlpatterns = [
     path('patient/<int:id>/femur-examine/', PatientFemurExamineAPIView.as_view(), name='patient-femur-examine'),
-    path('patient/<int:id>/head-examine/', PatientHeadExamineAPIView.as_view(), name='patient-head-examine')
+    path('patient/<int:id>/head-examine/', PatientHeadExamineAPIView.as_view(), name='patient-head-examine'),
+    path(
+        'patient/<int:id>/femur-examine/remeasure/',
+        PatientFemurRemeasureAPIView.as_view(),
+        name='patient-femur-remeasure'
+    ),
+    path(
+        'patient/<int:id>/head-examine/remeasure/',
+        PatientHeadRemeasureAPIView.as_view(),
+        name='patient-head-remeasure'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/overlay/',
+        PatientFemurOverlayAPIView.as_view(),
+        name='patient-femur-overlay'
+    ),
+    path(
+        'patient/<int:id>/head-examine/overlay/',
+        PatientHeadOverlayAPIView.as_view(),
+        name='patient-head-overlay'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/tiles/',
+        PatientFemurTilesAPIView.as_view(),
+        name='patient-femur-tiles'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/tiles/<str:version>/<int:level>/<int:column>_<int:row>.jpg',
+        PatientFemurTilesAPIView.as_view(),
+        name='patient-femur-tile'
+    ),
+    path(
+        'patient/<int:id>/head-examine/tiles/',
+        PatientHeadTilesAPIView.as_view(),
+        name='patient-head-tiles'
+    ),
+    path(
+        'patient/<int:id>/head-examine/tiles/<str:version>/<int:level>/<int:column>_<int:row>.jpg',
+        PatientHeadTilesAPIView.as_view(),
+        name='patient-head-tile'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/uploads/',
+        PatientExamineUploadsAPIView.as_view(kind='femur'),
+        name='patient-femur-uploads'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/uploads/<uuid:upload_id>/',
+        PatientExamineUploadAPIView.as_view(kind='femur'),
+        name='patient-femur-upload'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/uploads/<uuid:upload_id>/finalize/',
+        PatientFemurUploadFinalizeAPIView.as_view(),
+        name='patient-femur-upload-finalize'
+    ),
+    path(
+        'patient/<int:id>/head-examine/uploads/',
+        PatientExamineUploadsAPIView.as_view(kind='head'),
+        name='patient-head-uploads'
+    ),
+    path(
+        'patient/<int:id>/head-examine/uploads/<uuid:upload_id>/',
+        PatientExamineUploadAPIView.as_view(kind='head'),
+        name='patient-head-upload'
+    ),
+    path(
+        'patient/<int:id>/head-examine/uploads/<uuid:upload_id>/finalize/',
+        PatientHeadUploadFinalizeAPIView.as_view(),
+        name='patient-head-upload-finalize'
+    ),
+    path(
+        'patient/<int:id>/femur-examine/similar/',
+        PatientFemurSimilarAPIView.as_view(),
+        name='patient-femur-similar'
+    ),
+    path(
+        'patient/<int:id>/head-examine/similar/',
+        PatientHeadSimilarAPIView.as_view(),
+        name='patient-head-similar'
+    ),
+    path(
+        'patient/<int:id>/examine-history/',
+        PatientExamineHistoryAPIView.as_view(),
+        name='patient-examine-history'
+    ),
+    path('examine/stats/', PatientExamineStatsAPIView.as_view(), name='examine-stats')
 ]
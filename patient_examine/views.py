@@ -1,3 +1,16 @@
+import fcntl
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework.generics import get_object_or_404
@@ -8,24 +21,333 @@ from utils.exceptions import (
     handle_exceptions,
     PatientExamineException
 )
+from utils.utils import (
+    decode_examine_image,
+    decode_examine_sector,
+    upload_path,
+    polygon_boxes,
+    result_image_name,
+    file_sha256,
+    AssembledUpload
+)
+from utils.media_cache import cached_image
+from utils.phash import find_similar, phash
+from utils.embeddings import get_embedding_index
+from utils.mixins import PaginationMixin
+from utils.paginations import FetusCursorPagination
+from utils.tiles import get_image_dimensions, get_max_level, render_tile
 from users.auth import UserTokenAuthentication
-from patients.models import Patient
-from model.femur_model import predict_femur_length_and_age
-from model.head_model import predict_head_circumference_and_age
+from patients.models import Patient, ArchivedPatient
+from model import stats
+from model.preprocess import inspect_image, QUALITY_REJECTIONS
+from model.resolution import get_resolution_controller
+from model.scheduler import get_inference_scheduler, get_inference_schedulers, INTERACTIVE
+from model.deadline import Deadline
+from model.video import frame_image_name
+from model.femur_model import femur_length_and_age, render_femur_overlay
+from model.head_model import head_circumference_and_age, render_head_overlay
+from model.workers import dispatch_examine, dispatch_select_frame
 
-from .serializers import PatientFemurExamineSerializer, PatientHeadExamineSerializer
+from .models import ExamineUpload, PatientExamineHistory, PatientExamineHashBand, PatientExamineGrowth
+from .serializers import (
+    PatientFemurExamineSerializer,
+    PatientHeadExamineSerializer,
+    PatientExamineRemeasureSerializer,
+    PatientExamineSimilarSerializer,
+    ExamineUploadSerializer,
+    PatientExamineHistorySerializer,
+    PatientExamineGrowthSerializer,
+    PatientExamineHistoryFilterSerializer
+)
 
 
-class PatientFemurExamineAPIView(
+class PatientExamineBaseAPIView(
     generics.CreateAPIView
 ):
     permission_classes = (permissions.IsAuthenticated,)
     authentication_classes = [UserTokenAuthentication]
+
+    # Name of the model used for the examination, and of the examine foreign key on Patient
+    # and of the image field on the examine, and of the cine loop field on the serializer
+    kind = None
+    examine_field = None
+    image_field = None
+    video_field = None
+    # Names of the (measurement, age) fields filled in from the prediction
+    measurement_fields = ()
+    success_message = None
+    failure_message = None
+
+    def predict(self, image, pixel_depth, scale, sector, imgsz, deadline):
+        return dispatch_examine(self.kind, image, pixel_depth, scale, sector, imgsz, deadline=deadline)
+
+    def select_frame(self, video, imgsz, deadline):
+        with upload_path(video) as path:
+            return dispatch_select_frame(self.kind, path, imgsz, deadline=deadline)
+
+    def measure(self, boxes, pixel_depth, scale):
+        raise NotImplementedError
+
+    def reuse_prediction(self, duplicate, image, scale, pixel_depth):
+        """
+        Instances, segmentation and embedding of `image` taken from the earlier examination it
+        duplicates. The outlines stay in the duplicate's decoded pixels, only their scale is adjusted
+        to the size this copy was uploaded at, and the measurements follow its pixel depth.
+        """
+        prediction = duplicate.prediction
+        duplicate_width, duplicate_height = prediction['size']
+        decoded_height, decoded_width = image.shape[:2]
+        (scale_x, scale_y), (duplicate_scale_x, duplicate_scale_y) = scale, prediction['segmentation']['scale']
+        segmentation = {
+            'scale': [
+                duplicate_scale_x * decoded_width * scale_x / duplicate_width,
+                duplicate_scale_y * decoded_height * scale_y / duplicate_height
+            ],
+            'instances': prediction['segmentation']['instances']
+        }
+
+        measurements, ages = self.measure(
+            polygon_boxes(segmentation['instances']), pixel_depth, segmentation['scale']
+        )
+        embedding = None if duplicate.embedding is None else np.frombuffer(duplicate.embedding, dtype=np.float16)
+        return list(zip(measurements, ages, prediction['confidences'])), segmentation, embedding
+
+    def measure_frame(self, frame_prediction, pixel_depth):
+        """
+        Instances, segmentation and embedding of the best frame of a cine loop, from the
+        outlines the model traced on it while the frames were scored.
+        """
+        polygons, confidences, embedding = frame_prediction
+        segmentation = {'scale': [1.0, 1.0], 'instances': polygons}
+        measurements, ages = self.measure(polygon_boxes(polygons), pixel_depth, segmentation['scale'])
+        return list(zip(measurements, ages, confidences)), segmentation, embedding
+
+    def is_reusable(self, duplicate, size):
+        """
+        Whether `duplicate` was measured on the same framing as an image of `size`, only
+        resized, so that its outlines carry over.
+        """
+        prediction = duplicate.prediction
+        if not prediction or not prediction['segmentation']:
+            return False
+        (width, height), (duplicate_width, duplicate_height) = size, prediction['size']
+        aspect, duplicate_aspect = width / height, duplicate_width / duplicate_height
+        return abs(aspect - duplicate_aspect) <= settings.EXAMINE_DUPLICATE_ASPECT_TOLERANCE * duplicate_aspect
+
+    def create(self, request, *args, **kwargs):
+        try:
+            # Bounded inference concurrency, a slot is only held while the model runs
+            scheduler = get_inference_scheduler(self.kind)
+            priority = request.headers.get('X-Inference-Priority', INTERACTIVE)
+            deadline = Deadline.from_request(request)
+            return self.perform_examine(request, scheduler, priority, deadline, *args, **kwargs)
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
+    def get_examine_data(self, request):
+        return request.data
+
+    def perform_examine(self, request, scheduler, priority, deadline, *args, **kwargs):
+        serializer = self.get_serializer(data=self.get_examine_data(request))
+        serializer.is_valid(raise_exception=True)
+
+        patient_id = kwargs['id']
+        if patient_id is None:
+            return Response({
+                "response_code": status.HTTP_400_BAD_REQUEST,
+                "response_message": _("Patient with the provided ID does not exist."),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        patient = get_object_or_404(Patient, pk=patient_id)
+
+        pixel_depth = serializer.validated_data.get('pixel_depth')
+        video = serializer.validated_data.pop(self.video_field, None)
+        controller = get_resolution_controller(self.kind)
+
+        deadline.check('decode')
+        if video is None:
+            # Measure straight from the uploaded bytes, the original is only persisted afterwards
+            upload = serializer.validated_data.get(self.image_field)
+            image, scale = decode_examine_image(upload)
+            frame_index = None
+        else:
+            # Cine loops are streamed through the model and measured on their best frame from
+            # what the model found while scoring it, the frame is persisted in place of an uploaded
+            # image. Scoring a whole clip takes far longer than one inference, it runs at the current
+            # size without feeding the controller
+            imgsz = controller.size
+            with scheduler.admit(priority, deadline=deadline):
+                frame_index, frame_prediction, image = self.select_frame(video, imgsz, deadline)
+            if image is not None:
+                upload = ContentFile(
+                    cv2.imencode('.png', image)[1].tobytes(), name=frame_image_name(video.name, frame_index)
+                )
+            scale = (1.0, 1.0)
+
+        if image is None:
+            raise PatientExamineException(self.failure_message)
+
+        # Reject unusable images from a thumbnail before spending inference on them
+        reason, sector = inspect_image(image)
+        stats.increment('quality', reason or 'accepted')
+        if reason is not None:
+            raise PatientExamineException(QUALITY_REJECTIONS[reason])
+        if video is None:
+            image, scale, sector = decode_examine_sector(upload, image, scale, sector)
+
+        # Re-encoded copies of one of the patient's earlier scans are found by the perceptual hash
+        # of the sector, through the hash band index of the examination history
+        image_hash = phash(image, sector)
+        duplicate, distance = find_similar(
+            PatientExamineHashBand.objects.filter(patient=patient, kind=self.kind),
+            image_hash, settings.EXAMINE_DUPLICATE_DISTANCE
+        )
+        size = [round(image.shape[1] * scale[0]), round(image.shape[0] * scale[1])]
+        reused = duplicate is not None and settings.EXAMINE_DUPLICATE_REUSE and self.is_reusable(duplicate, size)
+        if duplicate is not None:
+            stats.increment('duplicates', f'{self.kind}_{"reused" if reused else "flagged"}')
+
+        if reused:
+            instances, segmentation, embedding = self.reuse_prediction(duplicate, image, scale, pixel_depth)
+            imgsz = duplicate.prediction['inference_size']
+        elif video is not None:
+            instances, segmentation, embedding = self.measure_frame(frame_prediction, pixel_depth)
+        else:
+            # Inference size steps down while this model is under load
+            with scheduler.admit(priority, deadline=deadline), controller.track(scheduler.waiting) as imgsz:
+                instances, segmentation, embedding = self.predict(image, pixel_depth, scale, sector, imgsz, deadline)
+
+        if not instances:
+            raise PatientExamineException(self.failure_message)
+
+        # Every instance found in the image is kept, the exam itself carries the most confident one
+        measurement, age = instances[0][:2]
+
+        # Past this point the client would never see the result, so don't persist it either
+        deadline.check('write')
+
+        measurement_field, age_field = self.measurement_fields
+        model = serializer.Meta.model
+        storage = model._meta.get_field(self.image_field).storage
+        fields = {
+            'pixel_depth': pixel_depth,
+            measurement_field: measurement,
+            age_field: age,
+            'inference_size': imgsz,
+            'frame_index': frame_index,
+            'segmentation': segmentation,
+            'embedding': None if embedding is None else embedding.tobytes(),
+            'embedded_at': None if embedding is None else timezone.now()
+        }
+
+        # The file is stored up front, so the transaction below only holds its locks for the row writes
+        image_name = storage.save(upload.name, upload)
+        fields[self.image_field] = image_name
+        previous_name = None
+        try:
+            with transaction.atomic():
+                # Concurrent examinations of the patient are written one after the other
+                patient = Patient.objects.select_for_update().select_related(self.examine_field).get(pk=patient.pk)
+                examine = getattr(patient, self.examine_field)
+                if examine is None:
+                    examine = model.objects.create(**fields)
+                    setattr(patient, self.examine_field, examine)
+                    patient.save(update_fields=[self.examine_field])
+                else:
+                    previous_name = getattr(examine, self.image_field).name
+                    for field, value in fields.items():
+                        setattr(examine, field, value)
+                    examine.save(update_fields=list(fields))
+                    examine.instances.all().delete()
+
+                instance_model = examine.instances.model
+                instance_model.objects.bulk_create([
+                    instance_model(**{
+                        'examine': examine,
+                        'index': index,
+                        measurement_field: instance_measurement,
+                        age_field: instance_age,
+                        'confidence': instance_confidence
+                    })
+                    for index, (instance_measurement, instance_age, instance_confidence) in enumerate(instances)
+                ])
+
+                # The exam above is replaced by the next one, its history is kept with what
+                # it takes to measure a duplicate of it again
+                PatientExamineHistory.record(
+                    patient, self.kind, examine, measurement, age, image_hash=image_hash,
+                    prediction={
+                        'size': size,
+                        'segmentation': segmentation,
+                        'confidences': [instance[2] for instance in instances],
+                        'inference_size': imgsz
+                    },
+                    embedding=fields['embedding']
+                )
+        except Exception:
+            # Nothing refers to the stored image anymore
+            storage.delete(image_name)
+            raise
+
+        # The replaced image loses this exam's reference once the new one is committed
+        if previous_name:
+            storage.delete(previous_name)
+
+        # The annotated overlay is only rendered once somebody looks at it
+        return Response({
+            "response_code": status.HTTP_201_CREATED,
+            "response_message": self.success_message,
+            "data": {
+                'id': examine.id,
+                self.image_field: storage.url(image_name),
+                f'{self.image_field}_result': reverse(f'patient-{self.kind}-overlay', kwargs={'id': patient.id}),
+                'pixel_depth': examine.pixel_depth,
+                measurement_field: getattr(examine, measurement_field),
+                age_field: getattr(examine, age_field),
+                'inference_size': examine.inference_size,
+                'frame_index': examine.frame_index,
+                'duplicate': None if duplicate is None else {
+                    'id': duplicate.id,
+                    'examined_at': duplicate.examined_at,
+                    'distance': distance,
+                    'reused': reused
+                },
+                'instances': [
+                    {
+                        'index': index,
+                        measurement_field: instance_measurement,
+                        age_field: instance_age,
+                        'confidence': instance_confidence
+                    }
+                    for index, (instance_measurement, instance_age, instance_confidence) in enumerate(instances)
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+
+
+class PatientFemurExamineAPIView(
+    PatientExamineBaseAPIView
+):
     serializer_class = PatientFemurExamineSerializer
+    kind = 'femur'
+    examine_field = 'femur_examine'
+    image_field = 'femur_image'
+    video_field = 'femur_video'
+    measurement_fields = ('femur_length', 'femur_age')
+    success_message = _('Patient femur examined successfully.')
+    failure_message = _('Unable to examine patient femur.')
+
+    def measure(self, boxes, pixel_depth, scale):
+        return femur_length_and_age(boxes, pixel_depth, scale)
 
     def create(self, request, *args, **kwargs):
         """
-        API to examine a patient.
+        API to examine a patient. An image whose scan nearly duplicates one of the patient's earlier
+        examinations is flagged in duplicate with that examination's history id, and measured from
+        its outlines when EXAMINE_DUPLICATE_REUSE is on and the copy is only resized.
 
         ### Example Request:
             POST /api/patient/<patient_id>/femur-examine/
@@ -33,6 +355,11 @@ class PatientFemurExamineAPIView(
                 "femur_image": "path_to_image",
                 "pixel_depth": 0.114338452166,
             }
+            or, to measure the best frame of a cine loop (frame_index is then the chosen frame)
+            {
+                "femur_video": "path_to_video",
+                "pixel_depth": 0.114338452166,
+            }
         ### Example Response:
             {
                 "response_code": 201,
@@ -40,59 +367,438 @@ class PatientFemurExamineAPIView(
                 "data": {
                     "id": 3,
                     "femur_image": "/media/WhatsApp_Image_2024-04-14_at_9.12.16_PM_jEPY1qe.jpeg",
+                    "femur_image_result": "/api/patient/1/femur-examine/overlay/",
                     "pixel_depth": 0.114338452166,
                     "femur_length": 42.78794816241332,
-                    "femur_age": 23.334727500182524
+                    "femur_age": 23.334727500182524,
+                    "inference_size": 640,
+                    "frame_index": null,
+                    "duplicate": null,
+                    "instances": [
+                        {
+                            "index": 0,
+                            "femur_length": 42.78794816241332,
+                            "femur_age": 23.334727500182524,
+                            "confidence": 0.91
+                        }
+                    ]
+                }
+            }
+        """
+
+        return super().create(request, *args, **kwargs)
+
+
+class PatientHeadExamineAPIView(
+    PatientExamineBaseAPIView
+):
+    serializer_class = PatientHeadExamineSerializer
+    kind = 'head'
+    examine_field = 'head_examine'
+    image_field = 'head_image'
+    video_field = 'head_video'
+    measurement_fields = ('head_circumference', 'gestational_age')
+    success_message = _('Patient head examined successfully.')
+    failure_message = _('Unable to examine patient head.')
+
+    def measure(self, boxes, pixel_depth, scale):
+        return head_circumference_and_age(boxes, pixel_depth, scale)
+
+    def create(self, request, *args, **kwargs):
+        """
+        API to examine a patient. An image whose scan nearly duplicates one of the patient's earlier
+        examinations is flagged in duplicate with that examination's history id, and measured from
+        its outlines when EXAMINE_DUPLICATE_REUSE is on and the copy is only resized.
+
+        ### Example Request:
+            POST /api/patient/<patient_id>/head-examine/
+            {
+                "head_image": "path_to_image",
+                "pixel_depth": 0.114338452166,
+            }
+            or, to measure the best frame of a cine loop (frame_index is then the chosen frame)
+            {
+                "head_video": "path_to_video",
+                "pixel_depth": 0.114338452166,
+            }
+        ### Example Response:
+            {
+                "response_code": 201,
+                "response_message": "Patient head examined successfully.",
+                "data": {
+                    "id": 2,
+                    "head_image": "/media/WhatsApp_Image_2024-04-14_at_9.12.14_PM_J98eLey.jpeg",
+                    "head_image_result": "/api/patient/1/head-examine/overlay/",
+                    "pixel_depth": 0.0691358041432,
+                    "head_circumference": 78.47560562783542,
+                    "gestational_age": 12.838361380022754,
+                    "inference_size": 640,
+                    "frame_index": null,
+                    "duplicate": null,
+                    "instances": [
+                        {
+                            "index": 0,
+                            "head_circumference": 78.47560562783542,
+                            "gestational_age": 12.838361380022754,
+                            "confidence": 0.88
+                        }
+                    ]
+                }
+            }
+        """
+
+        return super().create(request, *args, **kwargs)
+
+
+class PatientExamineUploadsAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+    serializer_class = ExamineUploadSerializer
+
+    # Examination the upload is for, set per url
+    kind = None
+
+    def post(self, request, *args, **kwargs):
+        """
+        API to start a resumable upload of an exam image or cine loop. Chunks are then sent
+        to the upload and it is finalized into a femur or head examination.
+
+        ### Example Request:
+            POST /api/patient/<patient_id>/femur-examine/uploads/
+            {
+                "filename": "scan.jpeg",
+                "size": 4718592,
+                "checksum": "<hex sha256 of the whole file>"
+            }
+        ### Example Response:
+            {
+                "response_code": 201,
+                "response_message": "Upload started successfully.",
+                "data": {
+                    "id": "0b8a4c1e-4f0e-4c9b-9f3a-6f1d2b7c8e90",
+                    "filename": "scan.jpeg",
+                    "size": 4718592,
+                    "offset": 0,
+                    "checksum": "<hex sha256 of the whole file>",
+                    "chunk_size": 8388608
                 }
             }
         """
 
         try:
+            patient = get_object_or_404(Patient, pk=kwargs['id'])
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
+            upload = serializer.save(patient=patient, kind=self.kind)
 
-            patient_id = kwargs['id']
-            if patient_id is None:
-                return Response({
-                    "response_code": status.HTTP_400_BAD_REQUEST,
-                    "response_message": _("Patient with the provided ID does not exist."),
-                    "data": None
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            patient = get_object_or_404(Patient, pk=patient_id)
-            if patient.femur_examine is None:
-                examine = serializer.save()
-            else:
-                examine = patient.femur_examine
-                examine.femur_image = serializer.validated_data.get('femur_image')
-                examine.pixel_depth = serializer.validated_data.get('pixel_depth')
-                examine.save()
-
-            femur_length, femur_age = predict_femur_length_and_age(
-                examine.femur_image,
-                examine.pixel_depth
+            os.makedirs(settings.EXAMINE_UPLOAD_DIR, exist_ok=True)
+            open(upload.path, 'wb').close()
+
+            return Response({
+                "response_code": status.HTTP_201_CREATED,
+                "response_message": _("Upload started successfully."),
+                "data": {
+                    **self.get_serializer(upload).data,
+                    "chunk_size": settings.EXAMINE_UPLOAD_CHUNK_SIZE
+                }
+            }, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
+
+class PatientExamineUploadAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+    serializer_class = ExamineUploadSerializer
+
+    kind = None
+    block_size = 64 * 1024
+
+    def get_upload(self, kwargs):
+        return get_object_or_404(ExamineUpload, pk=kwargs['upload_id'], patient_id=kwargs['id'], kind=self.kind)
+
+    def upload_response(self, upload, message, status_code=status.HTTP_200_OK):
+        return Response({
+            "response_code": status_code,
+            "response_message": message,
+            "data": self.get_serializer(upload).data
+        }, status=status_code, headers={'Upload-Offset': str(upload.offset)})
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get how much of an upload was received, to resume it from there.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/femur-examine/uploads/<upload_id>/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Upload sent successfully.",
+                "data": {
+                    "id": "0b8a4c1e-4f0e-4c9b-9f3a-6f1d2b7c8e90",
+                    "filename": "scan.jpeg",
+                    "size": 4718592,
+                    "offset": 3145728,
+                    "checksum": "<hex sha256 of the whole file>"
+                }
+            }
+        """
+
+        try:
+            return self.upload_response(self.get_upload(kwargs), _("Upload sent successfully."))
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Upload with the provided ID does not exist.')
+
+    def put(self, request, *args, **kwargs):
+        """
+        API to send the next chunk of an upload as the raw request body, written straight to
+        disk at the offset given in the Upload-Offset header. A chunk that does not start at
+        the received offset is refused with 409 and the offset to resume from.
+
+        ### Example Request:
+            PUT /api/patient/<patient_id>/femur-examine/uploads/<upload_id>/
+            Upload-Offset: 3145728
+            Content-Type: application/octet-stream
+
+            <bytes 3145728 to 4718591 of the file>
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Upload chunk received successfully.",
+                "data": {
+                    "id": "0b8a4c1e-4f0e-4c9b-9f3a-6f1d2b7c8e90",
+                    "filename": "scan.jpeg",
+                    "size": 4718592,
+                    "offset": 4718592,
+                    "checksum": "<hex sha256 of the whole file>"
+                }
+            }
+        """
+
+        try:
+            upload = self.get_upload(kwargs)
+            offset = int(request.headers.get('Upload-Offset', -1))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if length > settings.EXAMINE_UPLOAD_CHUNK_SIZE or offset + length > upload.size:
+                raise PatientExamineException(_('Upload chunk is too large.'))
+
+            with open(upload.path, 'r+b') as file:
+                # One writer per upload, a retry racing a chunk still in flight is told to resume later
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return self.upload_response(upload, _("Upload chunk already in progress."), status.HTTP_409_CONFLICT)
+
+                upload.refresh_from_db(fields=['offset'])
+                if offset != upload.offset:
+                    return self.upload_response(upload, _("Upload offset does not match."), status.HTTP_409_CONFLICT)
+
+                # Streamed from the request in small blocks, the chunk is never held in memory
+                file.seek(offset)
+                file.truncate()
+                written = 0
+                try:
+                    while written < length:
+                        block = request.stream.read(min(self.block_size, length - written))
+                        if not block:
+                            break
+                        file.write(block)
+                        written += len(block)
+                finally:
+                    # Whatever made it to disk counts, an interrupted chunk resumes where it broke off
+                    file.flush()
+                    upload.offset = offset + written
+                    upload.save(update_fields=['offset', 'updated_at'])
+
+            return self.upload_response(upload, _("Upload chunk received successfully."))
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Upload with the provided ID does not exist.')
+
+    def delete(self, request, *args, **kwargs):
+        """
+        API to abandon an upload and remove what was received of it.
+
+        ### Example Request:
+            DELETE /api/patient/<patient_id>/femur-examine/uploads/<upload_id>/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Upload deleted successfully.",
+                "data": null
+            }
+        """
+
+        try:
+            self.get_upload(kwargs).delete()
+            return Response({
+                "response_code": status.HTTP_200_OK,
+                "response_message": _("Upload deleted successfully."),
+                "data": None
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Upload with the provided ID does not exist.')
+
+
+class ExamineUploadFinalizeMixin(object):
+    """
+    Runs the examination of the view it is mixed into on a completely received upload
+    instead of a multipart image, removing the upload once the exam is saved.
+    """
+
+    def create(self, request, *args, **kwargs):
+        try:
+            upload = get_object_or_404(
+                ExamineUpload, pk=kwargs['upload_id'], patient_id=kwargs['id'], kind=self.kind
             )
+            if upload.offset != upload.size:
+                raise PatientExamineException(_('Upload is not complete.'))
+
+            if file_sha256(upload.path) != upload.checksum:
+                # Nothing of it can be trusted, the client starts the upload over
+                upload.offset = 0
+                upload.save(update_fields=['offset', 'updated_at'])
+                open(upload.path, 'wb').close()
+                raise PatientExamineException(_('Upload checksum does not match, please upload the file again.'))
 
-            if femur_length is None or femur_age is None:
-                examine.delete()
-                raise PatientExamineException('Unable to examine patient femur.')
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Upload with the provided ID does not exist.')
+
+        self.upload = upload
+        return super().create(request, *args, **kwargs)
+
+    def get_examine_data(self, request):
+        extension = os.path.splitext(self.upload.filename)[1][1:].lower()
+        field = self.video_field if extension in settings.EXAMINE_VIDEO_EXTENSIONS else self.image_field
+        self.assembled = AssembledUpload(self.upload.path, self.upload.filename, self.upload.size)
+        return {
+            'pixel_depth': request.data.get('pixel_depth'),
+            field: self.assembled
+        }
+
+    def perform_examine(self, request, scheduler, priority, deadline, *args, **kwargs):
+        try:
+            response = super().perform_examine(request, scheduler, priority, deadline, *args, **kwargs)
+        finally:
+            if hasattr(self, 'assembled'):
+                self.assembled.close()
+        # A failed examination keeps the upload so it can be finalized again without sending it again
+        if response.status_code < 300:
+            self.upload.delete()
+        return response
 
-            examine.femur_length = femur_length
-            examine.femur_age = femur_age
-            examine.save()
 
-            patient.femur_examine = examine
-            patient.save()
+class PatientFemurUploadFinalizeAPIView(
+    ExamineUploadFinalizeMixin,
+    PatientFemurExamineAPIView
+):
+    def create(self, request, *args, **kwargs):
+        """
+        API to examine a patient's femur on a completely received upload, whose checksum is
+        verified first. The response is the one of the femur examination.
+
+        ### Example Request:
+            POST /api/patient/<patient_id>/femur-examine/uploads/<upload_id>/finalize/
+            {
+                "pixel_depth": 0.114338452166
+            }
+        """
+
+        return super().create(request, *args, **kwargs)
+
+
+class PatientHeadUploadFinalizeAPIView(
+    ExamineUploadFinalizeMixin,
+    PatientHeadExamineAPIView
+):
+    def create(self, request, *args, **kwargs):
+        """
+        API to examine a patient's head on a completely received upload, whose checksum is
+        verified first. The response is the one of the head examination.
+
+        ### Example Request:
+            POST /api/patient/<patient_id>/head-examine/uploads/<upload_id>/finalize/
+            {
+                "pixel_depth": 0.114338452166
+            }
+        """
+
+        return super().create(request, *args, **kwargs)
+
+
+class PatientExamineRemeasureBaseAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+    serializer_class = PatientExamineRemeasureSerializer
+
+    examine_field = None
+    measurement_fields = ()
+    success_message = None
+    failure_message = None
+
+    def measure(self, boxes, pixel_depth, scale):
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        try:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            pixel_depth = serializer.validated_data['pixel_depth']
+
+            patient = get_object_or_404(Patient, pk=kwargs['id'])
+            examine = getattr(patient, self.examine_field)
+            if examine is None or not examine.segmentation:
+                raise PatientExamineException(self.failure_message)
+
+            # Measurements only depend on the stored outlines and the pixel depth, the model is not involved
+            segmentation = examine.segmentation
+            measurements, ages = self.measure(
+                polygon_boxes(segmentation['instances']), pixel_depth, segmentation['scale']
+            )
+
+            measurement_field, age_field = self.measurement_fields
+            examine.pixel_depth = pixel_depth
+            setattr(examine, measurement_field, measurements[0])
+            setattr(examine, age_field, ages[0])
+            examine.save(update_fields=['pixel_depth', measurement_field, age_field])
+
+            instances = list(examine.instances.all())
+            for instance in instances:
+                setattr(instance, measurement_field, measurements[instance.index])
+                setattr(instance, age_field, ages[instance.index])
+            examine.instances.model.objects.bulk_update(instances, [measurement_field, age_field])
 
             return Response({
-                "response_code": status.HTTP_201_CREATED,
-                "response_message": _("Patient femur examined successfully."),
+                "response_code": status.HTTP_200_OK,
+                "response_message": self.success_message,
                 "data": {
                     'id': examine.id,
-                    'femur_image': f'/media/{examine.femur_image.name}',
                     'pixel_depth': examine.pixel_depth,
-                    'femur_length': examine.femur_length,
-                    'femur_age': examine.femur_age
+                    measurement_field: getattr(examine, measurement_field),
+                    age_field: getattr(examine, age_field),
+                    'instances': [
+                        {
+                            'index': instance.index,
+                            measurement_field: getattr(instance, measurement_field),
+                            age_field: getattr(instance, age_field),
+                            'confidence': instance.confidence
+                        }
+                        for instance in instances
+                    ]
                 }
             }, status=status.HTTP_200_OK)
 
@@ -101,86 +807,622 @@ class PatientFemurExamineAPIView(
             return handle_exceptions(e, 'Patient with the provided ID does not exist.')
 
 
-class PatientHeadExamineAPIView(
-    generics.CreateAPIView
+class PatientFemurRemeasureAPIView(
+    PatientExamineRemeasureBaseAPIView
 ):
-    permission_classes = (permissions.IsAuthenticated,)
-    authentication_classes = [UserTokenAuthentication]
-    serializer_class = PatientHeadExamineSerializer
+    examine_field = 'femur_examine'
+    measurement_fields = ('femur_length', 'femur_age')
+    success_message = _('Patient femur re-measured successfully.')
+    failure_message = _('Patient femur has no stored segmentation to re-measure.')
 
-    def create(self, request, *args, **kwargs):
+    def measure(self, boxes, pixel_depth, scale):
+        return femur_length_and_age(boxes, pixel_depth, scale)
+
+    def post(self, request, *args, **kwargs):
         """
-        API to examine a patient.
+        API to re-measure a patient's femur examination with a corrected pixel depth,
+        from the stored segmentation and without running the model again.
 
         ### Example Request:
-            POST /api/patient/<patient_id>/head-examine/
+            POST /api/patient/<patient_id>/femur-examine/remeasure/
             {
-                "head_image": "path_to_image",
-                "pixel_depth": 0.114338452166,
+                "pixel_depth": 0.12
             }
         ### Example Response:
             {
-                "response_code": 201,
-                "response_message": "Patient head examined successfully.",
+                "response_code": 200,
+                "response_message": "Patient femur re-measured successfully.",
+                "data": {
+                    "id": 3,
+                    "pixel_depth": 0.12,
+                    "femur_length": 44.90521452812648,
+                    "femur_age": 24.04911736372148,
+                    "instances": [
+                        {
+                            "index": 0,
+                            "femur_length": 44.90521452812648,
+                            "femur_age": 24.04911736372148,
+                            "confidence": 0.91
+                        }
+                    ]
+                }
+            }
+        """
+
+        return super().post(request, *args, **kwargs)
+
+
+class PatientHeadRemeasureAPIView(
+    PatientExamineRemeasureBaseAPIView
+):
+    examine_field = 'head_examine'
+    measurement_fields = ('head_circumference', 'gestational_age')
+    success_message = _('Patient head re-measured successfully.')
+    failure_message = _('Patient head has no stored segmentation to re-measure.')
+
+    def measure(self, boxes, pixel_depth, scale):
+        return head_circumference_and_age(boxes, pixel_depth, scale)
+
+    def post(self, request, *args, **kwargs):
+        """
+        API to re-measure a patient's head examination with a corrected pixel depth,
+        from the stored segmentation and without running the model again.
+
+        ### Example Request:
+            POST /api/patient/<patient_id>/head-examine/remeasure/
+            {
+                "pixel_depth": 0.07
+            }
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Patient head re-measured successfully.",
                 "data": {
                     "id": 2,
-                    "head_image": "/media/WhatsApp_Image_2024-04-14_at_9.12.14_PM_J98eLey.jpeg",
-                    "pixel_depth": 0.0691358041432,
-                    "head_circumference": 78.47560562783542,
-                    "gestational_age": 12.838361380022754
+                    "pixel_depth": 0.07,
+                    "head_circumference": 79.45708012535873,
+                    "gestational_age": 12.891920838210498,
+                    "instances": [
+                        {
+                            "index": 0,
+                            "head_circumference": 79.45708012535873,
+                            "gestational_age": 12.891920838210498,
+                            "confidence": 0.88
+                        }
+                    ]
                 }
             }
         """
 
+        return super().post(request, *args, **kwargs)
+
+
+class PatientExamineSimilarBaseAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+    serializer_class = PatientExamineSimilarSerializer
+
+    examine_field = None
+    image_field = None
+    measurement_fields = ()
+    success_message = None
+    failure_message = None
+
+    def get(self, request, *args, **kwargs):
         try:
-            serializer = self.get_serializer(data=request.data)
+            serializer = self.get_serializer(data=request.query_params)
             serializer.is_valid(raise_exception=True)
+            k = serializer.validated_data['k']
 
-            patient_id = kwargs['id']
-            if patient_id is None:
-                return Response({
-                    "response_code": status.HTTP_400_BAD_REQUEST,
-                    "response_message": _("Patient with the provided ID does not exist."),
-                    "data": None
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            patient = get_object_or_404(Patient, pk=patient_id)
-            if patient.head_examine is None:
-                examine = serializer.save()
-            else:
-                examine = patient.head_examine
-                examine.head_image = serializer.validated_data.get('head_image')
-                examine.pixel_depth = serializer.validated_data.get('pixel_depth')
-                examine.save()
-
-            head_circumference, gestational_age = predict_head_circumference_and_age(
-                examine.head_image,
-                examine.pixel_depth
+            patient = get_object_or_404(Patient, pk=kwargs['id'])
+            examine = getattr(patient, self.examine_field)
+            if examine is None or examine.embedding is None:
+                raise PatientExamineException(self.failure_message)
+
+            model = type(examine)
+            index = get_embedding_index(model)
+            matches = index.search([np.frombuffer(examine.embedding, dtype=np.float16)], k, exclude=[examine.pk])[0]
+
+            # Exams deleted since they were indexed are dropped from the index on the way
+            examines = model.objects.in_bulk([pk for pk, _similarity in matches])
+            index.discard([pk for pk, _similarity in matches if pk not in examines])
+            patients = dict(
+                Patient.objects.filter(**{f'{self.examine_field}__in': list(examines)})
+                .values_list(self.examine_field, 'id')
             )
 
-            if head_circumference is None or gestational_age is None:
-                examine.delete()
-                raise PatientExamineException('Unable to examine patient head.')
+            measurement_field, age_field = self.measurement_fields
+            return Response({
+                "response_code": status.HTTP_200_OK,
+                "response_message": self.success_message,
+                "data": [
+                    {
+                        'id': pk,
+                        'patient': patients.get(pk),
+                        'similarity': similarity,
+                        self.image_field: getattr(examines[pk], self.image_field).url,
+                        measurement_field: getattr(examines[pk], measurement_field),
+                        age_field: getattr(examines[pk], age_field)
+                    }
+                    for pk, similarity in matches if pk in examines
+                ]
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
 
-            examine.head_circumference = head_circumference
-            examine.gestational_age = gestational_age
-            examine.save()
+class PatientFemurSimilarAPIView(
+    PatientExamineSimilarBaseAPIView
+):
+    examine_field = 'femur_examine'
+    image_field = 'femur_image'
+    measurement_fields = ('femur_length', 'femur_age')
+    success_message = _('Similar femur examinations sent successfully.')
+    failure_message = _('Patient femur has no stored embedding to compare.')
 
-            patient.head_examine = examine
-            patient.save()
+    def get(self, request, *args, **kwargs):
+        """
+        API to get the femur examinations that look most like a patient's, by cosine similarity
+        of the embeddings the model computed while examining them.
 
-            return Response({
-                "response_code": status.HTTP_201_CREATED,
-                "response_message": _("Patient head examined successfully."),
+        ### Example Request:
+            GET /api/patient/<patient_id>/femur-examine/similar/?k=10
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Similar femur examinations sent successfully.",
+                "data": [
+                    {
+                        "id": 14,
+                        "patient": 9,
+                        "similarity": 0.9731,
+                        "femur_image": "/media/3f/a2/3fa2...c1.jpg?expires=1713225600&signature=Xk2...q8",
+                        "femur_length": 41,
+                        "femur_age": 23
+                    }
+                ]
+            }
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientHeadSimilarAPIView(
+    PatientExamineSimilarBaseAPIView
+):
+    examine_field = 'head_examine'
+    image_field = 'head_image'
+    measurement_fields = ('head_circumference', 'gestational_age')
+    success_message = _('Similar head examinations sent successfully.')
+    failure_message = _('Patient head has no stored embedding to compare.')
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get the head examinations that look most like a patient's, by cosine similarity
+        of the embeddings the model computed while examining them.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/head-examine/similar/?k=10
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Similar head examinations sent successfully.",
+                "data": [
+                    {
+                        "id": 8,
+                        "patient": 5,
+                        "similarity": 0.9412,
+                        "head_image": "/media/91/0c/910c...7e.jpg?expires=1713225600&signature=b7Q...Ls",
+                        "head_circumference": 79,
+                        "gestational_age": 12
+                    }
+                ]
+            }
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientExamineHistoryPagination(FetusCursorPagination):
+    ordering = ('-examined_at', '-id')
+
+
+class PatientExamineHistoryAPIView(
+    generics.ListAPIView,
+    PaginationMixin
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+    pagination_class = PatientExamineHistoryPagination
+    serializer_class = PatientExamineHistorySerializer
+
+    def list(self, request, *args, **kwargs):
+        """
+        API to get every examination of a patient, archived or not, newest first, a page at a
+        time. Pages are followed through the next link, optionally for one kind only, and come
+        with the growth of the patient per week since the first examination.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/examine-history/?kind=femur&page_size=20
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Patient examine history sent successfully.",
                 "data": {
-                    'id': examine.id,
-                    'head_image': f'/media/{examine.head_image.name}',
-                    'pixel_depth': examine.pixel_depth,
-                    'head_circumference': examine.head_circumference,
-                    'gestational_age': examine.gestational_age
+                    "next": "http://localhost:8000/api/patient/1/examine-history/?cursor=cD0yMDI0...&kind=femur",
+                    "previous": null,
+                    "results": [
+                        {
+                            "id": 31,
+                            "kind": "femur",
+                            "examine_id": 7,
+                            "examined_at": "2024-06-02T10:14:09.512Z",
+                            "pixel_depth": 0.114338452166,
+                            "measurement": 52.31,
+                            "age": 27.12,
+                            "velocity": 2.41
+                        }
+                    ],
+                    "growth": [
+                        {
+                            "kind": "femur",
+                            "count": 4,
+                            "first_examined_at": "2024-04-14T09:02:51.101Z",
+                            "last_examined_at": "2024-06-02T10:14:09.512Z",
+                            "last_measurement": 52.31,
+                            "last_velocity": 2.41,
+                            "growth_rate": 2.37
+                        }
+                    ]
                 }
+            }
+        """
+
+        try:
+            # Archived patients keep their id, their history and growth stay with it
+            patient_id = kwargs['id']
+            if not (
+                Patient.objects.filter(pk=patient_id).exists() or ArchivedPatient.objects.filter(pk=patient_id).exists()
+            ):
+                raise Http404()
+            filters = PatientExamineHistoryFilterSerializer(data=request.query_params)
+            filters.is_valid(raise_exception=True)
+
+            queryset = PatientExamineHistory.objects.filter(patient_id=patient_id)
+            growth = PatientExamineGrowth.objects.filter(patient_id=patient_id).order_by('kind')
+            kind = filters.validated_data.get('kind')
+            if kind is not None:
+                queryset = queryset.filter(kind=kind)
+                growth = growth.filter(kind=kind)
+
+            page = self.paginate_queryset(queryset)
+            data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+            data['growth'] = PatientExamineGrowthSerializer(growth, many=True).data
+
+            return Response({
+                "response_code": status.HTTP_200_OK,
+                "response_message": _("Patient examine history sent successfully."),
+                "data": data
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
             print(e)
             return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
+
+class PatientExamineOverlayBaseAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+
+    kind = None
+    examine_field = None
+    image_field = None
+    failure_message = None
+
+    def render_overlay(self, image, segmentation):
+        raise NotImplementedError
+
+    def render(self, examine, image_name):
+        image = cv2.imread(os.path.join(settings.MEDIA_ROOT, image_name))
+        if image is None:
+            return None
+        return self.render_overlay(image, examine.segmentation)
+
+    def overlay_path(self, examine):
+        image_name = getattr(examine, self.image_field).name
+        if not examine.segmentation:
+            # Exams from before segmentations were stored had their result rendered up front
+            path = os.path.join(settings.MEDIA_ROOT, result_image_name(image_name))
+            return path if os.path.exists(path) else None
+
+        # A new image or new outlines get a new cache entry, the stale one ages out of the cache
+        version = hashlib.sha1(f'{image_name}:{json.dumps(examine.segmentation)}'.encode()).hexdigest()[:16]
+        return cached_image(
+            os.path.join(settings.MEDIA_ROOT, settings.EXAMINE_OVERLAY_CACHE_DIR),
+            f'{self.kind}/{examine.id}_{version}.png',
+            settings.EXAMINE_OVERLAY_CACHE_SIZE,
+            lambda: self.render(examine, image_name)
+        )
+
+    def get(self, request, *args, **kwargs):
+        try:
+            patient = get_object_or_404(Patient, pk=kwargs['id'])
+            examine = getattr(patient, self.examine_field)
+            path = None if examine is None else self.overlay_path(examine)
+            if path is None:
+                raise PatientExamineException(self.failure_message)
+
+            return FileResponse(open(path, 'rb'), content_type='image/png')
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
+
+class PatientFemurOverlayAPIView(
+    PatientExamineOverlayBaseAPIView
+):
+    kind = 'femur'
+    examine_field = 'femur_examine'
+    image_field = 'femur_image'
+    failure_message = _('Patient femur has no examination to draw.')
+
+    def render_overlay(self, image, segmentation):
+        return render_femur_overlay(image, segmentation)
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get a patient's femur examination image annotated with the measured femurs, as a PNG.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/femur-examine/overlay/
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientHeadOverlayAPIView(
+    PatientExamineOverlayBaseAPIView
+):
+    kind = 'head'
+    examine_field = 'head_examine'
+    image_field = 'head_image'
+    failure_message = _('Patient head has no examination to draw.')
+
+    def render_overlay(self, image, segmentation):
+        return render_head_overlay(image, segmentation)
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get a patient's head examination image annotated with the measured heads, as a PNG.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/head-examine/overlay/
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientExamineTilesBaseAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+
+    kind = None
+    examine_field = None
+    image_field = None
+    failure_message = None
+
+    def get_tiles_version(self, image_name):
+        # Exam images are never overwritten, a new image has a new name and so new tile URLs
+        return hashlib.sha1(image_name.encode()).hexdigest()[:16]
+
+    def get_descriptor(self, patient, image_name, path):
+        width, height = get_image_dimensions(path)
+        version = self.get_tiles_version(image_name)
+        url = reverse(f'patient-{self.kind}-tile', kwargs={
+            'id': patient.id, 'version': version, 'level': 0, 'column': 0, 'row': 0
+        })
+        return Response({
+            "response_code": status.HTTP_200_OK,
+            "response_message": _("Examine image tiles sent successfully."),
+            "data": {
+                'width': width,
+                'height': height,
+                'tile_size': settings.EXAMINE_TILE_SIZE,
+                'overlap': 0,
+                'format': 'jpg',
+                'levels': get_max_level(width, height) + 1,
+                'version': version,
+                'url': url.replace('/0/0_0.jpg', '/{level}/{column}_{row}.jpg')
+            }
+        }, status=status.HTTP_200_OK)
+
+    def get_tile(self, examine, image_name, path, version, level, column, row):
+        if version != self.get_tiles_version(image_name):
+            raise PatientExamineException(self.failure_message)
+
+        width, height = get_image_dimensions(path)
+        tile_path = cached_image(
+            os.path.join(settings.MEDIA_ROOT, settings.EXAMINE_TILE_CACHE_DIR),
+            f'{self.kind}/{examine.id}/{version}/{level}/{column}_{row}.jpg',
+            settings.EXAMINE_TILE_CACHE_SIZE,
+            lambda: render_tile(path, width, height, level, column, row, settings.EXAMINE_TILE_SIZE),
+            (cv2.IMWRITE_JPEG_QUALITY, settings.EXAMINE_TILE_QUALITY)
+        )
+        if tile_path is None:
+            raise PatientExamineException(self.failure_message)
+
+        # Tile URLs are versioned, a tile never changes once served
+        response = FileResponse(open(tile_path, 'rb'), content_type='image/jpeg')
+        response['Cache-Control'] = f'private, max-age={settings.EXAMINE_TILE_MAX_AGE}, immutable'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        try:
+            patient = get_object_or_404(Patient, pk=kwargs['id'])
+            examine = getattr(patient, self.examine_field)
+            if examine is None:
+                raise PatientExamineException(self.failure_message)
+
+            image_name = getattr(examine, self.image_field).name
+            path = os.path.join(settings.MEDIA_ROOT, image_name)
+            if 'level' not in kwargs:
+                return self.get_descriptor(patient, image_name, path)
+            return self.get_tile(
+                examine, image_name, path, kwargs['version'], kwargs['level'], kwargs['column'], kwargs['row']
+            )
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Patient with the provided ID does not exist.')
+
+
+class PatientFemurTilesAPIView(
+    PatientExamineTilesBaseAPIView
+):
+    kind = 'femur'
+    examine_field = 'femur_examine'
+    image_field = 'femur_image'
+    failure_message = _('Patient femur examination image tile not found.')
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to view a patient's femur examination image as a deep zoom tile pyramid. The descriptor
+        gives the image size and the tile URL template, tiles are JPEGs that can be cached forever.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/femur-examine/tiles/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Examine image tiles sent successfully.",
+                "data": {
+                    "width": 1920,
+                    "height": 1080,
+                    "tile_size": 256,
+                    "overlap": 0,
+                    "format": "jpg",
+                    "levels": 12,
+                    "version": "5d41402abc4b2a76",
+                    "url": "/api/patient/1/femur-examine/tiles/5d41402abc4b2a76/{level}/{column}_{row}.jpg"
+                }
+            }
+        ### Example Request:
+            GET /api/patient/<patient_id>/femur-examine/tiles/5d41402abc4b2a76/11/3_2.jpg
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientHeadTilesAPIView(
+    PatientExamineTilesBaseAPIView
+):
+    kind = 'head'
+    examine_field = 'head_examine'
+    image_field = 'head_image'
+    failure_message = _('Patient head examination image tile not found.')
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to view a patient's head examination image as a deep zoom tile pyramid. The descriptor
+        gives the image size and the tile URL template, tiles are JPEGs that can be cached forever.
+
+        ### Example Request:
+            GET /api/patient/<patient_id>/head-examine/tiles/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Examine image tiles sent successfully.",
+                "data": {
+                    "width": 1920,
+                    "height": 1080,
+                    "tile_size": 256,
+                    "overlap": 0,
+                    "format": "jpg",
+                    "levels": 12,
+                    "version": "5d41402abc4b2a76",
+                    "url": "/api/patient/1/head-examine/tiles/5d41402abc4b2a76/{level}/{column}_{row}.jpg"
+                }
+            }
+        ### Example Request:
+            GET /api/patient/<patient_id>/head-examine/tiles/5d41402abc4b2a76/11/3_2.jpg
+        """
+
+        return super().get(request, *args, **kwargs)
+
+
+class PatientExamineStatsAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get the examine pipeline counters of the serving process.
+
+        ### Example Request:
+            GET /api/examine/stats/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Examine stats sent successfully.",
+                "data": {
+                    "quality": {
+                        "accepted": 120,
+                        "blurry": 4,
+                        "not_ultrasound": 1
+                    },
+                    "admission": {
+                        "femur_interactive_admitted": 96,
+                        "femur_interactive_rejected": 3,
+                        "femur_batch_admitted": 410
+                    },
+                    "queues": {
+                        "femur": {
+                            "running": 2,
+                            "waiting": 5,
+                            "max_concurrency": 2,
+                            "drain_rate": 0.8,
+                            "classes": {
+                                "interactive": {
+                                    "waiting": 1,
+                                    "max_queue": 8,
+                                    "average_wait": 0.4,
+                                    "oldest_wait": 0.2
+                                },
+                                "batch": {
+                                    "waiting": 4,
+                                    "max_queue": 64,
+                                    "average_wait": 6.1,
+                                    "oldest_wait": 7.5
+                                },
+                                "background": {
+                                    "waiting": 0,
+                                    "max_queue": 64,
+                                    "average_wait": null,
+                                    "oldest_wait": null
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        """
+
+        return Response({
+            "response_code": status.HTTP_200_OK,
+            "response_message": _("Examine stats sent successfully."),
+            "data": {
+                **stats.snapshot(),
+                "queues": {name: scheduler.state() for name, scheduler in get_inference_schedulers().items()}
+            }
+        }, status=status.HTTP_200_OK)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Patient
+from .models import Patient, ArchivedPatient, DashboardCounter
 
 
 class PatientAdmin(admin.ModelAdmin):
@@ -11,4 +11,21 @@ class PatientAdmin(admin.ModelAdmin):
     readonly_fields = ['femur_examine', 'head_examine']
 
 
+class ArchivedPatientAdmin(admin.ModelAdmin):
+    list_filter = ('is_active',)
+    list_display = ('id', 'first_name', 'last_name', 'examine_date', 'phone_number', 'is_active', 'archived_at')
+    search_fields = ('first_name', 'last_name', 'email', 'phone_number')
+    ordering = ['id']
+    readonly_fields = ['femur_examine', 'head_examine', 'femur_image', 'head_image', 'archived_at']
+
+
+class DashboardCounterAdmin(admin.ModelAdmin):
+    list_display = ('key', 'count')
+    search_fields = ('key',)
+    ordering = ['key']
+    readonly_fields = ['key', 'count']
+
+
 admin.site.register(Patient, PatientAdmin)
+admin.site.register(ArchivedPatient, ArchivedPatientAdmin)
+admin.site.register(DashboardCounter, DashboardCounterAdmin)
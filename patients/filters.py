@@ -1,7 +1,7 @@
 import django_filters
 
 
-from .models import Patient
+from .models import Patient, ArchivedPatient
 
 
 class PatientFilters(django_filters.FilterSet):
@@ -18,3 +18,8 @@ class PatientFilters(django_filters.FilterSet):
     class Meta:
         model = Patient
         fields = ['age', 'examine_date', 'trimester', 'examine_by']
+
+
+class ArchivedPatientFilters(PatientFilters):
+    class Meta(PatientFilters.Meta):
+        model = ArchivedPatient
@@ -0,0 +1,113 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from patient_examine.models import ExamineUpload, PatientFemurExamine, PatientHeadExamine
+from patient_examine.serializers import PatientFemurExamineSerializer, PatientHeadExamineSerializer
+from patients.models import Patient, ArchivedPatient
+
+
+def examine_snapshot(examine, serializer_class, image_field):
+    if examine is None:
+        return None
+
+    data = serializer_class(examine).data
+    # Served URLs are signed and expire, the snapshot keeps the storage name instead
+    data[image_field] = getattr(examine, image_field).name or None
+    data['instances'] = [
+        {
+            field.name: getattr(instance, field.name)
+            for field in instance._meta.fields if field.name not in ('id', 'examine')
+        }
+        for instance in examine.instances.all()
+    ]
+    return data
+
+
+def archived_patient(patient):
+    femur_examine, head_examine = patient.femur_examine, patient.head_examine
+    return ArchivedPatient(
+        id=patient.id,
+        first_name=patient.first_name,
+        last_name=patient.last_name,
+        date_of_birth=patient.date_of_birth,
+        examine_date=patient.examine_date,
+        trimester=patient.trimester,
+        blood_group=patient.blood_group,
+        age=patient.age,
+        examine_by_id=patient.examine_by_id,
+        email=patient.email,
+        phone_number=patient.phone_number,
+        profile_image=patient.profile_image.name or None,
+        is_active=patient.is_active,
+        femur_examine=examine_snapshot(femur_examine, PatientFemurExamineSerializer, 'femur_image'),
+        head_examine=examine_snapshot(head_examine, PatientHeadExamineSerializer, 'head_image'),
+        femur_image=femur_examine.femur_image.name if femur_examine else None,
+        head_image=head_examine.head_image.name if head_examine else None,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Move inactive patients and patients examined long ago, with their exams, to the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many patients would be archived.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--days', type=int, default=settings.PATIENT_ARCHIVE_AFTER_DAYS,
+            help='Archive patients whose examine date is at least this many days ago.'
+        )
+
+    def archive(self, candidates, batch_size):
+        """
+        Archive one batch, every row of it is moved in the same transaction. The images are
+        taken over by the archived rows, the exams are deleted without releasing them.
+        """
+        with transaction.atomic():
+            patients = list(
+                candidates.select_related('femur_examine', 'head_examine')
+                .prefetch_related('femur_examine__instances', 'head_examine__instances')
+                .select_for_update(of=('self',))
+                .order_by('id')[:batch_size]
+            )
+            if not patients:
+                return 0
+
+            ArchivedPatient.objects.bulk_create([archived_patient(patient) for patient in patients])
+
+            ids = [patient.id for patient in patients]
+            femur_ids = [patient.femur_examine_id for patient in patients if patient.femur_examine_id]
+            head_ids = [patient.head_examine_id for patient in patients if patient.head_examine_id]
+            for upload in ExamineUpload.objects.filter(patient_id__in=ids):
+                upload.delete()
+            Patient.objects.filter(pk__in=ids).delete()
+            PatientFemurExamine.objects.filter(pk__in=femur_ids).delete()
+            PatientHeadExamine.objects.filter(pk__in=head_ids).delete()
+
+        return len(patients)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localdate() - timezone.timedelta(days=options['days'])
+        candidates = Patient.objects.filter(Q(is_active=False) | Q(examine_date__lt=cutoff))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Would archive {candidates.count()} patients.'))
+            return
+
+        started = time.perf_counter()
+        archived = 0
+        while True:
+            count = self.archive(candidates, options['batch_size'])
+            if not count:
+                break
+            archived += count
+            self.stdout.write(f'Archived {archived} patients.')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} patients in {elapsed:.1f}s ({archived / max(elapsed, 1e-9):.0f} patients/s).'
+        ))
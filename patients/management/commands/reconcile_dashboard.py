@@ -0,0 +1,73 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from patient_examine.models import PatientExamineHistory
+from patients.models import Patient, DashboardCounter
+from patients.signals import appointments_key
+
+
+def dashboard_counts(today):
+    """
+    Every dashboard counter recomputed from the tables, appointments from `today` on.
+    """
+    patients = Patient.objects.filter(is_active=True)
+    counts = Counter(patients.aggregate(
+        patients=Count('id'),
+        femur_examined=Count('id', filter=Q(femur_examine__isnull=False)),
+        head_examined=Count('id', filter=Q(head_examine__isnull=False)),
+    ))
+    for trimester, count in patients.values_list('trimester').annotate(count=Count('id')).order_by():
+        counts[f'trimester:{trimester}'] = count
+    for doctor, count in patients.filter(examine_by__isnull=False).values_list('examine_by').annotate(
+        count=Count('id')
+    ).order_by():
+        counts[f'doctor:{doctor}'] = count
+    for date, count in patients.filter(examine_date__gte=today).values_list('examine_date').annotate(
+        count=Count('id')
+    ).order_by():
+        counts[appointments_key(date)] = count
+    for kind, count in PatientExamineHistory.objects.values_list('kind').annotate(count=Count('id')).order_by():
+        counts[f'examinations:{kind}'] = count
+    # Counters at zero are not kept
+    return +counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the dashboard counters from the patient and exam tables, correcting any drift '
+        'from changes made without signals, and drop the appointment counters of past days. Run daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the counters that drifted.')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        with transaction.atomic():
+            # Saves made while counting wait on these locks and then add their change to the recount
+            stored = dict(DashboardCounter.objects.select_for_update().values_list('key', 'count'))
+            counts = dashboard_counts(today)
+
+            # Counters of past days, doctors without patients and the like count nothing any more
+            stale = [key for key in stored if key not in counts]
+            drifted = {key: count for key, count in counts.items() if stored.get(key) != count}
+            for key in sorted(set(drifted) | set(stale)):
+                if key in drifted or stored[key]:
+                    self.stdout.write(f'{key}: {stored.get(key, 0)} -> {counts.get(key, 0)}')
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Would correct {len(drifted)} counters and remove {len(stale)}.'
+                ))
+                return
+
+            DashboardCounter.objects.filter(key__in=stale).delete()
+            for key, count in drifted.items():
+                DashboardCounter.objects.update_or_create(key=key, defaults={'count': count})
+
+        self.stdout.write(self.style.SUCCESS(f'Corrected {len(drifted)} counters and removed {len(stale)}.'))
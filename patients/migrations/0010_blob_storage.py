@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:49
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0009_remove_patient_examine_patient_femur_examine_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=utils.storage.blob_storage, upload_to='', verbose_name='profile_image'),
+        ),
+    ]
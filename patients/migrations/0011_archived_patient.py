@@ -0,0 +1,39 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_alter_doctor_name'),
+        ('patients', '0010_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPatient',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='id')),
+                ('first_name', models.CharField(max_length=255, verbose_name='first_name')),
+                ('last_name', models.CharField(max_length=255, verbose_name='last_name')),
+                ('date_of_birth', models.DateField(verbose_name='date_of_birth')),
+                ('examine_date', models.DateField(verbose_name='examine_date')),
+                ('trimester', models.CharField(choices=[('1', 'First'), ('2', 'Second'), ('3', 'Third')], max_length=1, verbose_name='trimester')),
+                ('blood_group', models.CharField(max_length=2, verbose_name='blood_group')),
+                ('age', models.IntegerField(verbose_name='age')),
+                ('email', models.CharField(blank=True, max_length=255, null=True, verbose_name='email')),
+                ('phone_number', models.CharField(max_length=20, verbose_name='phone_number')),
+                ('profile_image', models.ImageField(blank=True, null=True, storage=utils.storage.blob_storage, upload_to='', verbose_name='profile_image')),
+                ('is_active', models.BooleanField(default=True, verbose_name='is_active')),
+                ('femur_examine', models.JSONField(blank=True, null=True, verbose_name='femur_examine')),
+                ('head_examine', models.JSONField(blank=True, null=True, verbose_name='head_examine')),
+                ('femur_image', models.ImageField(blank=True, null=True, storage=utils.storage.blob_storage, upload_to='', verbose_name='femur_image')),
+                ('head_image', models.ImageField(blank=True, null=True, storage=utils.storage.blob_storage, upload_to='', verbose_name='head_image')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived_at')),
+                ('examine_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_patients', to='doctors.doctor')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_archived_patient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='key')),
+                ('count', models.BigIntegerField(default=0, verbose_name='count')),
+            ],
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from doctors.models import Doctor
 from patient_examine.models import PatientFemurExamine, PatientHeadExamine
+from utils.storage import blob_storage
 
 
 class Patient(models.Model):
@@ -73,6 +74,7 @@ class Patient(models.Model):
     )
     profile_image = models.ImageField(
         'profile_image',
+        storage=blob_storage,
         null=True,
         blank=True
     )
@@ -87,3 +89,172 @@ class Patient(models.Model):
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
+
+
+class ArchivedPatient(models.Model):
+    """
+    A patient moved out of the Patient table by archive_patients, with a snapshot of its
+    exams. The images stay referenced from here so their blobs are kept.
+    """
+    # Same id as the patient had, history rows still point at it
+    id = models.IntegerField(
+        'id',
+        primary_key=True
+    )
+    first_name = models.CharField(
+        'first_name',
+        max_length=255,
+    )
+    last_name = models.CharField(
+        'last_name',
+        max_length=255,
+    )
+    date_of_birth = models.DateField(
+        'date_of_birth'
+    )
+    examine_date = models.DateField(
+        'examine_date'
+    )
+    trimester = models.CharField(
+        'trimester',
+        max_length=1,
+        choices=Patient.Trimester.choices
+    )
+    blood_group = models.CharField(
+        'blood_group',
+        max_length=2
+    )
+    age = models.IntegerField(
+        'age'
+    )
+    examine_by = models.ForeignKey(
+        to=Doctor,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_patients'
+    )
+    email = models.CharField(
+        "email",
+        max_length=255,
+        null=True,
+        blank=True
+    )
+    phone_number = models.CharField(
+        "phone_number",
+        max_length=20
+    )
+    profile_image = models.ImageField(
+        'profile_image',
+        storage=blob_storage,
+        null=True,
+        blank=True
+    )
+    is_active = models.BooleanField(
+        'is_active',
+        default=True
+    )
+    # The exams as they were served when the patient was archived, with their measured instances
+    femur_examine = models.JSONField(
+        'femur_examine',
+        null=True,
+        blank=True
+    )
+    head_examine = models.JSONField(
+        'head_examine',
+        null=True,
+        blank=True
+    )
+    femur_image = models.ImageField(
+        'femur_image',
+        storage=blob_storage,
+        null=True,
+        blank=True
+    )
+    head_image = models.ImageField(
+        'head_image',
+        storage=blob_storage,
+        null=True,
+        blank=True
+    )
+    archived_at = models.DateTimeField(
+        'archived_at',
+        auto_now_add=True
+    )
+
+    @property
+    def name(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'{self.first_name} {self.last_name}'
+
+
+class DashboardCounter(models.Model):
+    """
+    One count shown on the dashboard, kept up to date by the signals in patients.signals
+    as patients and exams are saved, and recomputed by reconcile_dashboard.
+    """
+    key = models.CharField(
+        'key',
+        max_length=64,
+        primary_key=True
+    )
+    count = models.BigIntegerField(
+        'count',
+        default=0
+    )
+
+    def __str__(self):
+        return f'{self.key}: {self.count}'
+
+    @classmethod
+    def add(cls, delta):
+        """
+        Add {key: amount} to the counters in one update, creating the missing ones.
+        """
+        delta = {key: amount for key, amount in delta.items() if amount}
+        if not delta:
+            return
+
+        def increment(keys):
+            return cls.objects.filter(key__in=keys).update(count=models.F('count') + models.Case(
+                *[models.When(key=key, then=models.Value(delta[key])) for key in keys],
+                default=models.Value(0), output_field=models.BigIntegerField()
+            ))
+
+        keys = sorted(delta)
+        if increment(keys) == len(keys):
+            return
+        missing = sorted(set(keys) - set(cls.objects.filter(key__in=keys).values_list('key', flat=True)))
+        # Created at zero and then incremented, so two saves creating the same counter both count
+        cls.objects.bulk_create([cls(key=key) for key in missing], ignore_conflicts=True)
+        increment(missing)
+
+    @classmethod
+    def summary(cls, date):
+        """
+        The dashboard on `date`, read from the counters in a single query.
+        """
+        counters = dict(cls.objects.filter(
+            models.Q(key__in=[
+                'patients', 'femur_examined', 'head_examined', 'examinations:femur', 'examinations:head',
+                f'appointments:{date.isoformat()}', *[f'trimester:{value}' for value in Patient.Trimester.values]
+            ]) | models.Q(key__startswith='doctor:')
+        ).values_list('key', 'count'))
+
+        return {
+            'date': date,
+            'appointments': counters.get(f'appointments:{date.isoformat()}', 0),
+            'patients': counters.get('patients', 0),
+            'trimesters': {value: counters.get(f'trimester:{value}', 0) for value in Patient.Trimester.values},
+            'doctors': {
+                key.split(':', 1)[1]: count for key, count in sorted(counters.items())
+                if key.startswith('doctor:') and count
+            },
+            'femur_examined': counters.get('femur_examined', 0),
+            'head_examined': counters.get('head_examined', 0),
+            'examinations': {
+                'femur': counters.get('examinations:femur', 0),
+                'head': counters.get('examinations:head', 0),
+            },
+        }
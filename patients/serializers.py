@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Patient
+from .models import Patient, ArchivedPatient
 
 from doctors.serializers import DoctorSerializer
 from patient_examine.serializers import PatientFemurExamineSerializer, PatientHeadExamineSerializer
@@ -27,3 +27,25 @@ class PatientSerializer(serializers.ModelSerializer):
             else PatientHeadExamineSerializer(instance.head_examine).data
 
         return response
+
+
+class ArchivedPatientSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedPatient
+        # The images are served inside the snapshots of their exams
+        exclude = ('femur_image', 'head_image')
+
+    def to_representation(self, instance):
+        response = super().to_representation(instance)
+
+        # Image URLs expire, they are signed again from the archived images every time
+        for examine_field, image_field in (('femur_examine', 'femur_image'), ('head_examine', 'head_image')):
+            image = getattr(instance, image_field)
+            if response[examine_field] is not None:
+                response[examine_field] = {**response[examine_field], image_field: image.url if image else None}
+
+        response['examine_by'] = None \
+            if instance.examine_by is None \
+            else DoctorSerializer(instance.examine_by).data
+
+        return response
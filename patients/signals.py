@@ -0,0 +1,90 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from patient_examine.models import PatientExamineHistory
+
+from .models import Patient, DashboardCounter
+
+# The fields the dashboard counts patients by
+DASHBOARD_FIELDS = ('is_active', 'trimester', 'examine_by_id', 'examine_date', 'femur_examine_id', 'head_examine_id')
+
+
+def appointments_key(date):
+    # Dates assigned as strings are only parsed by the database
+    return f'appointments:{date if isinstance(date, str) else date.isoformat()}'
+
+
+def dashboard_keys(state):
+    """
+    The counters one patient in `state` adds one to, only active patients are counted.
+    """
+    if state is None or not state['is_active']:
+        return []
+
+    keys = ['patients', f'trimester:{state["trimester"]}', appointments_key(state['examine_date'])]
+    if state['examine_by_id'] is not None:
+        keys.append(f'doctor:{state["examine_by_id"]}')
+    if state['femur_examine_id'] is not None:
+        keys.append('femur_examined')
+    if state['head_examine_id'] is not None:
+        keys.append('head_examined')
+    return keys
+
+
+def dashboard_state(patient):
+    # Deferred fields are not read here, that would cost a query for every patient loaded
+    if any(field not in patient.__dict__ for field in DASHBOARD_FIELDS):
+        return None
+    return {field: patient.__dict__[field] for field in DASHBOARD_FIELDS}
+
+
+def stored_dashboard_state(patient):
+    return Patient.objects.filter(pk=patient.pk).values(*DASHBOARD_FIELDS).first()
+
+
+def saves_dashboard_fields(update_fields):
+    return update_fields is None or bool(
+        {Patient._meta.get_field(name).attname for name in update_fields} & set(DASHBOARD_FIELDS)
+    )
+
+
+@receiver(post_init, sender=Patient)
+def remember_dashboard_state(sender, instance, **kwargs):
+    instance._dashboard_state = dashboard_state(instance)
+
+
+@receiver(pre_save, sender=Patient)
+def load_dashboard_state(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not saves_dashboard_fields(update_fields):
+        return
+    if instance._state.adding:
+        # A new patient replaces nothing, unless it was built with the id of an existing row
+        instance._dashboard_state = stored_dashboard_state(instance) if instance.pk is not None else None
+    elif instance._dashboard_state is None:
+        # Loaded with some of the fields deferred, what the row holds now is what is replaced
+        instance._dashboard_state = stored_dashboard_state(instance)
+
+
+@receiver(post_save, sender=Patient)
+def update_dashboard(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not saves_dashboard_fields(update_fields):
+        return
+
+    state = dashboard_state(instance) or stored_dashboard_state(instance)
+    delta = Counter(dashboard_keys(state))
+    delta.subtract(dashboard_keys(instance._dashboard_state))
+    DashboardCounter.add(delta)
+    instance._dashboard_state = state
+
+
+@receiver(post_delete, sender=Patient)
+def remove_from_dashboard(sender, instance, **kwargs):
+    DashboardCounter.add({key: -1 for key in dashboard_keys(instance._dashboard_state)})
+
+
+@receiver(post_save, sender=PatientExamineHistory)
+def count_examination(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        DashboardCounter.add({f'examinations:{instance.kind}': 1})
@@ -1,3 +1,193 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from blobs.models import MediaBlob
+from doctors.models import Doctor
+from patient_examine.models import PatientExamineHistory, PatientFemurExamine
+from users.models import User
+from utils.storage import blob_storage, check_media_signature, is_blob_name
+
+from .management.commands.reconcile_dashboard import dashboard_counts
+from .models import Patient, ArchivedPatient, DashboardCounter
+from .serializers import ArchivedPatientSerializer
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.doctor = Doctor.objects.create(name='Doctor 1', gender='m', qualification='MBBS', specialization='Spec-1')
+
+    def create_patient(self, phone_number, **fields):
+        return Patient.objects.create(**{
+            'first_name': 'first', 'last_name': 'last', 'date_of_birth': datetime.date(1995, 1, 1),
+            'examine_date': self.today, 'trimester': '2', 'blood_group': 'O+', 'age': 29,
+            'phone_number': phone_number, 'examine_by': self.doctor, **fields
+        })
+
+    def assertCountersReconciled(self):
+        # Appointments of past days are left to reconcile_dashboard
+        past = f'appointments:{self.today.isoformat()}'
+        counters = {
+            key: count for key, count in DashboardCounter.objects.values_list('key', 'count')
+            if count and not (key.startswith('appointments:') and key < past)
+        }
+        self.assertEqual(counters, dict(dashboard_counts(self.today)))
+
+    def test_counters_follow_patient_saves(self):
+        first = self.create_patient('1')
+        second = self.create_patient('2', trimester='3', examine_by=None)
+        self.create_patient('3', examine_date=self.today + datetime.timedelta(days=1))
+        self.assertCountersReconciled()
+
+        first.trimester = '1'
+        first.examine_date = self.today - datetime.timedelta(days=1)
+        first.save()
+        second.is_active = False
+        second.save()
+        Patient.objects.only('id').get(pk=first.pk).save(update_fields=['examine_by'])
+        self.assertCountersReconciled()
+
+        Patient.objects.filter(pk=first.pk).delete()
+        self.assertCountersReconciled()
+
+    def test_reconcile_corrects_drift(self):
+        patient = self.create_patient('1')
+        # Updates through the queryset send no signals
+        Patient.objects.filter(pk=patient.pk).update(trimester='3')
+        DashboardCounter.objects.create(key='appointments:2020-01-01', count=4)
+
+        call_command('reconcile_dashboard', stdout=io.StringIO())
+        self.assertCountersReconciled()
+        self.assertFalse(DashboardCounter.objects.filter(key='appointments:2020-01-01').exists())
+
+    def test_dashboard(self):
+        self.create_patient('1')
+        self.create_patient('2', trimester='1', examine_date=self.today + datetime.timedelta(days=3))
+        user = User.objects.create(email='doctor@example.com', username='doctor', phone_number='1', is_logged_in=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+
+        # Token with its user, then the counters
+        with self.assertNumQueries(2):
+            response = client.get('/api/patient/dashboard/')
+
+        data = response.data['data']
+        self.assertEqual(data['appointments'], 1)
+        self.assertEqual(data['patients'], 2)
+        self.assertEqual(data['trimesters'], {'1': 1, '2': 1, '3': 0})
+        self.assertEqual(data['doctors'], {str(self.doctor.id): 2})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PATIENT_ARCHIVE_AFTER_DAYS=365)
+class ArchivePatientsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.recent = self.create_patient('1')
+        self.inactive = self.create_patient('2', is_active=False)
+        self.old = self.create_patient('3', examine_date=self.today - datetime.timedelta(days=400))
+
+        examine = PatientFemurExamine.objects.create(
+            femur_image=blob_storage().save('scan.png', ContentFile(b'scan')), pixel_depth=0.1,
+            femur_length=42.0, femur_age=23.0
+        )
+        examine.instances.create(index=0, femur_length=42.0, femur_age=23.0, confidence=0.9)
+        self.old.femur_examine = examine
+        self.old.save(update_fields=['femur_examine'])
+        PatientExamineHistory.record(self.old, 'femur', examine, 42.0, 23.0)
+        self.image = examine.femur_image.name
+
+    def create_patient(self, phone_number, **fields):
+        return Patient.objects.create(**{
+            'first_name': 'first', 'last_name': 'last', 'date_of_birth': datetime.date(1995, 1, 1),
+            'examine_date': self.today, 'trimester': '2', 'blood_group': 'O+', 'age': 29,
+            'phone_number': phone_number, **fields
+        })
+
+    def test_archive_selection(self):
+        call_command('archive_patients', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(ArchivedPatient.objects.count(), 0)
+
+        call_command('archive_patients', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(list(Patient.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertEqual(
+            sorted(ArchivedPatient.objects.values_list('id', flat=True)), [self.inactive.id, self.old.id]
+        )
+
+    def test_archive_snapshot(self):
+        call_command('archive_patients', stdout=io.StringIO())
+
+        archived = ArchivedPatient.objects.get(pk=self.old.id)
+        self.assertEqual((archived.phone_number, archived.examine_date), ('3', self.old.examine_date))
+        self.assertEqual(archived.femur_examine['femur_length'], 42.0)
+        self.assertEqual(archived.femur_examine['instances'], [
+            {'index': 0, 'femur_length': 42.0, 'femur_age': 23.0, 'confidence': 0.9}
+        ])
+        self.assertIsNone(archived.head_examine)
+        self.assertFalse(PatientFemurExamine.objects.exists())
+
+        # The snapshot keeps the storage name, the served URL is signed as it is read
+        self.assertEqual(archived.femur_examine['femur_image'], self.image)
+        url = ArchivedPatientSerializer(archived).data['femur_examine']['femur_image']
+        url = urlsplit(url)
+        self.assertEqual(url.path, f'/media/{self.image}')
+        query = dict(parse_qsl(url.query))
+        self.assertTrue(check_media_signature(self.image, query['expires'], query['signature']))
+
+        # The archived row took the exam's reference to the image over
+        self.assertEqual(archived.femur_image.name, self.image)
+        self.assertEqual(MediaBlob.objects.get(name=self.image).references, 1)
+        self.assertTrue(os.path.exists(archived.femur_image.path))
+
+    def test_sweep_keeps_archived_images(self):
+        call_command('archive_patients', stdout=io.StringIO())
+        orphan = os.path.join(MEDIA_ROOT, 'orphan.png')
+        with open(orphan, 'wb') as file:
+            file.write(b'orphan')
+
+        call_command('sweep_media', '--min-age', '0', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(blob_storage().path(self.image)))
+        self.assertTrue(MediaBlob.objects.filter(name=self.image).exists())
+
+    def test_migrate_archived_images(self):
+        call_command('archive_patients', stdout=io.StringIO())
+        legacy = os.path.join(MEDIA_ROOT, 'legacy.png')
+        with open(legacy, 'wb') as file:
+            file.write(b'legacy')
+        ArchivedPatient.objects.filter(pk=self.old.id).update(femur_image='legacy.png')
+
+        call_command('migrate_media_storage', stdout=io.StringIO())
+        archived = ArchivedPatient.objects.get(pk=self.old.id)
+        self.assertTrue(is_blob_name(archived.femur_image.name))
+        with archived.femur_image.open('rb') as file:
+            self.assertEqual(file.read(), b'legacy')
+        self.assertFalse(os.path.exists(legacy))
+
+    def test_archived_history(self):
+        call_command('archive_patients', stdout=io.StringIO())
+        user = User.objects.create(email='doctor@example.com', username='doctor', phone_number='1', is_logged_in=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+
+        response = client.get(f'/api/patient/{self.old.id}/examine-history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['measurement'] for row in response.data['data']['results']], [42.0])
+        self.assertEqual(response.data['data']['growth'][0]['count'], 1)
+        self.assertEqual(client.get('/api/patient/0/examine-history/').status_code, 404)
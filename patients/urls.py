@@ -8,7 +8,8 @@ router.register(r'patients', PatientViewSet, basename='patients')
 
 urlpatterns = [
     path('patient/appointments/', PatientAppointmentsAPIView.as_view(), name='patient-appointments'),
-    path('patient/records/', PatientRecordsAPIView.as_view(), name='patient-records')
+    path('patient/records/', PatientRecordsAPIView.as_view(), name='patient-records'),
+    path('patient/dashboard/', PatientDashboardAPIView.as_view(), name='patient-dashboard'),
 ]
 
 urlpatterns = urlpatterns + router.urls
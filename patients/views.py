@@ -1,5 +1,6 @@
 import datetime
 
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from django_filters.rest_framework import DjangoFilterBackend
@@ -16,9 +17,9 @@ from utils.exceptions import (
 from users.auth import UserTokenAuthentication
 from doctors.models import Doctor
 
-from .models import Patient
-from .serializers import PatientSerializer
-from .filters import PatientFilters
+from .models import Patient, ArchivedPatient, DashboardCounter
+from .serializers import PatientSerializer, ArchivedPatientSerializer
+from .filters import PatientFilters, ArchivedPatientFilters
 
 
 class PatientBaseAPIView(
@@ -123,6 +124,87 @@ class PatientRecordsAPIView(
         is_active=True, examine_date__lt=datetime.date.today()
     ).order_by('id')
 
+    @property
+    def archived(self):
+        # Archived patients are only read when asked for with ?archived=true
+        return self.request.query_params.get('archived') == 'true'
+
+    @property
+    def filterset_class(self):
+        return ArchivedPatientFilters if self.archived else PatientFilters
+
+    def get_queryset(self):
+        if self.archived:
+            return ArchivedPatient.objects.filter(is_active=True).select_related('examine_by').order_by('id')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        return ArchivedPatientSerializer if self.archived else PatientSerializer
+
+    def list(self, request, *args, **kwargs):
+        """
+        API to list the records of past patients, or with ?archived=true those of patients
+        moved to the archive, with their exams as they were when archived.
+
+        ### Example Request:
+            GET /api/patient/records/?archived=true
+        ### Example Response:
+        {
+            "response_code": 200,
+            "data": {
+                "total_pages": 1,
+                "count": 1,
+                "next": null,
+                "previous": null,
+                "results": [
+                    {
+                        "id": 1,
+                        "first_name": "sfadghd",
+                        "last_name": "fudge",
+                        "date_of_birth": "2024-04-14",
+                        "examine_date": "2022-04-14",
+                        "trimester": "1",
+                        "blood_group": "O+",
+                        "age": 29,
+                        "email": null,
+                        "phone_number": "324567890",
+                        "profile_image": null,
+                        "is_active": true,
+                        "femur_examine": {
+                            "id": 7,
+                            "femur_image": "/media/3f/a2/3fa2...c1.jpeg?expires=1713225600&signature=Xk2...q8",
+                            "pixel_depth": 0.114338452166,
+                            "femur_length": 42,
+                            "femur_age": 23,
+                            "inference_size": 640,
+                            "frame_index": null,
+                            "instances": [
+                                {
+                                    "index": 0,
+                                    "femur_length": 42.78794816241332,
+                                    "femur_age": 23.334727500182524,
+                                    "confidence": 0.91
+                                }
+                            ]
+                        },
+                        "head_examine": null,
+                        "archived_at": "2026-01-05T02:00:11.020Z",
+                        "examine_by": {
+                            "id": 1,
+                            "name": "deaksof;lj",
+                            "gender": "m",
+                            "qualification": "dsf",
+                            "specialization": "sdfgh"
+                        }
+                    }
+                ]
+            },
+            "response_message": "Patient details sent successfully."
+        }
+        """
+
+        return super().list(request, *args, **kwargs)
+
 
 class PatientViewSet(
     viewsets.GenericViewSet,
@@ -376,3 +458,57 @@ class PatientViewSet(
                 }, status=status.HTTP_200_OK)
         except Exception as e:
             return handle_exceptions(e, 'Patient does not exist.')
+
+
+class PatientDashboardAPIView(
+    generics.GenericAPIView
+):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = [UserTokenAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        """
+        API to get the dashboard counts: today's appointments, active patients in total, per
+        trimester and per doctor id, patients with a femur or head exam and the examinations
+        made of each kind. The counts are kept up to date as patients are saved, so they are
+        read in constant time however many patients there are.
+
+        ### Example Request:
+            GET /api/patient/dashboard/
+        ### Example Response:
+            {
+                "response_code": 200,
+                "response_message": "Dashboard sent successfully.",
+                "data": {
+                    "date": "2024-06-06",
+                    "appointments": 12,
+                    "patients": 340,
+                    "trimesters": {
+                        "1": 96,
+                        "2": 141,
+                        "3": 103
+                    },
+                    "doctors": {
+                        "1": 201,
+                        "2": 139
+                    },
+                    "femur_examined": 187,
+                    "head_examined": 164,
+                    "examinations": {
+                        "femur": 412,
+                        "head": 355
+                    }
+                }
+            }
+        """
+
+        try:
+            return Response({
+                "response_code": status.HTTP_200_OK,
+                "response_message": _("Dashboard sent successfully."),
+                "data": DashboardCounter.summary(timezone.localdate())
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            print(e)
+            return handle_exceptions(e, 'Unable to get the dashboard.')
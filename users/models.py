@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from utils.storage import blob_storage
+
 
 class User(AbstractUser):
     USERNAME_FIELD = 'email'
@@ -32,6 +34,7 @@ class User(AbstractUser):
     )
     profile_image = models.ImageField(
         'profile_image',
+        storage=blob_storage,
         null=True,
         blank=True
     )
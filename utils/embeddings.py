@@ -0,0 +1,157 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+# Rows are scored this many at a time, bounding the float32 copy made of the float16 matrix
+SEARCH_CHUNK = 65536
+# Exams committed while a refresh ran may carry a slightly earlier embedded_at, they are read again
+REFRESH_OVERLAP = timezone.timedelta(seconds=60)
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 256
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def top_k(ids, scores, k):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    return ids[order], scores[order]
+
+
+class EmbeddingIndex(object):
+    """
+    In memory cosine similarity index over the unit length float16 embeddings of one
+    exam table. Rows embedded since the last search are read in before every search,
+    an exam examined again replaces its row. With EXAMINE_EMBEDDING_IVF_LISTS set, rows
+    are partitioned by their nearest k-means centroid and a search only scores the rows
+    of the EXAMINE_EMBEDDING_IVF_PROBES partitions closest to the query.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.lock = threading.Lock()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.count = 0
+        self.positions = {}
+        self.refreshed_at = None
+        self.centroids = None
+        self.trained_count = 0
+
+    def refresh(self):
+        queryset = self.queryset.filter(embedding__isnull=False)
+        if self.refreshed_at is not None:
+            queryset = queryset.filter(embedded_at__gte=self.refreshed_at - REFRESH_OVERLAP)
+        started = timezone.now()
+        for pk, embedding in queryset.values_list('pk', 'embedding').iterator(chunk_size=SEARCH_CHUNK):
+            self.put(pk, np.frombuffer(embedding, dtype=np.float16))
+        self.refreshed_at = started
+
+        lists = settings.EXAMINE_EMBEDDING_IVF_LISTS
+        # Partitions are retrained whenever the index doubled since they were last trained
+        if lists and self.count >= lists * KMEANS_SAMPLES_PER_LIST // 4 and self.count >= 2 * self.trained_count:
+            self.train(lists)
+
+    def put(self, pk, vector):
+        if self.vectors is None or vector.shape[0] != self.vectors.shape[1]:
+            if self.vectors is not None and self.count:
+                # A model with another embedding size, its vectors do not compare with the old ones
+                return
+            self.vectors = np.empty((0, vector.shape[0]), dtype=np.float16)
+            self.ids = np.empty(0, dtype=np.int64)
+            self.assignments = np.empty(0, dtype=np.int32)
+
+        position = self.positions.get(pk)
+        if position is None:
+            if self.count == len(self.ids):
+                capacity = max(1024, 2 * len(self.ids))
+                self.ids = np.resize(self.ids, capacity)
+                self.assignments = np.resize(self.assignments, capacity)
+                vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float16)
+                vectors[:self.count] = self.vectors[:self.count]
+                self.vectors = vectors
+            position = self.positions[pk] = self.count
+            self.count += 1
+
+        self.ids[position] = pk
+        self.vectors[position] = vector
+        if self.centroids is not None:
+            self.assignments[position] = np.argmax(self.centroids @ vector.astype(np.float32))
+
+    def discard(self, pks):
+        for pk in pks:
+            position = self.positions.pop(pk, None)
+            if position is not None:
+                self.ids[position] = -1
+                self.vectors[position] = 0
+
+    def train(self, lists):
+        # Spherical k-means on a sample, the centroids stay unit length like the embeddings
+        generator = np.random.default_rng(0)
+        samples = min(self.count, lists * KMEANS_SAMPLES_PER_LIST)
+        sample = self.vectors[generator.choice(self.count, samples, replace=False)].astype(np.float32)
+        centroids = sample[generator.choice(samples, lists, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for index in range(lists):
+                members = sample[nearest == index]
+                if len(members):
+                    centroids[index] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        for start in range(0, self.count, SEARCH_CHUNK):
+            chunk = self.vectors[start:min(start + SEARCH_CHUNK, self.count)].astype(np.float32)
+            self.assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.trained_count = self.count
+
+    def search(self, vectors, k, exclude=()):
+        """
+        [(pk, cosine similarity)] of the `k` rows most similar to each of the (queries, dimensions)
+        `vectors`, most similar first. Queries are scored together, every chunk of the matrix is
+        converted from float16 once for all of them.
+        """
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        with self.lock:
+            self.refresh()
+            if not self.count or queries.shape[1] != self.vectors.shape[1]:
+                return [[] for _ in queries]
+
+            rows = None
+            if self.centroids is not None:
+                # Rows of the partitions closest to any of the queries
+                probes = min(settings.EXAMINE_EMBEDDING_IVF_PROBES, len(self.centroids))
+                probed = np.argpartition(-(queries @ self.centroids.T), probes - 1, axis=1)[:, :probes]
+                rows = np.flatnonzero(np.isin(self.assignments[:self.count], probed))
+
+            excluded = np.asarray([-1, *exclude], dtype=np.int64)
+            best = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+            total = self.count if rows is None else len(rows)
+            buffer = np.empty((min(SEARCH_CHUNK, total), queries.shape[1]), dtype=np.float32)
+            for start in range(0, total, SEARCH_CHUNK):
+                chunk = slice(start, min(start + SEARCH_CHUNK, total)) if rows is None else rows[start:start + SEARCH_CHUNK]
+                ids = self.ids[chunk]
+                matrix = buffer[:len(ids)]
+                np.copyto(matrix, self.vectors[chunk])
+                scores = matrix @ queries.T
+                keep = ~np.isin(ids, excluded)
+                ids, scores = ids[keep], scores[keep]
+                for query, (best_ids, best_scores) in enumerate(best):
+                    best[query] = top_k(
+                        np.concatenate([best_ids, ids]), np.concatenate([best_scores, scores[:, query]]), k
+                    )
+
+        return [list(zip(best_ids.tolist(), best_scores.tolist())) for best_ids, best_scores in best]
+
+
+def get_embedding_index(model):
+    with _indexes_lock:
+        if model not in _indexes:
+            _indexes[model] = EmbeddingIndex(model.objects.all())
+        return _indexes[model]
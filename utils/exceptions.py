@@ -25,6 +25,30 @@ class PatientExamineException(exceptions.APIException):
     default_code = 'invalid_patient_examine'
 
 
+class ServiceBusyException(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = {
+        'response_code': status.HTTP_503_SERVICE_UNAVAILABLE,
+        'response_message': _('Service is busy. Please try again later.'),
+        'data': None
+    }
+    default_code = 'service_busy'
+
+    def __init__(self, retry_after, detail=None):
+        self.retry_after = retry_after
+        super().__init__(detail)
+
+
+class DeadlineExceededException(exceptions.APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = {
+        'response_code': status.HTTP_504_GATEWAY_TIMEOUT,
+        'response_message': _('Request deadline exceeded.'),
+        'data': None
+    }
+    default_code = 'deadline_exceeded'
+
+
 def handle_exceptions(e, message):
     if isinstance(e, Http404):
         return Response({
@@ -37,6 +61,17 @@ def handle_exceptions(e, message):
             e.default_detail,
             status=e.status_code
         )
+    if isinstance(e, ServiceBusyException):
+        return Response(
+            e.default_detail,
+            status=e.status_code,
+            headers={'Retry-After': str(e.retry_after)}
+        )
+    if isinstance(e, DeadlineExceededException):
+        return Response(
+            e.default_detail,
+            status=e.status_code
+        )
     if isinstance(e, PatientExamineException):
         return Response({
             "response_code": e.status_code,
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+
+import cv2
+
+# Eviction brings a full cache back down to this fraction of its limit
+LOW_WATERMARK = 0.9
+
+# Bytes believed to be in each cache directory, scanned once per process and kept up to date on writes
+_sizes = {}
+_sizes_lock = threading.Lock()
+
+
+def scan_cache(directory):
+    """
+    (modification time, size, path) of every file under `directory`, nested directories included.
+    """
+    entries = []
+    directories = [directory]
+    while directories:
+        try:
+            iterator = os.scandir(directories.pop())
+        except FileNotFoundError:
+            continue
+        with iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and not entry.name.endswith('.tmp'):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def evict_cache(directory, max_bytes):
+    """
+    Remove the least recently used files under `directory` until it is back under
+    its low watermark, and return the bytes left.
+    """
+    entries = sorted(scan_cache(directory))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes * LOW_WATERMARK:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def _account(directory, max_bytes, added):
+    with _sizes_lock:
+        if directory not in _sizes:
+            _sizes[directory] = sum(size for _, size, _ in scan_cache(directory))
+        _sizes[directory] += added
+        if _sizes[directory] > max_bytes:
+            _sizes[directory] = evict_cache(directory, max_bytes)
+
+
+def cached_image(directory, name, max_bytes, render, params=()):
+    """
+    Path of the image `name` cached under `directory`, rendered by `render()` and
+    encoded by extension on first use. None when there is nothing to render.
+    """
+    path = os.path.join(directory, name)
+    try:
+        # Hits are recorded in the modification time, access times are often not maintained
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    image = render()
+    if image is None:
+        return None
+
+    ok, buffer = cv2.imencode(os.path.splitext(name)[1], image, list(params))
+    if not ok:
+        return None
+
+    # Concurrent renders of the same image race harmlessly, readers only ever see complete files
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(buffer.tobytes())
+    os.replace(temporary, path)
+
+    _account(directory, max_bytes, buffer.nbytes)
+    return path
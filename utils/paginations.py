@@ -1,6 +1,6 @@
 from collections import OrderedDict
 
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
 
 
@@ -17,3 +17,21 @@ class FetusPageNumberPagination(PageNumberPagination):
                 ('results', data)
             ])
         )
+
+
+class FetusCursorPagination(CursorPagination):
+    """
+    Keyset pagination for tables that only grow, pages stay stable while rows are appended
+    and every page is an index range scan however deep it is.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict([
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data)
+            ])
+        )
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+# The hash keeps the signs of the lowest HASH_SIZE x HASH_SIZE frequencies of a DCT_SIZE
+# square thumbnail, 256 bits
+HASH_SIZE = 16
+DCT_SIZE = 64
+HASH_BYTES = HASH_SIZE * HASH_SIZE // 8
+# Multi-index hashing: the hash is split into BANDS bands of BAND_BITS bits, each indexed on
+# its own. Two hashes within BANDS - 1 bits of each other have some band in common, so a
+# lookup reads the rows sharing any band with the hash
+BAND_BITS = 8
+BANDS = HASH_SIZE * HASH_SIZE // BAND_BITS
+MAX_DISTANCE = BANDS - 1
+
+
+def phash(image, sector=None):
+    """
+    256 bit DCT hash of the scan `sector` (x0, y0, x1, y1) of `image`, or of all of it:
+    whether each of the lowest frequencies lies above their median. Unchanged by resizing
+    and re-encoding, while the overlays around the sector, which every scan of a machine
+    shares, are left out.
+    """
+    if sector is not None:
+        x0, y0, x1, y1 = sector
+        image = image[y0:y1, x0:x1]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumbnail = cv2.resize(gray, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    frequencies = cv2.dct(thumbnail)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term is the mean brightness, far above the rest, it is left out of the median
+    bits = frequencies > np.median(frequencies[1:])
+    return np.packbits(bits).tobytes()
+
+
+def hash_distance(value, other):
+    return int(np.unpackbits(np.frombuffer(value, np.uint8) ^ np.frombuffer(other, np.uint8)).sum())
+
+
+def band_keys(value):
+    # The band's position is part of its key, one indexed column holds them all
+    return [band << BAND_BITS | band_value for band, band_value in enumerate(value)]
+
+
+def find_similar(bands, value, max_distance, field='image_hash'):
+    """
+    (instance, distance) of the hashed row closest to `value`, within `max_distance` bits,
+    or (None, None), among the rows the `bands` queryset of band rows, with their `key` and
+    the `history` they belong to, points to. Only rows sharing a band with `value` are
+    fetched, through the band index, and the distance is checked on those few candidates.
+    """
+    if max_distance > MAX_DISTANCE:
+        raise ValueError(f'Hashes further than {MAX_DISTANCE} bits apart may share no band.')
+
+    history = bands.model._meta.get_field('history')
+    candidates = history.related_model.objects.filter(
+        pk__in=bands.filter(key__in=band_keys(value)).values('history')
+    )
+
+    best, best_distance = None, None
+    for instance in candidates:
+        distance = hash_distance(bytes(getattr(instance, field)), value)
+        if distance <= max_distance and (best_distance is None or distance < best_distance):
+            best, best_distance = instance, distance
+    return best, best_distance
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+# ab/cd/abcd...<sha256>.ext, two levels of 256 shards keep every directory small
+BLOB_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[0-9a-z]+)?$')
+
+
+def blob_name(digest, extension):
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+def is_blob_name(name):
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+def media_signature(name, expires):
+    return signing.Signer(salt='media').signature(f'{name}:{expires}')
+
+
+def sign_media_name(name):
+    """
+    Query parameters that let serve_media answer for `name` without a token until they expire.
+    """
+    # Expiry rounded up to the hour, so a file keeps one URL and the browser cache for a while
+    expires = -(-int(time.time()) // 3600) * 3600 + settings.MEDIA_URL_MAX_AGE
+    return {'expires': expires, 'signature': media_signature(name, expires)}
+
+
+def check_media_signature(name, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return expires > time.time() and signing.constant_time_compare(signature, media_signature(name, expires))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the sha256 of its content in a sharded layout, so that
+    identical uploads share one file on disk. Blobs are reference counted in
+    MediaBlob: every save adds a reference, every delete drops one, and the file
+    is only removed with its last reference.
+    """
+
+    def url(self, name):
+        # Media is only served to signed URLs or token holders
+        return f'{super().url(name)}?{urlencode(sign_media_name(name))}'
+
+    def get_available_name(self, name, max_length=None):
+        # A name is the content, an existing file with that name is the same file
+        return name
+
+    def _save(self, name, content):
+        directory = self.path('')
+        os.makedirs(directory, exist_ok=True)
+
+        # Hash while spooling to a temporary file, so the upload is only read once
+        sha256 = hashlib.sha256()
+        size = 0
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(sha256.hexdigest(), os.path.splitext(name)[1])
+            MediaBlob = apps.get_model('blobs', 'MediaBlob')
+            with transaction.atomic():
+                blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'size': size}
+                )
+                path = self.path(name)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temporary, self.file_permissions_mode)
+                    os.replace(temporary, path)
+                else:
+                    # A new reference to an old blob, fresh again for sweep_media's minimum age
+                    os.utime(path)
+                MediaBlob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+        return name
+
+    def delete(self, name):
+        if not name:
+            return
+
+        MediaBlob = apps.get_model('blobs', 'MediaBlob')
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.references > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            super().delete(name)
+
+
+_storage = ContentAddressedStorage()
+
+
+def blob_storage():
+    return _storage
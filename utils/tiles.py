@@ -0,0 +1,79 @@
+import functools
+import math
+
+import cv2
+from PIL import Image
+
+# Decoding at a reduced size is much cheaper for the zoomed out levels
+REDUCED_READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def get_image_dimensions(path):
+    # Only the header is read, the size is reported as displayed, after EXIF orientation
+    with Image.open(path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+    return width, height
+
+
+def get_max_level(width, height):
+    # Deep zoom levels, from a single pixel at level 0 up to the full image
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def get_level_size(width, height, level):
+    factor = 2 ** (get_max_level(width, height) - level)
+    return math.ceil(width / factor), math.ceil(height / factor)
+
+
+def get_tile_grid(width, height, level, tile_size):
+    level_width, level_height = get_level_size(width, height, level)
+    return math.ceil(level_width / tile_size), math.ceil(level_height / tile_size)
+
+
+@functools.lru_cache(maxsize=2)
+def read_source(path, reduction):
+    # Viewers ask for the tiles of one image in bursts, keep its last decodes around
+    return cv2.imread(path, REDUCED_READ_FLAGS[reduction])
+
+
+def render_tile(path, width, height, level, column, row, tile_size):
+    """
+    Tile (`column`, `row`) of `level` of the image at `path`, or None when it is outside the pyramid.
+    """
+    max_level = get_max_level(width, height)
+    if not 0 <= level <= max_level:
+        return None
+
+    columns, rows = get_tile_grid(width, height, level, tile_size)
+    if not (0 <= column < columns and 0 <= row < rows):
+        return None
+
+    level_width, level_height = get_level_size(width, height, level)
+    x0, y0 = column * tile_size, row * tile_size
+    x1, y1 = min(x0 + tile_size, level_width), min(y0 + tile_size, level_height)
+
+    # Read at the largest reduction that still has at least as many pixels as the level
+    factor = 2 ** (max_level - level)
+    reduction = max(reduction for reduction in REDUCED_READ_FLAGS if reduction <= factor)
+    source = read_source(path, reduction)
+    if source is None:
+        return None
+
+    source_height, source_width = source.shape[:2]
+    scale_x, scale_y = source_width / width * factor, source_height / height * factor
+    tile = source[
+        int(y0 * scale_y):max(int(y0 * scale_y) + 1, min(round(y1 * scale_y), source_height)),
+        int(x0 * scale_x):max(int(x0 * scale_x) + 1, min(round(x1 * scale_x), source_width))
+    ]
+    if tile.shape[:2] == (y1 - y0, x1 - x0):
+        return tile
+    return cv2.resize(tile, (x1 - x0, y1 - y0), interpolation=cv2.INTER_AREA)
@@ -1,20 +1,305 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
 import cv2
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from ultralytics import YOLO
+from ultralytics.utils import ops
+
+# YOLO predictors are not thread safe, every thread (or worker process) keeps its own models
+_local = threading.local()
+
+# Weight of the drawn annotations over the original image
+OVERLAY_ALPHA = 0.5
+
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def load_model(path):
+    models = getattr(_local, 'models', None)
+    if models is None:
+        models = _local.models = {}
+    if path not in models:
+        models[path] = YOLO(path)
+        attach_embedding_hook(models[path])
+    return models[path]
+
+
+def attach_embedding_hook(model):
+    """
+    Keep the globally pooled output of the last backbone layer of every forward pass
+    on `model`, an image embedding that costs no extra inference.
+    """
+    layers = getattr(getattr(model, 'model', None), 'model', None)
+    if layers is None:
+        # Exported models have no modules to hook
+        return
+
+    # The backbone ends right before the neck starts upsampling, at SPPF on YOLOv8
+    backbone = next(
+        (layers[index - 1] for index, layer in enumerate(layers) if type(layer).__name__ == 'Upsample'),
+        layers[-2]
+    )
+
+    def pool(module, inputs, output):
+        model.embeddings = output.mean(dim=(2, 3)).float().cpu().numpy()
+
+    backbone.register_forward_hook(pool)
+
+
+def take_embedding(model, index=0):
+    """
+    Unit length float16 embedding of the `index`th image of the last forward pass of `model`, or None.
+    """
+    embeddings = getattr(model, 'embeddings', None)
+    model.embeddings = None
+    if embeddings is None:
+        return None
+
+    embedding = embeddings[index]
+    norm = np.linalg.norm(embedding)
+    return (embedding / norm if norm else embedding).astype(np.float16)
+
+
+def get_image_size(upload):
+    # ImageField validation already parsed the header, otherwise only read the header here
+    image = getattr(upload, 'image', None)
+    if image is None:
+        upload.seek(0)
+        image = Image.open(upload)
+        upload.seek(0)
+    return image.size
+
+
+def get_decode_reduction(width, height, target_size):
+    # Largest reduction that still leaves the long side at or above the model input size
+    for reduction in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if max(width, height) / reduction >= target_size:
+            return reduction
+    return 1
+
+
+def decode_image(upload, flags=cv2.IMREAD_COLOR):
+    # Large uploads are spooled to a temporary file by Django, small ones stay in memory
+    if hasattr(upload, 'temporary_file_path'):
+        buffer = np.fromfile(upload.temporary_file_path(), dtype=np.uint8)
+    else:
+        upload.seek(0)
+        buffer = np.frombuffer(upload.read(), dtype=np.uint8)
+        upload.seek(0)
+
+    return cv2.imdecode(buffer, flags)
+
+
+def decode_examine_image(upload):
+    width, height = get_image_size(upload)
+    reduction = get_decode_reduction(width, height, settings.EXAMINE_INFERENCE_SIZE)
+
+    image = decode_image(upload, REDUCED_DECODE_FLAGS.get(reduction, cv2.IMREAD_COLOR))
+    if image is None:
+        return None, None
+
+    decoded_height, decoded_width = image.shape[:2]
+    # EXIF orientation is applied while decoding but not reflected in the header size
+    if (width > height) != (decoded_width > decoded_height):
+        width, height = height, width
+
+    # Original pixels per decoded pixel, used to bring measurements back to the original scale
+    return image, (width / decoded_width, height / decoded_height)
+
+
+def decode_examine_sector(upload, image, scale, sector):
+    """
+    Decode `upload` again at a smaller reduction when the scan `sector` of the reduced
+    `image` would be cropped below the model input size, with the sector moved to the
+    new decode. The reduction of decode_examine_image only knows the full frame.
+    """
+    if sector is None:
+        return image, scale, sector
+
+    x0, y0, x1, y1 = sector
+    reduction = get_decode_reduction(
+        (x1 - x0) * scale[0], (y1 - y0) * scale[1], settings.EXAMINE_INFERENCE_SIZE
+    )
+    if reduction >= round(max(scale)):
+        return image, scale, sector
+
+    reduced = decode_image(upload, REDUCED_DECODE_FLAGS.get(reduction, cv2.IMREAD_COLOR))
+    if reduced is None:
+        return image, scale, sector
+
+    H, W = reduced.shape[:2]
+    factor_x = image.shape[1] / W
+    factor_y = image.shape[0] / H
+    sector = (
+        max(0, int(x0 / factor_x)), max(0, int(y0 / factor_y)),
+        min(W, int(np.ceil(x1 / factor_x))), min(H, int(np.ceil(y1 / factor_y)))
+    )
+    return reduced, (scale[0] * factor_x, scale[1] * factor_y), sector
+
+
+@contextmanager
+def upload_path(upload):
+    """
+    Path of the upload on disk, spooling in-memory uploads to a temporary file
+    for readers that only take a path, like cv2.VideoCapture.
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        yield upload.temporary_file_path()
+        return
+
+    _, extension = os.path.splitext(upload.name)
+    with tempfile.NamedTemporaryFile(suffix=extension) as spooled:
+        for chunk in upload.chunks():
+            spooled.write(chunk)
+        spooled.flush()
+        yield spooled.name
+
+
+class AssembledUpload(UploadedFile):
+    """
+    A file assembled on disk from uploaded chunks, handed to the exam like an upload
+    Django spooled to a temporary file so that it is read from its path.
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, 'rb'), name, mimetypes.guess_type(name)[0], size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def result_image_name(image_name):
+    # Result images rendered up front by exams that predate stored segmentations
+    stem, _ = os.path.splitext(image_name)
+    return f'{stem}_result.png'
+
+
+def predict_masks(model, image, sector=None, imgsz=None):
+    """
+    Masks of every instance detected in one forward pass, as an (instances, H, W)
+    uint8 stack over the scan sector, with their confidences and the sector offset
+    in `image`. (None, None, None) when nothing was detected.
+    """
+    x0, y0 = 0, 0
+    if sector is not None:
+        x0, y0, x1, y1 = sector
+        image = np.ascontiguousarray(image[y0:y1, x0:x1])
+
+    result = model(image, imgsz=imgsz or settings.EXAMINE_INFERENCE_SIZE)[0]
+    masks, confidences = result_masks(result, image.shape[:2])
+    if masks is None:
+        return None, None, None
+
+    return masks, confidences, (x0, y0)
+
+
+def result_masks(result, shape):
+    """
+    Masks of every instance of one model `result`, as an (instances, H, W) uint8 stack
+    over the image of `shape` it was predicted on, and their confidences. (None, None)
+    when nothing was detected.
+    """
+    if result.masks is None:
+        return None, None
+
+    # Masks come back letterboxed to the inference size, the padding depends on imgsz. All
+    # instances are scaled in one go as the channels of a single image
+    masks = np.ascontiguousarray(result.masks.data.cpu().numpy().transpose(1, 2, 0) * 255)
+    masks = ops.scale_image(masks, shape)
+    masks = np.clip(masks, 0, 255).astype(np.uint8).transpose(2, 0, 1)
+
+    return masks, result.boxes.conf.cpu().numpy()
+
+
+def mask_boxes(masks, threshold=240):
+    """
+    Bounding boxes (x, y, w, h) of every mask of the stack above `threshold`, and
+    whether each mask had any pixel above it at all.
+    """
+    foreground = masks > threshold
+    columns = foreground.any(axis=1)
+    rows = foreground.any(axis=2)
+
+    x0 = columns.argmax(axis=1)
+    x1 = columns.shape[1] - columns[:, ::-1].argmax(axis=1)
+    y0 = rows.argmax(axis=1)
+    y1 = rows.shape[1] - rows[:, ::-1].argmax(axis=1)
+
+    return np.stack([x0, y0, x1 - x0, y1 - y0], axis=1), columns.any(axis=1)
+
+
+def rank_instances(masks, confidences):
+    """
+    Masks, confidences and boxes of the instances that have a measurable mask, most
+    confident first. The first instance is the one the exam's own fields are filled from.
+    """
+    boxes, found = mask_boxes(masks)
+    order = np.argsort(-confidences[found], kind='stable')
+    return masks[found][order], confidences[found][order], boxes[found][order]
+
+
+def mask_polygons(masks, offset=(0, 0), threshold=240):
+    """
+    Outer contours of every mask of the stack, as flat [x0, y0, x1, y1, ...] point
+    lists in the frame of the full image. Their extremes are the extremes of the
+    mask, so they measure exactly like the mask itself.
+    """
+    polygons = []
+    for mask in masks:
+        contours, _ = cv2.findContours(
+            (mask > threshold).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset
+        )
+        polygons.append([contour.reshape(-1).tolist() for contour in contours])
+    return polygons
+
 
+def polygon_boxes(polygons):
+    """
+    Bounding boxes (x, y, w, h) of the stored polygons of every instance, the same
+    boxes mask_boxes gives for the masks they were traced from.
+    """
+    boxes = np.zeros((len(polygons), 4), dtype=np.int64)
+    for i, contours in enumerate(polygons):
+        points = np.concatenate([np.asarray(contour) for contour in contours]).reshape(-1, 2)
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        boxes[i] = x0, y0, x1 - x0 + 1, y1 - y0 + 1
+    return boxes
 
-def predict_and_save(model, image_path):
-    image = cv2.imread(image_path)
-    H, W, _ = image.shape
 
-    results = model(image)
-    for i, result in enumerate(results):
-        if result.masks is not None:
-            for j, mask in enumerate(result.masks.data):
-                mask = mask.cpu().numpy() * 255
-                mask = cv2.resize(mask, (W, H))
-                cv2.imwrite(image_path, mask)
-                return image_path
-        else:
-            return None
+def scale_segmentation(segmentation):
+    """
+    Contours and bounding boxes of every stored instance, scaled to the original image.
+    """
+    scale = np.asarray(segmentation['scale'])
+    instances = segmentation['instances']
+    boxes = np.rint(polygon_boxes(instances) * np.tile(scale, 2)).astype(int)
+    contours = [
+        [np.rint(np.asarray(contour).reshape(-1, 1, 2) * scale).astype(np.int32) for contour in instance]
+        for instance in instances
+    ]
+    return contours, boxes.tolist()
 
-    return None
 
+def blend_overlay(image, overlay):
+    return cv2.addWeighted(overlay, OVERLAY_ALPHA, image, 1 - OVERLAY_ALPHA, 0)